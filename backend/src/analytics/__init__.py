@@ -0,0 +1 @@
+"""Offline analytics over exported price snapshots"""
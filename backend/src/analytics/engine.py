@@ -0,0 +1,183 @@
+"""Vectorized daily average prices over a snapshot"""
+
+from datetime import date, timedelta
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from core.crud import MIN_PRICE_COUNT, DailyAverage
+from .snapshot import Snapshot, day_number
+
+# Float64 cells of the per pair and day sums computed at a time, and of the
+# pair rows gathered at a time to sum them per lane, bounding the working
+# memory whatever the number of pairs
+CELL_BUDGET = 1 << 22
+
+
+class LaneAverages(NamedTuple):
+    """
+    Per-day price sums and counts of many lanes over one date range.
+
+    Attributes:
+    - first_day (date): The day of column 0.
+    - sums (np.ndarray): Price sums, one row per lane and one column per day.
+    - counts (np.ndarray): Price counts, same shape as `sums`.
+    - min_count (int): Days with fewer prices have no average.
+    """
+
+    first_day: date
+    sums: np.ndarray
+    counts: np.ndarray
+    min_count: int = MIN_PRICE_COUNT
+
+    def averages(self) -> np.ndarray:
+        """
+        Returns the average prices, NaN for days below `min_count`.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                self.counts >= self.min_count, self.sums / self.counts, np.nan
+            )
+
+    def rows(self, lane: int) -> List[DailyAverage]:
+        """
+        Returns the result of a lane as get_average_prices does: days with
+        prices only, and None below `min_count`.
+
+        Parameters:
+        lane (int): The lane position in the computed lanes
+
+        Returns:
+        List[DailyAverage]: The day and average price
+        """
+        sums, counts = self.sums[lane], self.counts[lane]
+        return [
+            DailyAverage(
+                self.first_day + timedelta(days=int(offset)),
+                (
+                    float(sums[offset] / counts[offset])
+                    if counts[offset] >= self.min_count
+                    else None
+                ),
+            )
+            for offset in np.flatnonzero(counts)
+        ]
+
+
+def lane_pairs(
+    snapshot: Snapshot,
+    lanes: Sequence[Tuple[str, str]],
+    pair_orig: np.ndarray,
+    pair_dest: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the sparse lane by port pair incidence: the pairs with prices
+    that every lane covers, in CSR form.
+
+    Only the pairs of a lane's origin ports are looked at, so the work and the
+    memory are proportional to the pairs covered, not to lanes x pairs.
+
+    Parameters:
+    snapshot (Snapshot): The prices and port hierarchy
+    lanes (Sequence[Tuple[str, str]]): (origin, destination) port codes or slugs
+    pair_orig (np.ndarray): Origin port index of every pair, sorted
+    pair_dest (np.ndarray): Destination port index of every pair
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray]: The lane offsets into the pair indexes, of
+    length len(lanes) + 1, and the pair indexes
+    """
+    ports = len(snapshot.codes)
+    by_orig = np.searchsorted(pair_orig, np.arange(ports + 1))
+    in_destination = np.zeros(ports, dtype=bool)
+    offsets = np.zeros(len(lanes) + 1, dtype=np.int64)
+    indices = []
+    for lane, (origin, destination) in enumerate(lanes):
+        origin_ids = snapshot.port_ids(origin)
+        destination_ids = snapshot.port_ids(destination)
+        candidates = np.concatenate(
+            [np.arange(by_orig[o], by_orig[o + 1]) for o in origin_ids]
+            or [np.empty(0, dtype=np.int64)]
+        )
+        in_destination[destination_ids] = True
+        covered = candidates[in_destination[pair_dest[candidates]]]
+        in_destination[destination_ids] = False
+        indices.append(covered)
+        offsets[lane + 1] = offsets[lane] + len(covered)
+    return offsets, np.concatenate(indices or [np.empty(0, dtype=np.int64)])
+
+
+def lane_average_prices(
+    snapshot: Snapshot,
+    lanes: Sequence[Tuple[str, str]],
+    date_from: date,
+    date_to: date,
+    min_count: int = MIN_PRICE_COUNT,
+) -> LaneAverages:
+    """
+    Computes the daily average prices of many lanes with the semantics of
+    crud.QUERY: the average across every resolved port pair, over one pass
+    on the prices of the date range.
+
+    Prices are grouped by port pair. Pairs are then summed per day a block
+    of at most CELL_BUDGET cells at a time, and every lane adds up the rows
+    of the block's pairs it covers, found through a sparse lane by pair
+    incidence. Apart from the result, memory stays proportional to the
+    prices of the range and CELL_BUDGET, not to pairs x days. Sums of integer
+    prices stay exact in float64, so averages match the SQL path.
+
+    Parameters:
+    snapshot (Snapshot): The prices and port hierarchy
+    lanes (Sequence[Tuple[str, str]]): (origin, destination) port codes or slugs
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+    min_count (int): Days with fewer prices have no average
+
+    Returns:
+    LaneAverages: The sums and counts of every lane and day
+    """
+    days = (date_to - date_from).days + 1
+    start, end = snapshot.day_range(date_from, date_to)
+    orig = np.asarray(snapshot.orig[start:end], dtype=np.int64)
+    dest = np.asarray(snapshot.dest[start:end], dtype=np.int64)
+    offsets = np.asarray(snapshot.day[start:end], dtype=np.int64) - day_number(date_from)
+    ports = len(snapshot.codes)
+
+    pairs, pair_index = np.unique(orig * ports + dest, return_inverse=True)
+    # Rows ordered by pair, so every block of pairs reads a contiguous run
+    by_pair = np.argsort(pair_index.reshape(-1), kind="stable")
+    row_pairs = pair_index.reshape(-1)[by_pair]
+    row_offsets = offsets[by_pair]
+    row_prices = np.asarray(snapshot.price[start:end])[by_pair]
+    pair_rows = np.searchsorted(row_pairs, np.arange(len(pairs) + 1))
+    pair_orig, pair_dest = np.divmod(pairs, ports)
+
+    lane_offsets, indices = lane_pairs(snapshot, lanes, pair_orig, pair_dest)
+    # Lane entries ordered by pair, then by lane within a pair
+    entry_order = np.argsort(indices, kind="stable")
+    entry_pairs = indices[entry_order]
+    entry_lanes = np.repeat(np.arange(len(lanes)), np.diff(lane_offsets))[entry_order]
+    sums = np.zeros((len(lanes), days))
+    counts = np.zeros((len(lanes), days), dtype=np.int64)
+    step = max(1, CELL_BUDGET // days)
+    for first in range(0, len(pairs), step):
+        last = min(first + step, len(pairs))
+        rows = slice(pair_rows[first], pair_rows[last])
+        cells = (row_pairs[rows] - first) * days + row_offsets[rows]
+        size = (last - first) * days
+        pair_sums = np.bincount(cells, weights=row_prices[rows], minlength=size)
+        pair_counts = np.bincount(cells, minlength=size)
+        pair_sums = pair_sums.reshape(last - first, days)
+        pair_counts = pair_counts.reshape(last - first, days)
+        low, high = np.searchsorted(entry_pairs, (first, last))
+        for entry in range(low, high, step):
+            block = slice(entry, min(entry + step, high))
+            order = np.argsort(entry_lanes[block], kind="stable")
+            block_pairs = entry_pairs[block][order] - first
+            # Each lane sums a contiguous run of the gathered rows
+            block_lanes, runs = np.unique(entry_lanes[block][order], return_index=True)
+            sums[block_lanes] += np.add.reduceat(pair_sums[block_pairs], runs, axis=0)
+            counts[block_lanes] += np.add.reduceat(
+                pair_counts[block_pairs], runs, axis=0
+            )
+    return LaneAverages(date_from, sums, counts, min_count)
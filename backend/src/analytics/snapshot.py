@@ -0,0 +1,253 @@
+"""Columnar on-disk snapshots of prices and the port hierarchy"""
+
+import json
+from datetime import date
+from logging import getLogger
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from core.crud import get_ports, get_regions
+from core.hierarchy import build_index
+from core.ingest import chunks
+from core.version import SELECT_VERSION
+from lib.sqla.db import Database
+
+LOG = getLogger("rate_calculator")
+
+# Bumped whenever the on-disk layout changes
+SNAPSHOT_FORMAT = 1
+
+# Days are stored as offsets from this day
+EPOCH = date(1970, 1, 1)
+
+# One .npy file per column, in this order
+COLUMNS = ("orig", "dest", "day", "price")
+
+# Prices converted to arrays at a time while exporting
+EXPORT_BATCH_ROWS = 500_000
+
+EXPORT_QUERY = text(
+    "SELECT orig_code, dest_code, day, price FROM prices WHERE price IS NOT NULL"
+)
+
+
+def day_number(day: date) -> int:
+    """
+    Returns the stored offset of a day.
+    """
+    return day.toordinal() - EPOCH.toordinal()
+
+
+def day_from_number(number: int) -> date:
+    """
+    Returns the day of a stored offset.
+    """
+    return date.fromordinal(EPOCH.toordinal() + int(number))
+
+
+class Snapshot:
+    """
+    Prices as parallel column arrays sorted by day, with ports stored as
+    indexes into `codes` and the resolved port hierarchy.
+
+    Arrays loaded from disk are memory-mapped, so only the day ranges that
+    are computed on are read.
+    """
+
+    def __init__(
+        self,
+        codes: Sequence[str],
+        index: Dict[str, Tuple[str, ...]],
+        columns: Dict[str, np.ndarray],
+        version: int = 0,
+    ) -> None:
+        self.codes = tuple(codes)
+        self.index = index
+        self.orig = columns["orig"]
+        self.dest = columns["dest"]
+        self.day = columns["day"]
+        self.price = columns["price"]
+        self.version = version
+        self._ids = {code: i for i, code in enumerate(self.codes)}
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def port_ids(self, port: str) -> np.ndarray:
+        """
+        Resolves a port code or region slug into port indexes.
+
+        Parameters:
+        port (str): The port code or region slug
+
+        Returns:
+        np.ndarray: The matching port indexes, empty if the input is unknown
+        """
+        return np.array(
+            [self._ids[code] for code in self.index.get(port, ())], dtype=np.int32
+        )
+
+    def day_range(self, date_from: date, date_to: date) -> Tuple[int, int]:
+        """
+        Returns the [start, end) row positions of the prices within a date range.
+        """
+        return (
+            int(np.searchsorted(self.day, day_number(date_from), side="left")),
+            int(np.searchsorted(self.day, day_number(date_to), side="right")),
+        )
+
+
+def encode_prices(
+    rows: Sequence[Tuple[str, str, date, int]], ids: Dict[str, int]
+) -> Dict[str, np.ndarray]:
+    """
+    Converts (orig_code, dest_code, day, price) rows into column arrays.
+
+    Parameters:
+    rows (Sequence[Tuple[str, str, date, int]]): The prices
+    ids (Dict[str, int]): Index of every port code
+
+    Returns:
+    Dict[str, np.ndarray]: The orig, dest, day and price columns
+    """
+    count = len(rows)
+    return {
+        "orig": np.fromiter((ids[row[0]] for row in rows), np.int32, count),
+        "dest": np.fromiter((ids[row[1]] for row in rows), np.int32, count),
+        "day": np.fromiter((day_number(row[2]) for row in rows), np.int32, count),
+        "price": np.fromiter((row[3] for row in rows), np.int32, count),
+    }
+
+
+def assemble_snapshot(
+    ports: Sequence[Tuple[str, Optional[str]]],
+    regions: Sequence[Tuple[str, Optional[str]]],
+    parts: List[Dict[str, np.ndarray]],
+    version: int = 0,
+) -> Snapshot:
+    """
+    Concatenates encoded price batches and sorts them by day, then lane.
+
+    Parameters:
+    ports (Sequence[Tuple[str, Optional[str]]]): (code, parent_slug) pairs
+    regions (Sequence[Tuple[str, Optional[str]]]): (slug, parent_slug) pairs
+    parts (List[Dict[str, np.ndarray]]): Batches from encode_prices
+    version (int): Dataset version the prices were read at
+
+    Returns:
+    Snapshot: The in-memory snapshot
+    """
+    columns = {
+        name: np.concatenate([part[name] for part in parts] or [np.empty(0, np.int32)])
+        for name in COLUMNS
+    }
+    order = np.lexsort((columns["dest"], columns["orig"], columns["day"]))
+    columns = {name: column[order] for name, column in columns.items()}
+    return Snapshot(
+        sorted(code for code, _ in ports),
+        build_index(ports, regions),
+        columns,
+        version,
+    )
+
+
+def build_snapshot(
+    ports: Sequence[Tuple[str, Optional[str]]],
+    regions: Sequence[Tuple[str, Optional[str]]],
+    prices: Iterable[Tuple[str, str, date, int]],
+    version: int = 0,
+) -> Snapshot:
+    """
+    Builds a snapshot from in-memory ports, regions and prices.
+
+    Parameters:
+    ports (Sequence[Tuple[str, Optional[str]]]): (code, parent_slug) pairs
+    regions (Sequence[Tuple[str, Optional[str]]]): (slug, parent_slug) pairs
+    prices (Iterable[Tuple[str, str, date, int]]): (orig_code, dest_code, day, price) rows
+    version (int): Dataset version of the prices
+
+    Returns:
+    Snapshot: The in-memory snapshot
+    """
+    ids = {code: i for i, code in enumerate(sorted(code for code, _ in ports))}
+    parts = [encode_prices(chunk, ids) for chunk in chunks(prices, EXPORT_BATCH_ROWS)]
+    return assemble_snapshot(ports, regions, parts, version)
+
+
+def save_snapshot(snapshot: Snapshot, path: Path):
+    """
+    Writes a snapshot as a directory of .npy columns and a meta.json.
+
+    Parameters:
+    snapshot (Snapshot): The snapshot
+    path (Path): The snapshot directory, created if missing
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    for name in COLUMNS:
+        np.save(path / f"{name}.npy", getattr(snapshot, name))
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "version": snapshot.version,
+        "rows": len(snapshot),
+        "codes": snapshot.codes,
+        "index": snapshot.index,
+    }
+    (path / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+
+def load_snapshot(path: Path, mmap: bool = True) -> Snapshot:
+    """
+    Opens a snapshot written by save_snapshot.
+
+    Parameters:
+    path (Path): The snapshot directory
+    mmap (bool): Memory-map the columns instead of reading them
+
+    Returns:
+    Snapshot: The snapshot
+    """
+    meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+    if meta["format"] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {meta['format']}")
+    columns = {
+        name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+        for name in COLUMNS
+    }
+    index = {key: tuple(codes) for key, codes in meta["index"].items()}
+    return Snapshot(meta["codes"], index, columns, meta["version"])
+
+
+async def export_snapshot(db: Database, path: Path) -> Snapshot:
+    """
+    Reads ports, regions and prices in one consistent transaction and saves them
+    as a snapshot.
+
+    Parameters:
+    db (Database): The database to export, prices are streamed from the primary
+    path (Path): The snapshot directory
+
+    Returns:
+    Snapshot: The exported snapshot
+    """
+    async with db.begin() as conn:
+        await conn.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+        ports = await get_ports(conn)
+        regions = await get_regions(conn)
+        version = 0
+        if (await conn.execute(text("SELECT to_regclass('data_version')"))).scalar():
+            row = (await conn.execute(SELECT_VERSION)).first()
+            version = row.version if row else 0
+        ids = {code: i for i, code in enumerate(sorted(code for code, _ in ports))}
+        parts = []
+        async with conn.stream(
+            EXPORT_QUERY, execution_options={"yield_per": EXPORT_BATCH_ROWS}
+        ) as result:
+            async for rows in result.partitions():
+                parts.append(encode_prices(rows, ids))
+    snapshot = assemble_snapshot(ports, regions, parts, version)
+    save_snapshot(snapshot, path)
+    LOG.info("Exported %d prices at version %d to %s", len(snapshot), version, path)
+    return snapshot
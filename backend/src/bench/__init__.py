@@ -0,0 +1 @@
+"""Rate calculator benchmark suite"""
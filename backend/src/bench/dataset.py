@@ -0,0 +1,139 @@
+"""Synthetic ports, regions and prices dataset"""
+
+from datetime import date, timedelta
+from random import Random
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# First day of the generated prices, the same as the original ratestask data
+START_DAY = date(2016, 1, 1)
+
+# Average prices per lane and day
+PRICES_PER_DAY = 3
+
+
+class DatasetSpec(NamedTuple):
+    """
+    Shape of a synthetic dataset.
+
+    Attributes:
+    - prices (int): Number of price rows to generate.
+    - depth (int): Levels of region nesting below the top-level regions.
+    - fanout (int): Top-level regions, and child regions of every region.
+    - ports_per_region (int): Ports attached to every leaf region.
+    - days (int): Number of days covered by the prices.
+    - seed (int): Random seed, the same spec always yields the same data.
+    """
+
+    prices: int
+    depth: int = 3
+    fanout: int = 3
+    ports_per_region: int = 5
+    days: int = 365
+    seed: int = 0
+
+
+def port_code(index: int) -> str:
+    """
+    Returns the 5 letter code of the n-th synthetic port.
+    """
+    letters = []
+    for _ in range(5):
+        index, letter = divmod(index, 26)
+        letters.append(chr(ord("A") + letter))
+    return "".join(reversed(letters))
+
+
+def generate_regions(spec: DatasetSpec) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Generates the region tree, `fanout` top-level regions each nested `depth` levels deep.
+
+    Parameters:
+    spec (DatasetSpec): The dataset shape
+
+    Returns:
+    List[Tuple[str, str, Optional[str]]]: (slug, name, parent_slug) rows, parents first
+    """
+    regions = []
+    level = [(f"r{i}", None) for i in range(spec.fanout)]
+    for depth in range(spec.depth + 1):
+        next_level = []
+        for slug, parent_slug in level:
+            regions.append((slug, f"Region {slug}", parent_slug))
+            if depth < spec.depth:
+                next_level.extend(
+                    (f"{slug}_{i}", slug) for i in range(spec.fanout)
+                )
+        level = next_level
+    return regions
+
+
+def generate_ports(spec: DatasetSpec) -> List[Tuple[str, str, str]]:
+    """
+    Generates `ports_per_region` ports in every leaf region.
+
+    Parameters:
+    spec (DatasetSpec): The dataset shape
+
+    Returns:
+    List[Tuple[str, str, str]]: (code, name, parent_slug) rows
+    """
+    leaves = [slug for slug, _, _ in generate_regions(spec) if slug.count("_") == spec.depth]
+    ports = []
+    for slug in leaves:
+        for _ in range(spec.ports_per_region):
+            code = port_code(len(ports))
+            ports.append((code, f"Port {code}", slug))
+    return ports
+
+
+def generate_lanes(spec: DatasetSpec) -> Iterator[Tuple[str, str, int]]:
+    """
+    Generates the endless sequence of port to port lanes prices are spread over.
+
+    Lanes are drawn from their own random stream, so the n-th lane only
+    depends on the spec and the benchmark can query the loaded lanes
+    without scanning the prices table.
+
+    Parameters:
+    spec (DatasetSpec): The dataset shape
+
+    Returns:
+    Iterator[Tuple[str, str, int]]: (orig_code, dest_code, base_price) lanes
+    """
+    rng = Random(spec.seed)
+    codes = [code for code, _, _ in generate_ports(spec)]
+    while True:
+        orig_code, dest_code = rng.sample(codes, 2)
+        yield orig_code, dest_code, rng.randint(500, 3000)
+
+
+def loaded_lanes(spec: DatasetSpec) -> int:
+    """
+    Returns how many lanes are fully covered by `spec.prices` rows on average.
+    """
+    return max(1, spec.prices // (spec.days * PRICES_PER_DAY))
+
+
+def generate_prices(spec: DatasetSpec) -> Iterator[Tuple[str, str, date, int]]:
+    """
+    Generates exactly `spec.prices` price rows, lane by lane.
+
+    Every lane has between 0 and 6 prices per day, so both sides of the
+    3 prices minimum are represented.
+
+    Parameters:
+    spec (DatasetSpec): The dataset shape
+
+    Returns:
+    Iterator[Tuple[str, str, date, int]]: (orig_code, dest_code, day, price) rows
+    """
+    rng = Random(spec.seed + 1)
+    days = [START_DAY + timedelta(days=i) for i in range(spec.days)]
+    remaining = spec.prices
+    for orig_code, dest_code, base in generate_lanes(spec):
+        for day in days:
+            for _ in range(min(rng.randint(0, 2 * PRICES_PER_DAY), remaining)):
+                yield orig_code, dest_code, day, base + rng.randint(-200, 200)
+                remaining -= 1
+            if remaining == 0:
+                return
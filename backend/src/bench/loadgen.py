@@ -0,0 +1,281 @@
+"""Concurrent load generator for the /rates endpoint"""
+
+import asyncio
+import json
+from datetime import timedelta
+from itertools import islice
+from math import ceil
+from random import Random
+from time import perf_counter
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import httpx
+
+from .dataset import START_DAY, DatasetSpec, generate_lanes, generate_ports, loaded_lanes
+
+# Days covered by the narrow and wide scenarios
+NARROW_DAYS = 7
+WIDE_DAYS = 365
+
+# Lanes sampled per scenario
+SCENARIO_LANES = 50
+
+# Metrics compared against the baseline, and whether higher is better
+COMPARED_METRICS = {"throughput": True, "p50": False, "p95": False, "p99": False}
+
+
+class Scenario(NamedTuple):
+    """
+    A named set of /rates queries replayed by the load generator.
+    """
+
+    name: str
+    params: List[Dict[str, str]]
+
+
+def ancestor(slug: str, rng: Random) -> str:
+    """
+    Returns a random ancestor region of a leaf region slug such as r0_1_2.
+    """
+    parts = slug.split("_")
+    return "_".join(parts[: rng.randint(1, max(1, len(parts) - 1))])
+
+
+def build_scenarios(spec: DatasetSpec, seed: int = 0) -> List[Scenario]:
+    """
+    Builds narrow and wide date ranges over port to port and nested region lanes.
+
+    Port lanes are the lanes the dataset was loaded with, region lanes
+    replace both ports with one of their ancestor regions.
+
+    Parameters:
+    spec (DatasetSpec): The shape of the loaded dataset
+    seed (int): Random seed of the lane and date sampling
+
+    Returns:
+    List[Scenario]: The port-narrow, port-wide, region-narrow and region-wide scenarios
+    """
+    rng = Random(seed)
+    regions = {code: slug for code, _, slug in generate_ports(spec)}
+    lanes = [
+        (orig_code, dest_code)
+        for orig_code, dest_code, _ in islice(
+            generate_lanes(spec), min(loaded_lanes(spec), SCENARIO_LANES)
+        )
+    ]
+    scenarios = []
+    for kind in ("port", "region"):
+        for width, days in (("narrow", NARROW_DAYS), ("wide", WIDE_DAYS)):
+            days = min(days, spec.days)
+            params = []
+            for orig_code, dest_code in lanes:
+                if kind == "region":
+                    orig_code = ancestor(regions[orig_code], rng)
+                    dest_code = ancestor(regions[dest_code], rng)
+                date_from = START_DAY + timedelta(days=rng.randrange(spec.days - days + 1))
+                params.append(
+                    {
+                        "origin": orig_code,
+                        "destination": dest_code,
+                        "date_from": date_from.isoformat(),
+                        "date_to": (date_from + timedelta(days=days - 1)).isoformat(),
+                    }
+                )
+            scenarios.append(Scenario(f"{kind}-{width}", params))
+    return scenarios
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    """
+    Returns the nearest-rank percentile of sorted latencies.
+
+    Parameters:
+    latencies (List[float]): Latencies sorted ascending
+    q (float): The percentile, between 0 and 100
+
+    Returns:
+    float: The latency at the percentile, 0 without latencies
+    """
+    if not latencies:
+        return 0.0
+    return latencies[max(0, ceil(q / 100 * len(latencies)) - 1)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    """
+    Summarizes a scenario run as requests, errors, throughput and latency percentiles.
+
+    Parameters:
+    latencies (List[float]): Seconds per request
+    errors (int): Requests that did not return 200
+    elapsed (float): Wall-clock seconds of the run
+
+    Returns:
+    Dict[str, float]: The summary, latencies in milliseconds
+    """
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+async def run_scenario(
+    client, scenario: Scenario, requests: int, concurrency: int
+) -> Dict[str, float]:
+    """
+    Sends `requests` queries of a scenario with `concurrency` requests in flight.
+
+    Parameters:
+    client (httpx.AsyncClient): The HTTP client, with the service as base URL
+    scenario (Scenario): The queries to replay, round-robin
+    requests (int): Number of requests to send
+    concurrency (int): Number of concurrent requests
+
+    Returns:
+    Dict[str, float]: The run summary
+    """
+    queue: Iterator[Dict[str, str]] = (
+        scenario.params[i % len(scenario.params)] for i in range(requests)
+    )
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for params in queue:
+            start = perf_counter()
+            response = await client.get("/rates", params=params)
+            await response.aread()
+            latencies.append(perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, perf_counter() - start)
+
+
+async def run_benchmark(
+    base_url: str,
+    spec: DatasetSpec,
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Runs every scenario against a running service.
+
+    Parameters:
+    base_url (str): URL of the service, e.g. http://127.0.0.1:8000
+    spec (DatasetSpec): The shape of the loaded dataset
+    requests (int): Requests per scenario
+    concurrency (int): Concurrent requests
+    warmup (int): Requests per scenario sent first and not measured
+
+    Returns:
+    Dict[str, Dict[str, float]]: The summary of every scenario by name
+    """
+    limits = httpx.Limits(max_connections=concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        for scenario in build_scenarios(spec, spec.seed):
+            if warmup:
+                await run_scenario(client, scenario, warmup, concurrency)
+            results[scenario.name] = await run_scenario(
+                client, scenario, requests, concurrency
+            )
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    """
+    Compares a run against a baseline run.
+
+    A scenario regresses when it has errors, its throughput dropped or its
+    latency percentiles grew by more than `tolerance`. A scenario missing
+    from the baseline is reported too, so it can not pass unchecked.
+
+    Parameters:
+    results (Dict[str, Dict[str, float]]): The current run
+    baseline (Dict[str, Dict[str, float]]): The stored baseline run
+    tolerance (float): Allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+    List[str]: A message per regression, empty when there is none
+    """
+    regressions = []
+    for name, summary in results.items():
+        if summary["errors"]:
+            regressions.append(f"{name}: {summary['errors']:.0f} failed requests")
+        reference = baseline.get(name)
+        if reference is None:
+            regressions.append(f"{name}: no baseline to compare against")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            current, expected = summary[metric], reference[metric]
+            if higher_is_better:
+                regressed = current < expected * (1 - tolerance)
+            else:
+                regressed = current > expected * (1 + tolerance)
+            if regressed:
+                regressions.append(
+                    f"{name}: {metric} {current:.1f} vs baseline {expected:.1f}"
+                )
+    return regressions
+
+
+def format_report(
+    results: Dict[str, Dict[str, float]],
+    baseline: Optional[Dict[str, Dict[str, float]]] = None,
+) -> str:
+    """
+    Formats a run as a table, with the relative change against a baseline.
+    """
+    lines = [
+        f"{'scenario':<14} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    ]
+    for name, summary in results.items():
+        lines.append(
+            f"{name:<14} {summary['throughput']:>9.1f} {summary['p50']:>9.2f} "
+            f"{summary['p95']:>9.2f} {summary['p99']:>9.2f} {summary['errors']:>7.0f}"
+        )
+        reference = (baseline or {}).get(name)
+        if reference:
+            changes = [
+                f"{(summary[metric] / reference[metric] - 1) * 100:+8.1f}%"
+                if reference[metric]
+                else f"{'n/a':>9}"
+                for metric in COMPARED_METRICS
+            ]
+            lines.append(f"{'  vs baseline':<14} " + " ".join(changes))
+    return "\n".join(lines)
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Dict[str, float]]]:
+    """
+    Reads a stored baseline, None when the file does not exist.
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]]):
+    """
+    Stores a run as the new baseline.
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
@@ -0,0 +1,93 @@
+"""Loads a synthetic dataset into Postgres"""
+
+from logging import getLogger
+from time import perf_counter
+
+from sqlalchemy import text
+
+from core.ingest import copy_rows
+from lib.sqla.db import Database
+from .dataset import DatasetSpec, generate_ports, generate_prices, generate_regions
+
+LOG = getLogger("rate_calculator")
+
+# Same layout as the ratestask schema the service is written against
+CREATE_TABLES = (
+    text(
+        """ CREATE TABLE IF NOT EXISTS regions (
+                slug text PRIMARY KEY,
+                name text NOT NULL,
+                parent_slug text REFERENCES regions
+            )"""
+    ),
+    text(
+        """ CREATE TABLE IF NOT EXISTS ports (
+                code text PRIMARY KEY,
+                name text NOT NULL,
+                parent_slug text NOT NULL REFERENCES regions
+            )"""
+    ),
+    text(
+        """ CREATE TABLE IF NOT EXISTS prices (
+                orig_code text NOT NULL REFERENCES ports,
+                dest_code text NOT NULL REFERENCES ports,
+                day date NOT NULL,
+                price integer NOT NULL
+            )"""
+    ),
+)
+
+HAS_DATA = text("SELECT EXISTS (SELECT 1 FROM prices) or EXISTS (SELECT 1 FROM ports)")
+
+TRUNCATE = text("TRUNCATE prices, ports, regions")
+
+ANALYZE = text("ANALYZE regions, ports, prices")
+
+
+async def seed_dataset(db: Database, spec: DatasetSpec, reset: bool = False) -> int:
+    """
+    Creates the ratestask tables if missing and loads a synthetic dataset.
+
+    Refuses to touch a database that already has ports or prices unless
+    `reset` is set, which truncates them first.
+
+    Parameters:
+    db (Database): The database
+    spec (DatasetSpec): The dataset shape
+    reset (bool): Truncate existing data before loading
+
+    Returns:
+    int: The number of price rows loaded
+    """
+    async with db.begin() as conn:
+        for statement in CREATE_TABLES:
+            await conn.execute(statement)
+        if (await conn.execute(HAS_DATA)).scalar():
+            if not reset:
+                raise RuntimeError(
+                    "The database already has ports or prices, pass --reset to replace them"
+                )
+            await conn.execute(TRUNCATE)
+
+        start = perf_counter()
+        await copy_rows(
+            conn, "regions", ("slug", "name", "parent_slug"), generate_regions(spec)
+        )
+        await copy_rows(
+            conn, "ports", ("code", "name", "parent_slug"), generate_ports(spec)
+        )
+        loaded = await copy_rows(
+            conn,
+            "prices",
+            ("orig_code", "dest_code", "day", "price"),
+            generate_prices(spec),
+        )
+        elapsed = perf_counter() - start
+        await conn.execute(ANALYZE)
+    LOG.info(
+        "Loaded %d prices in %.1fs (%.0f rows/s)",
+        loaded,
+        elapsed,
+        loaded / elapsed if elapsed else 0.0,
+    )
+    return loaded
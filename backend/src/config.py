@@ -1,6 +1,6 @@
 """Configuration file for Fast API"""
 
-from decouple import Choices, config as get_env
+from decouple import Choices, Csv, config as get_env
 
 # Toggles debug mode
 DEBUG: bool = get_env("DEBUG", cast=bool, default=False)
@@ -11,6 +11,16 @@ LOG_LEVEL: str = get_env(
     cast=Choices(["DEBUG", "INFO", "WARNING", "ERROR"]),
     default="DEBUG" if DEBUG else "INFO",
 )
+# Write log records from a background thread so a slow stderr never blocks requests
+LOG_QUEUED: bool = get_env("LOG_QUEUED", cast=bool, default=True)
+# Records buffered by each queued handler, records beyond it are dropped and counted
+LOG_QUEUE_SIZE: int = get_env("LOG_QUEUE_SIZE", cast=int, default=10000)
+# Format log records as JSON lines
+LOG_JSON: bool = get_env("LOG_JSON", cast=bool, default=False)
+# Share of the access log records written, warnings and errors are always kept
+LOG_ACCESS_SAMPLE_RATE: float = get_env(
+    "LOG_ACCESS_SAMPLE_RATE", cast=float, default=1.0
+)
 
 # The host ip to bind the application to.
 HOST: str = get_env("HOST", default="0.0.0.0")
@@ -23,3 +33,177 @@ DB_PORT: int = get_env("DB_PORT", cast=int, default=5400)
 DB_DATABASE: str = get_env("DB_DATABASE", default="postgres")
 DB_USERNAME: str = get_env("DB_USERNAME", default="postgres")
 DB_PASSWORD: str = get_env("DB_PASSWORD", default="ratestask")
+
+# Seconds between full reloads of the in-process port/region hierarchy
+HIERARCHY_REFRESH_INTERVAL: int = get_env(
+    "HIERARCHY_REFRESH_INTERVAL", cast=int, default=300
+)
+# Postgres NOTIFY channel that triggers an immediate hierarchy reload, empty disables it
+HIERARCHY_NOTIFY_CHANNEL: str = get_env(
+    "HIERARCHY_NOTIFY_CHANNEL", default="port_hierarchy_changed"
+)
+# Number of prepared statements asyncpg keeps per connection, 0 disables the cache
+DB_STATEMENT_CACHE_SIZE: int = get_env("DB_STATEMENT_CACHE_SIZE", cast=int, default=100)
+
+# Connection pool sizing, see SQLAlchemy QueuePool for the meaning of each option
+DB_POOL_SIZE: int = get_env("DB_POOL_SIZE", cast=int, default=10)
+DB_MAX_OVERFLOW: int = get_env("DB_MAX_OVERFLOW", cast=int, default=10)
+# Seconds to wait for a pooled connection before giving up
+DB_POOL_TIMEOUT: float = get_env("DB_POOL_TIMEOUT", cast=float, default=30.0)
+# Seconds after which a connection is replaced, -1 disables recycling
+DB_POOL_RECYCLE: int = get_env("DB_POOL_RECYCLE", cast=int, default=1800)
+# Test connections for liveness on checkout
+DB_POOL_PRE_PING: bool = get_env("DB_POOL_PRE_PING", cast=bool, default=True)
+# Connections opened at startup before the application reports ready
+DB_POOL_WARMUP: int = get_env("DB_POOL_WARMUP", cast=int, default=DB_POOL_SIZE)
+
+# Read replicas as comma separated host or host:port, using the DB_* credentials
+DB_REPLICA_HOSTS: list = get_env("DB_REPLICA_HOSTS", cast=Csv(), default="")
+# How reads are spread over the replicas: "round_robin" or "least_connections"
+DB_REPLICA_POLICY: str = get_env(
+    "DB_REPLICA_POLICY",
+    cast=Choices(["round_robin", "least_connections"]),
+    default="round_robin",
+)
+# Seconds of replication lag after which a replica stops serving reads
+DB_REPLICA_MAX_LAG: float = get_env("DB_REPLICA_MAX_LAG", cast=float, default=10.0)
+# Seconds between replica health checks
+DB_REPLICA_CHECK_INTERVAL: float = get_env(
+    "DB_REPLICA_CHECK_INTERVAL", cast=float, default=5.0
+)
+
+# Serve /rates from the daily_lane_stats pre-aggregation instead of raw prices
+RATES_FROM_AGGREGATES: bool = get_env("RATES_FROM_AGGREGATES", cast=bool, default=False)
+# Days before the newest aggregated day that an incremental refresh recomputes
+AGGREGATE_LOOKBACK_DAYS: int = get_env("AGGREGATE_LOOKBACK_DAYS", cast=int, default=7)
+
+# Warn at startup when the indexes the rates queries rely on are missing
+INDEX_CHECK_ON_STARTUP: bool = get_env("INDEX_CHECK_ON_STARTUP", cast=bool, default=True)
+
+# Size of the prices partitions created by the partition commands
+PRICES_PARTITION_INTERVAL: str = get_env(
+    "PRICES_PARTITION_INTERVAL", cast=Choices(["month", "quarter"]), default="month"
+)
+# Future partitions kept ahead of the current month or quarter
+PRICES_PARTITIONS_AHEAD: int = get_env("PRICES_PARTITIONS_AHEAD", cast=int, default=3)
+
+# Prices merged per transaction by the ingest-prices command
+INGEST_BATCH_ROWS: int = get_env("INGEST_BATCH_ROWS", cast=int, default=500_000)
+
+# NOTIFY channel announcing dataset version bumps after prices change
+DATA_VERSION_CHANNEL: str = get_env("DATA_VERSION_CHANNEL", default="rates_data_changed")
+# Seconds between reloads of the dataset version, catching bumps whose NOTIFY was lost
+DATA_VERSION_REFRESH_INTERVAL: int = get_env(
+    "DATA_VERSION_REFRESH_INTERVAL", cast=int, default=60
+)
+
+# Response cache for /rates: "local" per process, "redis" shared by workers, or "none"
+RATES_CACHE_BACKEND: str = get_env(
+    "RATES_CACHE_BACKEND", cast=Choices(["local", "redis", "none"]), default="local"
+)
+# Seconds a cached response stays valid
+RATES_CACHE_TTL: float = get_env("RATES_CACHE_TTL", cast=float, default=300.0)
+# Upper bound for the memory held by the local cache backend
+RATES_CACHE_MAX_BYTES: int = get_env(
+    "RATES_CACHE_MAX_BYTES", cast=int, default=64 * 1024 * 1024
+)
+# Connection URL of the redis cache backend
+RATES_CACHE_REDIS_URL: str = get_env(
+    "RATES_CACHE_REDIS_URL", default="redis://127.0.0.1:6379/0"
+)
+
+# Per-day range cache in front of the rates query, serving overlapping windows
+RANGE_CACHE_ENABLED: bool = get_env("RANGE_CACHE_ENABLED", cast=bool, default=True)
+# Upper bound for the cached days summed over all lanes
+RANGE_CACHE_MAX_DAYS: int = get_env("RANGE_CACHE_MAX_DAYS", cast=int, default=1000000)
+# Seconds a lane's cached days are kept before they are reloaded
+RANGE_CACHE_TTL: float = get_env("RANGE_CACHE_TTL", cast=float, default=3600.0)
+
+# Estimated (origin, destination, day) rows above which a /rates query is split
+# into chunks run concurrently, 0 disables parallel execution
+RATES_PARALLEL_THRESHOLD: int = get_env(
+    "RATES_PARALLEL_THRESHOLD", cast=int, default=100000
+)
+# Upper bound for the chunks a /rates query is split into
+RATES_PARALLEL_MAX_CHUNKS: int = get_env("RATES_PARALLEL_MAX_CHUNKS", cast=int, default=8)
+# Chunks of one /rates query running at once, each on its own pooled connection
+RATES_PARALLEL_FAN_OUT: int = get_env("RATES_PARALLEL_FAN_OUT", cast=int, default=4)
+# Connections per worker shared by the chunks of all /rates queries, on top of one per
+# admitted request; admission leaves them out of the pool by default
+RATES_PARALLEL_CONNECTIONS: int = get_env(
+    "RATES_PARALLEL_CONNECTIONS", cast=int, default=DB_MAX_OVERFLOW
+)
+# Fixed cost of a chunk in estimated rows: pool checkout, pre-ping, statement_timeout
+# and query round trips. Splits that save less than it are not made
+RATES_PARALLEL_ROUND_TRIP_ROWS: int = get_env(
+    "RATES_PARALLEL_ROUND_TRIP_ROWS", cast=int, default=10000
+)
+# Shortest date range of a chunk, shorter ranges are split by origin ports instead
+RATES_PARALLEL_MIN_CHUNK_DAYS: int = get_env(
+    "RATES_PARALLEL_MIN_CHUNK_DAYS", cast=int, default=7
+)
+
+# Share one database execution between identical concurrent /rates queries
+RATES_COALESCE: bool = get_env("RATES_COALESCE", cast=bool, default=True)
+
+# Maximum number of lanes accepted by a single /rates/batch request
+RATES_BATCH_MAX_LANES: int = get_env("RATES_BATCH_MAX_LANES", cast=int, default=1000)
+
+# Production server settings, see the uvicorn documentation for each option
+# Number of worker processes, each with its own database pool
+WORKERS: int = get_env("WORKERS", cast=int, default=1)
+# Event loop implementation, uvloop requires the uvloop package
+LOOP: str = get_env("LOOP", cast=Choices(["auto", "asyncio", "uvloop"]), default="auto")
+# HTTP protocol implementation, httptools requires the httptools package
+HTTP: str = get_env("HTTP", cast=Choices(["auto", "h11", "httptools"]), default="auto")
+# Maximum number of connections waiting to be accepted
+BACKLOG: int = get_env("BACKLOG", cast=int, default=2048)
+# Seconds an idle keep-alive connection is held open
+TIMEOUT_KEEP_ALIVE: int = get_env("TIMEOUT_KEEP_ALIVE", cast=int, default=5)
+# Maximum concurrent connections per worker before responding 503, 0 for no limit
+LIMIT_CONCURRENCY: int = get_env("LIMIT_CONCURRENCY", cast=int, default=0)
+# Seconds to wait for in-flight requests on shutdown
+TIMEOUT_GRACEFUL_SHUTDOWN: int = get_env(
+    "TIMEOUT_GRACEFUL_SHUTDOWN", cast=int, default=30
+)
+
+# Requests of the admission controlled paths running at once, 0 disables admission control
+ADMISSION_MAX_CONCURRENT: int = get_env(
+    "ADMISSION_MAX_CONCURRENT",
+    cast=int,
+    default=max(1, DB_POOL_SIZE + DB_MAX_OVERFLOW - RATES_PARALLEL_CONNECTIONS),
+)
+# Requests running or queued per client, 0 for no per-client cap
+ADMISSION_MAX_PER_CLIENT: int = get_env("ADMISSION_MAX_PER_CLIENT", cast=int, default=8)
+# Requests waiting for a slot, beyond that requests are rejected with 503
+ADMISSION_MAX_QUEUE: int = get_env("ADMISSION_MAX_QUEUE", cast=int, default=100)
+# Seconds a request waits for a slot before it is rejected with 503
+ADMISSION_QUEUE_TIMEOUT: float = get_env(
+    "ADMISSION_QUEUE_TIMEOUT", cast=float, default=2.0
+)
+# Retry-After seconds sent with 429 and 503 rejections
+ADMISSION_RETRY_AFTER: int = get_env("ADMISSION_RETRY_AFTER", cast=int, default=1)
+# Path prefixes subject to admission control, deadlines and disconnect cancellation
+ADMISSION_PATHS: list = get_env("ADMISSION_PATHS", cast=Csv(), default="/rates")
+# Header identifying the client for the per-client cap, empty to use the peer address
+ADMISSION_CLIENT_HEADER: str = get_env("ADMISSION_CLIENT_HEADER", default="")
+# Seconds a request's queries may run, enforced with statement_timeout, 0 disables it
+REQUEST_DEADLINE: float = get_env("REQUEST_DEADLINE", cast=float, default=30.0)
+
+# Cache-Control max-age in seconds of /rates windows ending before today
+RATES_MAX_AGE_HISTORICAL: int = get_env(
+    "RATES_MAX_AGE_HISTORICAL", cast=int, default=86400
+)
+# Cache-Control max-age in seconds of /rates windows reaching today or later
+RATES_MAX_AGE_CURRENT: int = get_env("RATES_MAX_AGE_CURRENT", cast=int, default=60)
+
+# Seconds above which a statement is logged as slow with its parameters, 0 disables the log
+SLOW_QUERY_THRESHOLD: float = get_env("SLOW_QUERY_THRESHOLD", cast=float, default=0.5)
+# Share of the slow read statements run again under EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = get_env(
+    "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", cast=float, default=0.0
+)
+# Rotating file the captured plans are appended to as JSON lines, empty keeps them in memory
+SLOW_QUERY_EXPLAIN_FILE: str = get_env("SLOW_QUERY_EXPLAIN_FILE", default="")
+# Serve the slow statements and captured plans on /debug/slow-queries
+SLOW_QUERY_ENDPOINT: bool = get_env("SLOW_QUERY_ENDPOINT", cast=bool, default=False)
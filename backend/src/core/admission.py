@@ -0,0 +1,236 @@
+"""Admission control and request deadlines"""
+
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from logging import getLogger
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from lib.sqla.db import deadline
+from .response_model import response_error
+
+LOG = getLogger("rate_calculator")
+
+
+class Rejected(Exception):
+    """
+    Raised when a request is not admitted.
+    """
+
+    def __init__(self, status_code: int, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """
+    Caps the requests running at once, globally and per client, and queues a
+    bounded number of the others.
+
+    A client over its own cap is rejected with 429. When every slot is busy
+    and the queue is full, or a queued request waits too long, the request is
+    rejected with 503. Both come with a Retry-After, so overload turns into
+    fast rejections instead of requests piling up on the connection pool.
+    """
+
+    def __init__(self) -> None:
+        self.max_concurrent = 0
+        self.max_per_client = 0
+        self.max_queue = 0
+        self.queue_timeout = 1.0
+        self.retry_after = 1
+        self.active = 0
+        self.queued = 0
+        self.rejected = {"client_limit": 0, "queue_full": 0, "queue_timeout": 0}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._clients: Dict[str, int] = {}
+
+    def configure(
+        self,
+        max_concurrent: int,
+        max_per_client: int = 0,
+        max_queue: int = 0,
+        queue_timeout: float = 1.0,
+        retry_after: int = 1,
+    ):
+        """
+        Enables admission control.
+
+        Parameters:
+        max_concurrent (int): Requests running at once, 0 disables the control
+        max_per_client (int): Requests running or queued per client, 0 for no cap
+        max_queue (int): Requests waiting for a slot
+        queue_timeout (float): Seconds a request waits for a slot
+        retry_after (int): Seconds clients are told to wait after a rejection
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._slots = asyncio.Semaphore(max_concurrent) if max_concurrent else None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether requests are capped.
+        """
+        return self._slots is not None
+
+    def _reject(self, status_code: int, reason: str, message: str):
+        """
+        Counts a rejection and raises it.
+        """
+        self.rejected[reason] += 1
+        raise Rejected(status_code, message, self.retry_after)
+
+    @asynccontextmanager
+    async def admit(
+        self, client: str, timeout: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """
+        Holds a slot for the duration of the block, waiting for one if needed.
+
+        Parameters:
+        client (str): Identifies the client the per-client cap applies to
+        timeout (Optional[float]): Caps the queue wait below queue_timeout,
+            e.g. to the request deadline
+
+        Raises:
+        Rejected: The client is over its cap, the queue is full or the wait timed out
+        """
+        if self._slots is None:
+            yield
+            return
+        if self.max_per_client and self._clients.get(client, 0) >= self.max_per_client:
+            self._reject(429, "client_limit", "Too many concurrent requests")
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self._reject(503, "queue_full", "Server busy")
+        wait = min(self.queue_timeout, timeout) if timeout else self.queue_timeout
+        self._clients[client] = self._clients.get(client, 0) + 1
+        try:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), wait)
+            except asyncio.TimeoutError:
+                self._reject(503, "queue_timeout", "Server busy")
+            finally:
+                self.queued -= 1
+            self.active += 1
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self._slots.release()
+        finally:
+            self._clients[client] -= 1
+            if not self._clients[client]:
+                del self._clients[client]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the slot usage and the rejections per reason.
+        """
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+        }
+
+    def __call__(self) -> "AdmissionControl":
+        """
+        Make the AdmissionControl object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        AdmissionControl: The admission control object itself
+        """
+        return self
+
+
+async def run_until_disconnect(app, scope, receive, send):
+    """
+    Runs an ASGI app and cancels it when the client disconnects first, so its
+    database queries are cancelled instead of running for nobody.
+
+    The incoming messages are read by a watcher and handed to the app through
+    a queue, so the app still receives its body and the disconnect.
+    """
+    messages: asyncio.Queue = asyncio.Queue()
+
+    async def watch():
+        while True:
+            message = await receive()
+            messages.put_nowait(message)
+            if message["type"] == "http.disconnect":
+                return
+
+    watcher = asyncio.ensure_future(watch())
+    handler = asyncio.ensure_future(app(scope, messages.get, send))
+    try:
+        await asyncio.wait((watcher, handler), return_when=asyncio.FIRST_COMPLETED)
+        if not handler.done():
+            LOG.debug("Client disconnected, cancelling %s", scope["path"])
+            handler.cancel()
+            with suppress(asyncio.CancelledError):
+                await handler
+            return
+        handler.result()
+    finally:
+        watcher.cancel()
+        with suppress(asyncio.CancelledError):
+            await watcher
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting the requests of some paths through an
+    AdmissionControl, bounding them with a deadline and cancelling them when
+    the client disconnects.
+    """
+
+    def __init__(
+        self,
+        app,
+        control: AdmissionControl,
+        paths: Sequence[str] = ("/rates",),
+        deadline_seconds: float = 0.0,
+        client_header: str = "",
+    ) -> None:
+        self.app = app
+        self.control = control
+        self.paths: Tuple[str, ...] = tuple(paths)
+        self.deadline_seconds = deadline_seconds
+        self.client_header = client_header.lower().encode()
+
+    def client_of(self, scope) -> str:
+        """
+        Returns the client identity, the configured header or the peer address.
+        """
+        if self.client_header:
+            for name, value in scope.get("headers", ()):
+                if name == self.client_header:
+                    return value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else ""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+        with deadline(self.deadline_seconds):
+            try:
+                async with self.control.admit(
+                    self.client_of(scope), self.deadline_seconds
+                ):
+                    await run_until_disconnect(self.app, scope, receive, send)
+            except Rejected as e:
+                response = response_error(e.status_code, e.reason)
+                response.headers["Retry-After"] = str(e.retry_after)
+                await response(scope, receive, send)
+
+
+# Create an instance of the AdmissionControl class guarding the rates routes
+admission = AdmissionControl()
@@ -0,0 +1,127 @@
+"""Daily lane pre-aggregation maintenance"""
+
+from datetime import date, timedelta
+from logging import getLogger
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from lib.sqla.db import Database
+
+LOG = getLogger("rate_calculator")
+
+# Per lane and day sum and count of prices, combined across port pairs by AGGREGATE_QUERY.
+# The extremes and sum of squares serve the count, min, max and stddev statistics.
+CREATE_TABLE = text(
+    """ CREATE TABLE IF NOT EXISTS daily_lane_stats (
+            orig_code text NOT NULL,
+            dest_code text NOT NULL,
+            day date NOT NULL,
+            price_sum numeric NOT NULL,
+            price_count integer NOT NULL,
+            price_min integer,
+            price_max integer,
+            price_sq_sum numeric,
+            PRIMARY KEY (orig_code, dest_code, day)
+        )"""
+)
+
+# Tables created before the statistics columns existed need them added and filled
+HAS_STATS_COLUMNS = text(
+    """ SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'daily_lane_stats' and column_name = 'price_sq_sum'
+        )"""
+)
+
+ADD_STATS_COLUMNS = text(
+    """ ALTER TABLE daily_lane_stats
+            ADD COLUMN IF NOT EXISTS price_min integer,
+            ADD COLUMN IF NOT EXISTS price_max integer,
+            ADD COLUMN IF NOT EXISTS price_sq_sum numeric"""
+)
+
+DELETE_DAYS = text(
+    """ DELETE FROM daily_lane_stats
+            WHERE day between CAST(:since AS date) and CAST(:until AS date)"""
+)
+
+INSERT_DAYS = text(
+    """ INSERT INTO daily_lane_stats (
+                orig_code, dest_code, day,
+                price_sum, price_count, price_min, price_max, price_sq_sum
+            )
+            SELECT orig_code, dest_code, day,
+                   SUM(price), COUNT(price), MIN(price), MAX(price),
+                   SUM(CAST(price AS numeric) * price)
+            FROM prices
+            WHERE day between CAST(:since AS date) and CAST(:until AS date) and
+                  price IS NOT NULL
+            GROUP BY orig_code, dest_code, day"""
+)
+
+
+async def aggregate_window(
+    c: AsyncConnection,
+    since: Optional[date],
+    until: Optional[date],
+    lookback_days: int,
+) -> Tuple[date, date]:
+    """
+    Works out which days a refresh has to recompute.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    since (Optional[date]): First day to recompute, defaults to `lookback_days`
+        before the newest aggregated day, or everything when the table is empty
+    until (Optional[date]): Last day to recompute, defaults to no upper bound
+    lookback_days (int): Days of late arriving prices to fold in again
+
+    Returns:
+    Tuple[date, date]: The first and last day to recompute
+    """
+    if since is None:
+        result = await c.execute(text("SELECT MAX(day) FROM daily_lane_stats"))
+        newest = result.scalar()
+        since = newest - timedelta(days=lookback_days) if newest else date.min
+    return since, until or date.max
+
+
+async def refresh_daily_lane_stats(
+    db: Database,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    lookback_days: int = 7,
+) -> int:
+    """
+    Creates daily_lane_stats if needed and recomputes it for a window of days.
+
+    The window is replaced in a single transaction, so readers never see a
+    partially refreshed day.
+
+    Parameters:
+    db (Database): The database to refresh
+    since (Optional[date]): First day to recompute, see aggregate_window
+    until (Optional[date]): Last day to recompute, see aggregate_window
+    lookback_days (int): Days of late arriving prices to fold in again
+
+    Returns:
+    int: The number of lane and day rows written
+    """
+    async with db.begin() as conn:
+        await conn.execute(CREATE_TABLE)
+        if not (await conn.execute(HAS_STATS_COLUMNS)).scalar():
+            # Rows written without the statistics columns are all recomputed
+            await conn.execute(ADD_STATS_COLUMNS)
+            since = date.min
+        since, until = await aggregate_window(conn, since, until, lookback_days)
+        await conn.execute(DELETE_DAYS, {"since": since, "until": until})
+        result = await conn.execute(INSERT_DAYS, {"since": since, "until": until})
+    LOG.info(
+        "daily_lane_stats refreshed from %s to %s with %d rows",
+        since,
+        until,
+        result.rowcount,
+    )
+    return result.rowcount
@@ -2,13 +2,25 @@
 
 from argparse import Namespace
 from logging import getLogger
-from time import time
+from time import perf_counter, time
+from typing import List, Sequence
 
 from fastapi import FastAPI, Request
 
 from .routes import root
 from . import __version__
-from .db import database
+from .admission import AdmissionMiddleware, admission
+from .cache import LocalBackend, RedisBackend, rates_cache
+from .db import database, query_profiler
+from .hierarchy import port_hierarchy
+from .indexes import check_indexes
+from .metrics import REQUEST_LATENCY, REQUESTS
+from .planner import chunk_slots
+from .range_cache import range_cache
+from .version import data_version
+
+from lib.sqla.db import create_psql_connection_string
+import config as cfg
 
 LOG = getLogger("rate_calculator")
 
@@ -17,7 +29,11 @@ tags_metadata = [
     {
         "name": "Rate",
         "description": "This API is used to get the rates for a specified time period",
-    }
+    },
+    {
+        "name": "Status",
+        "description": "This API reports the service health and connection pool usage",
+    },
 ]
 
 
@@ -35,20 +51,53 @@ async def request_timing_middleware(request: Request, call_next):
     return response
 
 
+async def metrics_middleware(request: Request, call_next):
+    """
+    Middleware to count requests and record their latency per route and status.
+
+    Parameters:
+    request (Request): The incoming request object
+    call_next: The next callable to be executed
+    """
+    start_time = perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series bounded
+        route = request.scope.get("route")
+        labels = (
+            route.path if route is not None else "unmatched",
+            request.method,
+            str(status),
+        )
+        REQUESTS.inc(*labels)
+        REQUEST_LATENCY.observe(perf_counter() - start_time, *labels)
+
+
 class RateCalculator:
     """
     Rate calculator class to initiate the FastAPI framework and manage the application.
     """
 
-    def __init__(self, flags: Namespace, db_connection_string: str):
+    def __init__(
+        self,
+        flags: Namespace,
+        db_connection_string: str,
+        replica_connection_strings: Sequence[str] = (),
+    ):
         """
         Initializes the FastAPI application and configures the database connection.
 
         Parameters:
         flags (Namespace): Command line arguments or configuration flags
         db_connection_string (str): Database connection string
+        replica_connection_strings (Sequence[str]): Read replica connection strings
         """
         self._db_connection_string = db_connection_string
+        self._replica_connection_strings = replica_connection_strings
         self._flags = flags
         self.app = FastAPI(
             title="Rate Calculator API",
@@ -62,16 +111,83 @@ class RateCalculator:
         # Add startup and shutdown event handlers
         self.app.add_event_handler("startup", self._startup)
         self.app.add_event_handler("shutdown", self._shutdown)
+        # Admit, bound and cancel the rates requests, inside the metrics middleware
+        # so rejections are counted
+        self.app.add_middleware(
+            AdmissionMiddleware,
+            control=admission,
+            paths=cfg.ADMISSION_PATHS,
+            deadline_seconds=cfg.REQUEST_DEADLINE,
+            client_header=cfg.ADMISSION_CLIENT_HEADER,
+        )
+        # Add request metrics middleware
+        self.app.middleware("http")(metrics_middleware)
         # Add request timing middleware in debug mode
         if flags.debug:
             self.app.middleware("http")(request_timing_middleware)
 
     async def _startup(self):
         """
-        Startup event handler to configure the database.
+        Startup event handler to configure and warm up the database, load the port
+        hierarchy and set up the response and range caches.
         """
         LOG.debug("Startup signal received")
-        database.configure(self._db_connection_string)
+        admission.configure(
+            cfg.ADMISSION_MAX_CONCURRENT,
+            cfg.ADMISSION_MAX_PER_CLIENT,
+            cfg.ADMISSION_MAX_QUEUE,
+            cfg.ADMISSION_QUEUE_TIMEOUT,
+            cfg.ADMISSION_RETRY_AFTER,
+        )
+        chunk_slots.configure(cfg.RATES_PARALLEL_CONNECTIONS)
+        database.configure(
+            self._db_connection_string,
+            replicas=self._replica_connection_strings,
+            replica_policy=cfg.DB_REPLICA_POLICY,
+            max_replica_lag=cfg.DB_REPLICA_MAX_LAG,
+            pool_size=cfg.DB_POOL_SIZE,
+            max_overflow=cfg.DB_MAX_OVERFLOW,
+            pool_timeout=cfg.DB_POOL_TIMEOUT,
+            pool_recycle=cfg.DB_POOL_RECYCLE,
+            pool_pre_ping=cfg.DB_POOL_PRE_PING,
+            connect_args={
+                "prepared_statement_cache_size": cfg.DB_STATEMENT_CACHE_SIZE
+            },
+        )
+        query_profiler.configure(
+            cfg.SLOW_QUERY_THRESHOLD,
+            cfg.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+            cfg.SLOW_QUERY_EXPLAIN_FILE,
+        )
+        query_profiler.attach(database.engine)
+        for replica in database.replicas:
+            query_profiler.attach(replica.engine, replica.name)
+        await database.warm_up(cfg.DB_POOL_WARMUP)
+        await database.start_health_checks(cfg.DB_REPLICA_CHECK_INTERVAL)
+        if cfg.INDEX_CHECK_ON_STARTUP:
+            await check_indexes(database)
+        await port_hierarchy.start(
+            database, cfg.HIERARCHY_REFRESH_INTERVAL, cfg.HIERARCHY_NOTIFY_CHANNEL
+        )
+        if cfg.RATES_CACHE_BACKEND == "local":
+            rates_cache.configure(
+                LocalBackend(cfg.RATES_CACHE_MAX_BYTES), cfg.RATES_CACHE_TTL
+            )
+        elif cfg.RATES_CACHE_BACKEND == "redis":
+            rates_cache.configure(
+                RedisBackend(cfg.RATES_CACHE_REDIS_URL), cfg.RATES_CACHE_TTL
+            )
+        if cfg.RANGE_CACHE_ENABLED:
+            range_cache.configure(cfg.RANGE_CACHE_MAX_DAYS, cfg.RANGE_CACHE_TTL)
+        data_version.on_change(rates_cache.invalidate)
+        data_version.on_change(range_cache.invalidate)
+        # Replicas may not have replayed the change yet, keep them from refilling the caches
+        data_version.on_change(
+            lambda _version: database.prefer_primary(cfg.DB_REPLICA_MAX_LAG)
+        )
+        await data_version.start(
+            database, cfg.DATA_VERSION_REFRESH_INTERVAL, cfg.DATA_VERSION_CHANNEL
+        )
         if self._flags.debug:
             LOG.debug("Request timing logging middleware enabled in debug mode")
 
@@ -80,4 +196,51 @@ class RateCalculator:
         Shutdown event handler to dispose the database connection.
         """
         LOG.debug("Shutdown signal received")
-        await database.engine.dispose()
+        await port_hierarchy.stop()
+        await data_version.stop()
+        await database.dispose()
+        query_profiler.close()
+
+
+def replica_connection_strings() -> List[str]:
+    """
+    Builds the connection strings of the DB_REPLICA_HOSTS replicas.
+
+    Returns:
+    List[str]: One connection string per replica, with the primary's credentials
+    """
+    strings = []
+    for host in cfg.DB_REPLICA_HOSTS:
+        hostname, _, port = host.partition(":")
+        strings.append(
+            create_psql_connection_string(
+                cfg.DB_USERNAME,
+                cfg.DB_PASSWORD,
+                hostname,
+                cfg.DB_DATABASE,
+                int(port) if port else cfg.DB_PORT,
+            )
+        )
+    return strings
+
+
+def create_app() -> FastAPI:
+    """
+    Application factory used by uvicorn, so every worker process builds its own
+    RateCalculator and database pool after it has been started.
+
+    Returns:
+    FastAPI: The application of a new RateCalculator configured from config.py
+    """
+    rc = RateCalculator(
+        Namespace(debug=cfg.DEBUG),
+        create_psql_connection_string(
+            cfg.DB_USERNAME,
+            cfg.DB_PASSWORD,
+            cfg.DB_HOSTNAME,
+            cfg.DB_DATABASE,
+            cfg.DB_PORT,
+        ),
+        replica_connection_strings(),
+    )
+    return rc.app
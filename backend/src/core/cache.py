@@ -0,0 +1,236 @@
+"""Response cache for the rates API"""
+
+from collections import OrderedDict
+from datetime import date
+from hashlib import sha1
+from logging import getLogger
+from time import monotonic
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+LOG = getLogger("rate_calculator")
+
+
+class LocalBackend:
+    """
+    In-process LRU cache bounded by the total size of keys and values.
+    """
+
+    def __init__(self, max_bytes: int, clock: Callable[[], float] = monotonic) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached value, or None when it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self._clock():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        """
+        Stores a value for `ttl` seconds, evicting the least recently used entries
+        once the size bound is exceeded.
+        """
+        if key in self._entries:
+            self._remove(key)
+        cost = len(key) + len(value)
+        if cost > self.max_bytes:
+            return
+        self._entries[key] = (self._clock() + ttl, value)
+        self.size += cost
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.size -= len(key) + len(value)
+
+
+class RedisBackend:
+    """
+    Redis cache shared by every worker. Eviction is left to the server's
+    maxmemory-policy, which should be set to allkeys-lru.
+    """
+
+    def __init__(self, url: str, prefix: str = "rates:", timeout: float = 1.0) -> None:
+        try:
+            # pylint: disable=import-outside-toplevel
+            from redis import asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "The redis cache backend requires the redis package to be installed"
+            ) from e
+        self.prefix = prefix
+        self.evictions = 0
+        # A slow cache must not hold requests longer than the query it saves
+        self._client = redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached value, or None when it is missing or expired.
+        """
+        return await self._client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        """
+        Stores a value for `ttl` seconds.
+        """
+        await self._client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def clear(self):
+        """
+        Entries are keyed by dataset version, stale ones simply expire.
+        """
+
+    def __len__(self) -> int:
+        return 0
+
+
+class RatesCache:
+    """
+    Cache of encoded /rates responses keyed on the resolved lane, date range
+    and dataset version.
+
+    Backend failures, e.g. Redis being unreachable, are logged and counted but
+    never fail a request: a failed read is a miss and a failed write is skipped.
+    """
+
+    def __init__(self) -> None:
+        self.backend = None
+        self.ttl = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether a backend has been configured.
+        """
+        return self.backend is not None
+
+    def configure(self, backend, ttl: float):
+        """
+        Sets the storage backend and the entry lifetime.
+
+        Parameters:
+        backend: LocalBackend, RedisBackend or None to disable caching
+        ttl (float): Seconds an entry stays valid
+        """
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def key(
+        version: int,
+        origin: Sequence[str],
+        destination: Sequence[str],
+        date_from: date,
+        date_to: date,
+        variant: str = "",
+    ) -> str:
+        """
+        Builds the cache key for a normalized rates query.
+
+        Parameters:
+        version (int): The dataset version
+        origin (Sequence[str]): Resolved origin port codes, sorted
+        destination (Sequence[str]): Resolved destination port codes, sorted
+        date_from (date): Start date for the range (inclusive)
+        date_to (date): End date for the range (inclusive)
+        variant (str): Further options changing the response, e.g. the statistics
+
+        Returns:
+        str: The cache key
+        """
+        # Hash the port lists, region lanes can expand to hundreds of codes
+        lane = sha1(
+            (",".join(origin) + "|" + ",".join(destination)).encode()
+        ).hexdigest()
+        key = f"{version}:{lane}:{date_from.isoformat()}:{date_to.isoformat()}"
+        return f"{key}:{variant}" if variant else key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached response body and counts the hit or miss.
+        """
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:  # pylint: disable=broad-except
+            self.errors += 1
+            LOG.warning("Rates cache read failed, treated as a miss: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes):
+        """
+        Stores a response body.
+        """
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception as e:  # pylint: disable=broad-except
+            self.errors += 1
+            LOG.warning("Rates cache write failed, skipped: %s", e)
+
+    def invalidate(self, _version: int = 0):
+        """
+        Frees entries made stale by a dataset version change.
+        """
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+        Dict[str, int]: Hits, misses, backend errors, evictions, entries and bytes held
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "evictions": self.backend.evictions if self.enabled else 0,
+            "entries": len(self.backend) if self.enabled else 0,
+            "bytes": getattr(self.backend, "size", 0),
+        }
+
+    def __call__(self) -> "RatesCache":
+        """
+        Make the RatesCache object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        RatesCache: The cache object itself
+        """
+        return self
+
+
+# Create an instance of the RatesCache class
+rates_cache = RatesCache()
@@ -0,0 +1,125 @@
+"""HTTP validators and conditional requests"""
+
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import sha1
+from typing import Dict, Optional
+
+
+def entity_tag(cache_key: str, media_type: str) -> str:
+    """
+    Returns the ETag of a response, derived from its cache key and media type.
+
+    The cache key holds the dataset version, the resolved lane, the date range
+    and the options, so the tag changes whenever the body may.
+
+    Parameters:
+    cache_key (str): The RatesCache key of the response
+    media_type (str): The media type of the response
+
+    Returns:
+    str: A strong entity tag, quoted
+    """
+    return '"%s"' % sha1(f"{cache_key}|{media_type}".encode()).hexdigest()
+
+
+def cache_control(
+    date_to: date, today: date, historical_max_age: int, current_max_age: int
+) -> str:
+    """
+    Returns the Cache-Control of a date range: windows ending before today
+    only change when past prices are corrected, later ones as prices arrive.
+
+    Parameters:
+    date_to (date): End date of the range (inclusive)
+    today (date): The current day
+    historical_max_age (int): Max age in seconds of windows fully in the past
+    current_max_age (int): Max age in seconds of windows touching today or later
+
+    Returns:
+    str: The Cache-Control header value
+    """
+    max_age = historical_max_age if date_to < today else current_max_age
+    return f"public, max-age={max_age}"
+
+
+def validator_headers(
+    cache_key: str,
+    media_type: str,
+    updated_at: Optional[datetime],
+    date_to: date,
+    today: date,
+    historical_max_age: int,
+    current_max_age: int,
+) -> Dict[str, str]:
+    """
+    Builds the caching headers of a rates response.
+
+    ETag and Last-Modified are only sent once the dataset version is tracked,
+    i.e. `updated_at` is known, as data changed without a version bump would
+    otherwise be validated as unchanged. For the same reason responses of an
+    untracked dataset are not cached without revalidation.
+
+    Parameters:
+    cache_key (str): The RatesCache key of the response
+    media_type (str): The media type of the response
+    updated_at (Optional[datetime]): When the dataset last changed
+    date_to (date): End date of the range (inclusive)
+    today (date): The current day, in UTC
+    historical_max_age (int): See cache_control
+    current_max_age (int): See cache_control
+
+    Returns:
+    Dict[str, str]: The Cache-Control, Vary, ETag and Last-Modified headers
+    """
+    headers = {
+        "Cache-Control": (
+            cache_control(date_to, today, historical_max_age, current_max_age)
+            if updated_at is not None
+            else "no-cache"
+        ),
+        # The Accept header selects the JSON, NDJSON or CSV representation
+        "Vary": "Accept",
+    }
+    if updated_at is not None:
+        headers["ETag"] = entity_tag(cache_key, media_type)
+        headers["Last-Modified"] = format_datetime(
+            updated_at.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def not_modified(
+    headers: Dict[str, str],
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+) -> bool:
+    """
+    Tells whether a conditional GET can be answered with 304 Not Modified.
+
+    If-None-Match takes precedence over If-Modified-Since, as per RFC 9110.
+
+    Parameters:
+    headers (Dict[str, str]): The headers from validator_headers
+    if_none_match (Optional[str]): The If-None-Match request header
+    if_modified_since (Optional[str]): The If-Modified-Since request header
+
+    Returns:
+    bool: True when the client's copy is current
+    """
+    etag = headers.get("ETag")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return parsedate_to_datetime(last_modified) <= since
@@ -1,30 +1,110 @@
 """DB Crud operations lib"""
 
-from typing import List
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from sqlalchemy import text
 from sqlalchemy.engine import Row
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.ext.asyncio import AsyncConnection
 
-# SQL query template for fetching average prices
-QUERY = """ SELECT day,
-            CASE 
-               WHEN COUNT(price) >= 3 THEN AVG(price) 
-               ELSE NULL 
-            END AS average_price 
+# Days with fewer prices than this have no average
+MIN_PRICE_COUNT = 3
+
+# Rows fetched per round trip by server-side cursors
+STREAM_BATCH_ROWS = 1000
+
+
+class DailyAverage(NamedTuple):
+    """
+    A day and its average price, shaped like the rows of QUERY.
+    """
+
+    day: date
+    average_price: Optional[Decimal]
+
+
+def averages_from_sums(
+    sums: Iterable[Tuple[date, Decimal, int]],
+    min_count: int = MIN_PRICE_COUNT,
+) -> List[DailyAverage]:
+    """
+    Turns per-day price sums and counts into average prices, applying the same
+    minimum count rule as QUERY.
+
+    Parameters:
+    sums (Iterable[Tuple[date, Decimal, int]]): (day, price sum, price count) in day order
+    min_count (int): Days with fewer prices have no average
+
+    Returns:
+    List[DailyAverage]: The day and average price, None below `min_count`
+    """
+    return [
+        DailyAverage(
+            day,
+            Decimal(price_sum) / price_count if price_count >= min_count else None,
+        )
+        for day, price_sum, price_count in sums
+    ]
+
+
+# SQL query for fetching average prices. The statement text never changes, all
+# inputs are bound parameters, so asyncpg can reuse its prepared statement. The
+# average is returned as a float, which asyncpg decodes much faster than numeric.
+# The day range compares the bare day column with parameters, which lets
+# Postgres prune the partitions of a partitioned prices table, also when a
+# generic plan is reused.
+QUERY = text(
+    """ SELECT day,
+            CASE
+               WHEN COUNT(price) >= 3 THEN CAST(AVG(price) AS double precision)
+               ELSE NULL
+            END AS average_price
             FROM prices
-            WHERE orig_code in ({}) and
-                  dest_code in ({}) and 
-                  day between '{}' and '{}'
+            WHERE orig_code = ANY(CAST(:origin AS text[])) and
+                  dest_code = ANY(CAST(:destination AS text[])) and
+                  day between CAST(:date_from AS date) and CAST(:date_to AS date)
             GROUP BY day
             ORDER BY day"""
+)
+
+# Same result as QUERY, combined from the per-day sums and counts kept in
+# daily_lane_stats instead of the raw prices rows
+AGGREGATE_QUERY = text(
+    """ SELECT day,
+            CASE
+               WHEN SUM(price_count) >= 3
+               THEN CAST(SUM(price_sum) / SUM(price_count) AS double precision)
+               ELSE NULL
+            END AS average_price
+            FROM daily_lane_stats
+            WHERE orig_code = ANY(CAST(:origin AS text[])) and
+                  dest_code = ANY(CAST(:destination AS text[])) and
+                  day between CAST(:date_from AS date) and CAST(:date_to AS date)
+            GROUP BY day
+            ORDER BY day"""
+)
 
 
 async def get_average_prices(
     c: AsyncConnection,
-    origin: str,
-    destination: str,
-    date_from: str,
-    date_to: str,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    use_aggregates: bool = False,
 ) -> List[Row]:
     """
     Fetches the average prices for the given origin and destination ports
@@ -32,36 +112,536 @@ async def get_average_prices(
 
     Parameters:
     c (AsyncConnection): The database connection
-    origin (str): Origin port code or region slug
-    destination (str): Destination port code or region slug
-    date_from (str): Start date for the range (inclusive)
-    date_to (str): End date for the range (inclusive)
+    origin (Sequence[str]): Resolved origin port codes
+    destination (Sequence[str]): Resolved destination port codes
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+    use_aggregates (bool): Read from daily_lane_stats instead of prices
 
     Returns:
     List[Row]: A list of rows containing the day and average price,
     with NULL for days having less than 3 prices
     """
     result = await c.execute(
-        text(QUERY.format(origin, destination, date_from, date_to))
+        AGGREGATE_QUERY if use_aggregates else QUERY,
+        {
+            "origin": list(origin),
+            "destination": list(destination),
+            "date_from": date_from,
+            "date_to": date_to,
+        },
     )
     return result.fetchall()
 
 
-async def get_port_codes(c: AsyncConnection, port: str) -> List[Row]:
+async def stream_average_prices(
+    c: AsyncConnection,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    use_aggregates: bool = False,
+) -> AsyncIterator[Row]:
     """
-    Validates the port code or slug name by fetching the corresponding port codes from the database.
+    Streams the average prices like get_average_prices, through a server-side
+    cursor so memory use does not grow with the date range.
 
     Parameters:
     c (AsyncConnection): The database connection
-    port (str): The port code or region slug to validate
+    origin (Sequence[str]): Resolved origin port codes
+    destination (Sequence[str]): Resolved destination port codes
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+    use_aggregates (bool): Read from daily_lane_stats instead of prices
 
     Returns:
-    List[Row]: A list of rows containing the port codes
+    AsyncIterator[Row]: Rows containing the day and average price
+    """
+    async with c.stream(
+        AGGREGATE_QUERY if use_aggregates else QUERY,
+        {
+            "origin": list(origin),
+            "destination": list(destination),
+            "date_from": date_from,
+            "date_to": date_to,
+        },
+        execution_options={"yield_per": STREAM_BATCH_ROWS},
+    ) as result:
+        async for row in result:
+            yield row
+
+
+# Per-day sum and count of prices, for callers that combine partial results
+SUMS_QUERY = text(
+    """ SELECT day, SUM(price) AS price_sum, COUNT(price) AS price_count
+            FROM prices
+            WHERE orig_code = ANY(CAST(:origin AS text[])) and
+                  dest_code = ANY(CAST(:destination AS text[])) and
+                  day between CAST(:date_from AS date) and CAST(:date_to AS date)
+            GROUP BY day
+            ORDER BY day"""
+)
+
+AGGREGATE_SUMS_QUERY = text(
+    """ SELECT day, SUM(price_sum) AS price_sum, SUM(price_count) AS price_count
+            FROM daily_lane_stats
+            WHERE orig_code = ANY(CAST(:origin AS text[])) and
+                  dest_code = ANY(CAST(:destination AS text[])) and
+                  day between CAST(:date_from AS date) and CAST(:date_to AS date)
+            GROUP BY day
+            ORDER BY day"""
+)
+
+
+async def get_daily_sums(
+    c: AsyncConnection,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    use_aggregates: bool = False,
+) -> List[Row]:
+    """
+    Fetches the per-day sum and count of prices for the given origin and
+    destination ports within the specified date range.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    origin (Sequence[str]): Resolved origin port codes
+    destination (Sequence[str]): Resolved destination port codes
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+    use_aggregates (bool): Read from daily_lane_stats instead of prices
+
+    Returns:
+    List[Row]: A list of rows containing the day, price sum and price count
+    for every day having prices
     """
     result = await c.execute(
-        text(
-            f"select DISTINCT code from ports where code='{port}' or \
-            parent_slug in (select slug from regions where slug='{port}' or parent_slug='{port}')"
-        )
+        AGGREGATE_SUMS_QUERY if use_aggregates else SUMS_QUERY,
+        {
+            "origin": list(origin),
+            "destination": list(destination),
+            "date_from": date_from,
+            "date_to": date_to,
+        },
+    )
+    return result.fetchall()
+
+
+# Per lane and day sum and count of prices for many lanes at once. Lanes are
+# passed as parallel arrays; the port codes of every lane are flattened into
+# (lane, code) pairs since Postgres arrays cannot be ragged. The span of all
+# lanes is repeated as parameters, as partitions cannot be pruned on the
+# per-lane ranges of the join.
+BATCH_SUMS_TEMPLATE = """ WITH lanes AS (
+                SELECT * FROM unnest(
+                    CAST(:lane_ids AS int[]),
+                    CAST(:dates_from AS date[]),
+                    CAST(:dates_to AS date[])
+                ) AS lanes(lane, date_from, date_to)
+            ), origins AS (
+                SELECT * FROM unnest(
+                    CAST(:origin_lanes AS int[]), CAST(:origin_codes AS text[])
+                ) AS origins(lane, code)
+            ), destinations AS (
+                SELECT * FROM unnest(
+                    CAST(:destination_lanes AS int[]), CAST(:destination_codes AS text[])
+                ) AS destinations(lane, code)
+            )
+            SELECT lanes.lane, p.day,
+                   {price_sum} AS price_sum, {price_count} AS price_count
+            FROM lanes
+            JOIN origins ON origins.lane = lanes.lane
+            JOIN destinations ON destinations.lane = lanes.lane
+            JOIN {source} p ON p.orig_code = origins.code and
+                               p.dest_code = destinations.code and
+                               p.day between lanes.date_from and lanes.date_to
+            WHERE p.day between CAST(:span_from AS date) and CAST(:span_to AS date)
+            GROUP BY lanes.lane, p.day
+            ORDER BY lanes.lane, p.day"""
+
+BATCH_SUMS_QUERY = text(
+    BATCH_SUMS_TEMPLATE.format(
+        source="prices", price_sum="SUM(p.price)", price_count="COUNT(p.price)"
+    )
+)
+
+AGGREGATE_BATCH_SUMS_QUERY = text(
+    BATCH_SUMS_TEMPLATE.format(
+        source="daily_lane_stats",
+        price_sum="SUM(p.price_sum)",
+        price_count="SUM(p.price_count)",
+    )
+)
+
+
+async def get_batch_daily_sums(
+    c: AsyncConnection,
+    lanes: Sequence[Tuple[Sequence[str], Sequence[str], date, date]],
+    use_aggregates: bool = False,
+) -> List[Row]:
+    """
+    Fetches the per-day sum and count of prices for many lanes in one statement.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    lanes (Sequence[Tuple[Sequence[str], Sequence[str], date, date]]): Resolved
+        origin port codes, destination port codes, start and end date of every lane
+    use_aggregates (bool): Read from daily_lane_stats instead of prices
+
+    Returns:
+    List[Row]: A list of rows containing the lane position in `lanes`, the day,
+    price sum and price count, ordered by lane and day
+    """
+    params = {
+        "lane_ids": [],
+        "dates_from": [],
+        "dates_to": [],
+        "origin_lanes": [],
+        "origin_codes": [],
+        "destination_lanes": [],
+        "destination_codes": [],
+    }
+    for lane, (origin, destination, date_from, date_to) in enumerate(lanes):
+        params["lane_ids"].append(lane)
+        params["dates_from"].append(date_from)
+        params["dates_to"].append(date_to)
+        params["origin_lanes"].extend([lane] * len(origin))
+        params["origin_codes"].extend(origin)
+        params["destination_lanes"].extend([lane] * len(destination))
+        params["destination_codes"].extend(destination)
+    params["span_from"] = min(params["dates_from"], default=None)
+    params["span_to"] = max(params["dates_to"], default=None)
+    result = await c.execute(
+        AGGREGATE_BATCH_SUMS_QUERY if use_aggregates else BATCH_SUMS_QUERY, params
+    )
+    return result.fetchall()
+
+
+# Sizes of the periods prices can be averaged over
+BUCKETS = ("day", "week", "month")
+
+# Per bucket sums and counts, summed again over a moving window of buckets.
+# Averages are the windowed sum divided by the windowed count, so every price
+# weighs the same whatever the bucket it falls in.
+BUCKET_SUMS_TEMPLATE = """ WITH buckets AS (
+                SELECT CAST(date_trunc(CAST(:bucket AS text), day) AS date) AS day,
+                       {price_sum} AS price_sum, {price_count} AS price_count
+                FROM {source}
+                WHERE orig_code = ANY(CAST(:origin AS text[])) and
+                      dest_code = ANY(CAST(:destination AS text[])) and
+                      day between CAST(:fetch_from AS date) and CAST(:date_to AS date)
+                GROUP BY 1
+            ), windows AS (
+                SELECT day,
+                       SUM(price_sum) OVER w AS price_sum,
+                       SUM(price_count) OVER w AS price_count
+                FROM buckets
+                WINDOW w AS (
+                    ORDER BY day RANGE BETWEEN make_interval(
+                        months => CAST(:window_months AS int),
+                        days => CAST(:window_days AS int)
+                    ) PRECEDING AND CURRENT ROW
+                )
+            )
+            SELECT day, price_sum, price_count
+            FROM windows
+            WHERE day >= CAST(:first_bucket AS date)
+            ORDER BY day"""
+
+BUCKET_SUMS_QUERY = text(
+    BUCKET_SUMS_TEMPLATE.format(
+        source="prices", price_sum="SUM(price)", price_count="COUNT(price)"
+    )
+)
+
+AGGREGATE_BUCKET_SUMS_QUERY = text(
+    BUCKET_SUMS_TEMPLATE.format(
+        source="daily_lane_stats",
+        price_sum="SUM(price_sum)",
+        price_count="SUM(price_count)",
+    )
+)
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    """
+    Returns the first day of the bucket containing `day`, weeks start on Monday
+    like date_trunc.
+    """
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def buckets_before(start: date, bucket: str, count: int) -> date:
+    """
+    Returns the first day of the bucket `count` buckets before the one
+    starting at `start`.
+    """
+    if bucket == "month":
+        years, month = divmod(start.month - 1 - count, 12)
+        return date(start.year + years, month + 1, 1)
+    return start - timedelta(days=count * (7 if bucket == "week" else 1))
+
+
+async def get_bucketed_sums(
+    c: AsyncConnection,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    bucket: str = "day",
+    rolling: int = 1,
+    use_aggregates: bool = False,
+) -> List[Row]:
+    """
+    Fetches the sum and count of prices per day, week or month, optionally
+    summed over a moving window of buckets.
+
+    Buckets are labelled with their first day. The first bucket only holds the
+    prices from `date_from` on, unless `rolling` is above 1: windows are then
+    filled with the full buckets preceding it.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    origin (Sequence[str]): Resolved origin port codes
+    destination (Sequence[str]): Resolved destination port codes
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+    bucket (str): "day", "week" or "month"
+    rolling (int): Number of buckets averaged together, ending at each bucket
+    use_aggregates (bool): Read from daily_lane_stats instead of prices
+
+    Returns:
+    List[Row]: A list of rows containing the bucket's first day, price sum and
+    price count, for every bucket having prices
+    """
+    first_bucket = bucket_start(date_from, bucket)
+    window = rolling - 1
+    fetch_from = buckets_before(first_bucket, bucket, window) if window else date_from
+    window_days = 0 if bucket == "month" else window * (7 if bucket == "week" else 1)
+    result = await c.execute(
+        AGGREGATE_BUCKET_SUMS_QUERY if use_aggregates else BUCKET_SUMS_QUERY,
+        {
+            "origin": list(origin),
+            "destination": list(destination),
+            "bucket": bucket,
+            "fetch_from": fetch_from,
+            "date_to": date_to,
+            "first_bucket": first_bucket,
+            "window_months": window if bucket == "month" else 0,
+            "window_days": window_days,
+        },
     )
     return result.fetchall()
+
+
+# Statistics selectable per day next to the average, in response order
+PRICE_STATS = ("count", "min", "max", "median", "p10", "p90", "stddev")
+
+# Fraction of the percentile statistics
+PERCENTILES = {"p10": 0.1, "median": 0.5, "p90": 0.9}
+
+# Statistics daily_lane_stats can answer, percentiles need the raw prices
+AGGREGATE_STATS = frozenset(("count", "min", "max", "stddev"))
+
+# Per day statistics of the raw prices, the selected columns are filled in by
+# stats_query. All percentiles come from a single sort of the day's prices.
+STATS_TEMPLATE = """ SELECT day, COUNT(price) AS count,
+                   CAST(AVG(price) AS double precision) AS average_price{columns}
+            FROM prices
+            WHERE orig_code = ANY(CAST(:origin AS text[])) and
+                  dest_code = ANY(CAST(:destination AS text[])) and
+                  day between CAST(:date_from AS date) and CAST(:date_to AS date)
+            GROUP BY day
+            ORDER BY day"""
+
+# The per day building blocks of count, average, min, max and stddev, combined
+# across port pairs from daily_lane_stats
+AGGREGATE_STATS_QUERY = text(
+    """ SELECT day, SUM(price_count) AS count, SUM(price_sum) AS price_sum,
+               SUM(price_sq_sum) AS price_sq_sum,
+               MIN(price_min) AS min, MAX(price_max) AS max
+            FROM daily_lane_stats
+            WHERE orig_code = ANY(CAST(:origin AS text[])) and
+                  dest_code = ANY(CAST(:destination AS text[])) and
+                  day between CAST(:date_from AS date) and CAST(:date_to AS date)
+            GROUP BY day
+            ORDER BY day"""
+)
+
+
+@lru_cache(maxsize=None)
+def stats_query(stats: Tuple[str, ...]) -> TextClause:
+    """
+    Builds the per day statistics query of a selection, one statement per
+    selection so each keeps its prepared statement.
+
+    Parameters:
+    stats (Tuple[str, ...]): Selected statistics, in PRICE_STATS order
+
+    Returns:
+    TextClause: The query returning day, count, average_price, the selected
+    min, max and stddev, and an array of the selected percentiles
+    """
+    columns = ""
+    if "min" in stats:
+        columns += ", MIN(price) AS min"
+    if "max" in stats:
+        columns += ", MAX(price) AS max"
+    if "stddev" in stats:
+        columns += ", CAST(stddev_samp(price) AS double precision) AS stddev"
+    fractions = [str(PERCENTILES[name]) for name in stats if name in PERCENTILES]
+    if fractions:
+        columns += (
+            f", percentile_cont(ARRAY[{', '.join(fractions)}]) "
+            "WITHIN GROUP (ORDER BY price) AS percentiles"
+        )
+    return text(STATS_TEMPLATE.format(columns=columns))
+
+
+def stats_from_aggregates(values: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Computes the average and sample standard deviation of a day from the sum,
+    sum of squares and count of its prices.
+
+    Parameters:
+    values (Mapping[str, Any]): A row of AGGREGATE_STATS_QUERY, every day has
+        at least one price
+
+    Returns:
+    Dict[str, Any]: count, average_price, min, max and stddev of the day
+    """
+    count, price_sum = int(values["count"]), Decimal(values["price_sum"])
+    stddev = None
+    if count > 1:
+        squares = Decimal(values["price_sq_sum"]) - price_sum * price_sum / count
+        stddev = float(max(squares / (count - 1), Decimal(0)).sqrt())
+    return {
+        "count": count,
+        "average_price": float(price_sum / count),
+        "min": values["min"],
+        "max": values["max"],
+        "stddev": stddev,
+    }
+
+
+def shape_price_stats(
+    rows: Iterable[Dict[str, Any]], stats: Sequence[str], min_samples: int
+) -> List[Dict[str, Any]]:
+    """
+    Keeps the selected statistics of every day, none but the count for days
+    with fewer than `min_samples` prices.
+
+    Parameters:
+    rows (Iterable[Dict[str, Any]]): Per day values, percentiles as an array
+        in the order of `stats`
+    stats (Sequence[str]): Selected statistics, in PRICE_STATS order
+    min_samples (int): Days with fewer prices have no statistics
+
+    Returns:
+    List[Dict[str, Any]]: day, average_price and the selected statistics of every day
+    """
+    percentile_names = [name for name in stats if name in PERCENTILES]
+    result = []
+    for row in rows:
+        enough = row["count"] >= min_samples
+        values = dict(zip(percentile_names, row.get("percentiles") or ()))
+        day = {
+            "day": row["day"],
+            "average_price": row["average_price"] if enough else None,
+        }
+        for name in stats:
+            value = row["count"] if name == "count" else values.get(name, row.get(name))
+            day[name] = value if enough or name == "count" else None
+        result.append(day)
+    return result
+
+
+async def get_price_stats(
+    c: AsyncConnection,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    stats: Sequence[str],
+    min_samples: int = MIN_PRICE_COUNT,
+    use_aggregates: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Fetches the average price and the selected statistics of every day in a
+    single aggregation.
+
+    daily_lane_stats is only read when `use_aggregates` is set and no
+    percentile is selected, percentiles need the raw prices.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    origin (Sequence[str]): Resolved origin port codes
+    destination (Sequence[str]): Resolved destination port codes
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+    stats (Sequence[str]): Selected statistics, see PRICE_STATS
+    min_samples (int): Days with fewer prices have no average nor statistics
+    use_aggregates (bool): Read from daily_lane_stats when possible
+
+    Returns:
+    List[Dict[str, Any]]: day, average_price and the selected statistics of
+    every day having prices
+    """
+    stats = tuple(name for name in PRICE_STATS if name in stats)
+    params = {
+        "origin": list(origin),
+        "destination": list(destination),
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    if use_aggregates and AGGREGATE_STATS.issuperset(stats):
+        result = await c.execute(AGGREGATE_STATS_QUERY, params)
+        rows = [
+            # Row is a tuple, so row.count would be tuple.count
+            {"day": row.day, **stats_from_aggregates(row._mapping)}
+            for row in result.fetchall()
+        ]
+    else:
+        result = await c.execute(stats_query(stats), params)
+        rows = [row._asdict() for row in result.fetchall()]
+    return shape_price_stats(rows, stats, min_samples)
+
+
+# Constant statements of the port hierarchy, prepared once per connection
+PORTS_QUERY = text("SELECT code, parent_slug FROM ports")
+
+REGIONS_QUERY = text("SELECT slug, parent_slug FROM regions")
+
+
+async def get_ports(c: AsyncConnection) -> List[Row]:
+    """
+    Fetches every port together with the region it belongs to.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+
+    Returns:
+    List[Row]: A list of rows containing the port code and parent slug
+    """
+    result = await c.execute(PORTS_QUERY)
+    return result.fetchall()
+
+
+async def get_regions(c: AsyncConnection) -> List[Row]:
+    """
+    Fetches every region together with its parent region.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+
+    Returns:
+    List[Row]: A list of rows containing the region slug and parent slug
+    """
+    result = await c.execute(REGIONS_QUERY)
+    return result.fetchall()
@@ -1,6 +1,10 @@
 """Database initialization"""
 
 from lib.sqla.db import Database
+from lib.sqla.profiler import QueryProfiler
 
 # Create an instance of the Database class
 database = Database()
+
+# Create an instance of the QueryProfiler class timing the database statements
+query_profiler = QueryProfiler()
@@ -0,0 +1,202 @@
+"""In-process port and region hierarchy index"""
+
+import asyncio
+from logging import getLogger
+from typing import Callable, Awaitable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from lib.sqla.db import Database
+from .crud import get_ports, get_regions
+
+LOG = getLogger("rate_calculator")
+
+# Tables whose changes alter the hierarchy
+HIERARCHY_TABLES = ("ports", "regions")
+
+NOTIFY_FUNCTION = text(
+    """ CREATE OR REPLACE FUNCTION notify_port_hierarchy_changed() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify(TG_ARGV[0], TG_TABLE_NAME);
+            RETURN NULL;
+        END
+        $$"""
+)
+
+
+def build_index(
+    ports: Iterable[Tuple[str, Optional[str]]],
+    regions: Iterable[Tuple[str, Optional[str]]],
+) -> Dict[str, Tuple[str, ...]]:
+    """
+    Builds the slug/code to port codes map covering every level of region nesting.
+
+    Parameters:
+    ports (Iterable[Tuple[str, Optional[str]]]): (code, parent_slug) pairs
+    regions (Iterable[Tuple[str, Optional[str]]]): (slug, parent_slug) pairs
+
+    Returns:
+    Dict[str, Tuple[str, ...]]: Sorted port codes for every port code and region slug
+    """
+    children: Dict[str, List[str]] = {}
+    for slug, parent_slug in regions:
+        children.setdefault(slug, [])
+        if parent_slug:
+            children.setdefault(parent_slug, []).append(slug)
+
+    direct_ports: Dict[str, Set[str]] = {}
+    index: Dict[str, Set[str]] = {}
+    for code, parent_slug in ports:
+        index.setdefault(code, set()).add(code)
+        if parent_slug:
+            direct_ports.setdefault(parent_slug, set()).add(code)
+
+    for slug in children:
+        codes = index.setdefault(slug, set())
+        # Iterative walk guarded by `seen` so a cyclic parent_slug cannot loop forever
+        seen = {slug}
+        stack = [slug]
+        while stack:
+            current = stack.pop()
+            codes.update(direct_ports.get(current, ()))
+            for child in children.get(current, ()):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+
+    return {key: tuple(sorted(codes)) for key, codes in index.items() if codes}
+
+
+async def create_hierarchy_trigger(db: Database, channel: str):
+    """
+    Installs statement level triggers on the hierarchy tables sending a NOTIFY
+    on `channel` whenever they change, so running applications reload the
+    hierarchy without waiting for the periodic refresh.
+
+    The notification is sent once per statement, with the table name as
+    payload, and only delivered when the changing transaction commits.
+    Re-running replaces the triggers, e.g. after the channel changed.
+
+    Parameters:
+    db (Database): The database to install the triggers in
+    channel (str): NOTIFY channel the applications listen on
+    """
+    literal = channel.replace("'", "''")
+    async with db.begin() as conn:
+        await conn.execute(NOTIFY_FUNCTION)
+        for table in HIERARCHY_TABLES:
+            trigger = f"{table}_hierarchy_changed"
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+            await conn.execute(
+                text(
+                    f"CREATE TRIGGER {trigger} "
+                    "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE "
+                    f"ON {table} FOR EACH STATEMENT "
+                    f"EXECUTE FUNCTION notify_port_hierarchy_changed('{literal}')"
+                )
+            )
+    LOG.info("Port hierarchy changes notified on %s", channel)
+
+
+class PortHierarchy:
+    """
+    Slug-to-port-codes index loaded from the `ports` and `regions` tables.
+
+    The index is rebuilt off the request path and swapped in with a single
+    assignment, so readers always see a complete snapshot.
+    """
+
+    def __init__(self) -> None:
+        self._index: Dict[str, Tuple[str, ...]] = {}
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._unlisten: Optional[Callable[[], Awaitable[None]]] = None
+
+    def resolve(self, port: str) -> Tuple[str, ...]:
+        """
+        Resolves a port code or region slug into port codes.
+
+        Parameters:
+        port (str): The port code or region slug
+
+        Returns:
+        Tuple[str, ...]: The matching port codes, empty if the input is unknown
+        """
+        return self._index.get(port, ())
+
+    async def refresh(self, db: Database, from_primary: bool = False):
+        """
+        Reloads the hierarchy from the database and swaps it in.
+
+        Parameters:
+        db (Database): The database to load from
+        from_primary (bool): Read from the primary, for changes replicas may
+            not have replayed yet
+        """
+        async with db.connect() if from_primary else db.read() as conn:
+            ports = await get_ports(conn)
+            regions = await get_regions(conn)
+        self._index = build_index(ports, regions)
+        LOG.info("Port hierarchy loaded with %d entries", len(self._index))
+
+    async def start(self, db: Database, interval: int, channel: str = ""):
+        """
+        Loads the hierarchy and starts reloading it periodically and on NOTIFY.
+
+        Parameters:
+        db (Database): The database to load from
+        interval (int): Seconds between periodic reloads
+        channel (str): NOTIFY channel triggering a reload, empty to disable
+        """
+        await self.refresh(db)
+        # Created here rather than in __init__ so it binds to the running loop
+        self._changed = asyncio.Event()
+        if channel:
+            self._unlisten = await db.listen(channel, lambda _: self._changed.set())
+        self._task = asyncio.create_task(self._refresh_loop(db, interval))
+
+    async def stop(self):
+        """
+        Stops the background reload and releases the NOTIFY connection.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._unlisten is not None:
+            await self._unlisten()
+            self._unlisten = None
+
+    async def _refresh_loop(self, db: Database, interval: int):
+        """
+        Reloads the hierarchy every `interval` seconds or as soon as a change is notified.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            notified = self._changed.is_set()
+            self._changed.clear()
+            try:
+                await self.refresh(db, from_primary=notified)
+            except Exception as e:  # pylint: disable=broad-except
+                # Keep serving the previous snapshot until the next attempt
+                LOG.error("Port hierarchy refresh failed: %s", e)
+
+    def __call__(self) -> "PortHierarchy":
+        """
+        Make the PortHierarchy object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        PortHierarchy: The hierarchy object itself
+        """
+        return self
+
+
+# Create an instance of the PortHierarchy class
+port_hierarchy = PortHierarchy()
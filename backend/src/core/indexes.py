@@ -0,0 +1,189 @@
+"""Indexes matching the rates access pattern, and their migration"""
+
+from logging import getLogger
+from typing import List, NamedTuple, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from lib.sqla.db import Database
+
+LOG = getLogger("rate_calculator")
+
+
+class IndexSpec(NamedTuple):
+    """
+    An index the rates queries expect.
+
+    Attributes:
+    - name (str): Index name used when the migration creates it.
+    - table (str): Indexed table.
+    - columns (Tuple[str, ...]): Key columns, in order.
+    - include (Tuple[str, ...]): Non-key columns stored for index-only scans.
+    - method (str): Index access method.
+    """
+
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+    include: Tuple[str, ...] = ()
+    method: str = "btree"
+
+    def ddl(self, concurrently: bool = True) -> str:
+        """
+        Returns the CREATE INDEX statement, by default built without locking out writers.
+        """
+        statement = (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{self.name} ON {self.table} USING {self.method} ({', '.join(self.columns)})"
+        )
+        if self.include:
+            statement += f" INCLUDE ({', '.join(self.include)})"
+        return statement
+
+    def satisfied_by(
+        self, method: str, key_columns: Sequence[str], columns: Sequence[str]
+    ) -> bool:
+        """
+        Whether an existing index serves the same queries, i.e. it uses the same
+        method, starts with the same key columns and stores the included columns.
+        """
+        return (
+            method == self.method
+            and tuple(key_columns[: len(self.columns)]) == self.columns
+            and set(self.include) <= set(columns)
+        )
+
+
+# Lane and day range lookups of QUERY, answered by an index-only scan
+PRICES_LANE_DAY = IndexSpec(
+    "prices_orig_dest_day_idx", "prices", ("orig_code", "dest_code", "day"), ("price",)
+)
+
+# Day range scans of the aggregate refresh, a few pages when prices arrive in day order
+PRICES_DAY_BRIN = IndexSpec("prices_day_brin_idx", "prices", ("day",), method="brin")
+
+# Indexes checked at startup and created by the migration
+EXPECTED_INDEXES = (PRICES_LANE_DAY,)
+
+# Indexes only created on request
+OPTIONAL_INDEXES = (PRICES_DAY_BRIN,)
+
+# Valid indexes of the given tables with their method, key columns and all columns
+INDEXES_QUERY = text(
+    """ SELECT t.relname, am.amname,
+               ARRAY(
+                   SELECT a.attname
+                   FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                   JOIN pg_attribute a ON a.attrelid = i.indrelid and a.attnum = k.attnum
+                   WHERE k.ord <= i.indnkeyatts
+                   ORDER BY k.ord
+               ),
+               ARRAY(
+                   SELECT a.attname
+                   FROM unnest(i.indkey) AS k(attnum)
+                   JOIN pg_attribute a ON a.attrelid = i.indrelid and a.attnum = k.attnum
+               )
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE t.relname = ANY(CAST(:tables AS text[])) and
+              pg_table_is_visible(t.oid) and
+              i.indisvalid"""
+)
+
+TABLE_EXISTS = text("SELECT to_regclass(:table) IS NOT NULL")
+
+IS_PARTITIONED = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)")
+
+
+async def is_partitioned(c: AsyncConnection, table: str) -> bool:
+    """
+    Whether a table is declaratively partitioned.
+    """
+    return bool((await c.execute(IS_PARTITIONED, {"table": table})).scalar())
+
+
+async def missing_indexes(
+    c: AsyncConnection, expected: Sequence[IndexSpec] = EXPECTED_INDEXES
+) -> List[IndexSpec]:
+    """
+    Returns the expected indexes that no existing index satisfies.
+
+    Indexes of tables that do not exist are not reported.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    expected (Sequence[IndexSpec]): The indexes to look for
+
+    Returns:
+    List[IndexSpec]: The missing indexes
+    """
+    tables = sorted({spec.table for spec in expected})
+    existing = (await c.execute(INDEXES_QUERY, {"tables": tables})).fetchall()
+    missing = []
+    for spec in expected:
+        if not (await c.execute(TABLE_EXISTS, {"table": spec.table})).scalar():
+            continue
+        if not any(
+            table == spec.table and spec.satisfied_by(method, key_columns, columns)
+            for table, method, key_columns, columns in existing
+        ):
+            missing.append(spec)
+    return missing
+
+
+async def check_indexes(db: Database) -> List[IndexSpec]:
+    """
+    Logs a warning for every expected index that is missing.
+
+    Parameters:
+    db (Database): The database to check
+
+    Returns:
+    List[IndexSpec]: The missing indexes
+    """
+    async with db.connect() as conn:
+        missing = await missing_indexes(conn)
+    for spec in missing:
+        LOG.warning(
+            "Missing index on %s, rates queries will scan the table. "
+            "Run manage.py create-indexes to add: %s",
+            spec.table,
+            spec.ddl(),
+        )
+    return missing
+
+
+async def create_indexes(db: Database, specs: Sequence[IndexSpec]) -> List[IndexSpec]:
+    """
+    Creates the indexes that are missing, concurrently so the tables stay writable.
+
+    An index left invalid by an interrupted earlier run is dropped and built again.
+    Partitioned tables do not support concurrent builds, their indexes are built
+    on every partition while holding a lock on the table.
+
+    Parameters:
+    db (Database): The database to migrate
+    specs (Sequence[IndexSpec]): The indexes to create
+
+    Returns:
+    List[IndexSpec]: The indexes created
+    """
+    async with db.connect() as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        missing = await missing_indexes(conn, specs)
+        for spec in missing:
+            LOG.info("Creating index %s", spec.name)
+            concurrently = not await is_partitioned(conn, spec.table)
+            await conn.execute(
+                text(
+                    f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}"
+                    f"IF EXISTS {spec.name}"
+                )
+            )
+            await conn.execute(text(spec.ddl(concurrently)))
+            await conn.execute(text(f"ANALYZE {spec.table}"))
+    return missing
@@ -0,0 +1,294 @@
+"""Bulk price ingestion through COPY"""
+
+import csv
+from datetime import date
+from itertools import islice
+from logging import getLogger
+from time import perf_counter
+from typing import IO, Iterable, Iterator, List, NamedTuple, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from lib.sqla.db import Database
+from .aggregates import HAS_STATS_COLUMNS
+from .indexes import is_partitioned
+from .partitions import create_partitions
+from .version import bump_data_version
+
+LOG = getLogger("rate_calculator")
+
+# Rows sent per COPY, bounds the memory used by the generator
+COPY_CHUNK_ROWS = 100_000
+
+# Columns of an ingested price, in COPY order
+PRICE_COLUMNS = ("orig_code", "dest_code", "day", "price")
+
+# How staged prices are merged into prices
+MODES = ("append", "replace")
+
+# Session tables: the batch being merged and the lane days a replace already cleared
+CREATE_STAGING = (
+    text(
+        """ CREATE TEMP TABLE IF NOT EXISTS prices_staging (
+                orig_code text NOT NULL,
+                dest_code text NOT NULL,
+                day date NOT NULL,
+                price integer NOT NULL
+            )"""
+    ),
+    text(
+        """ CREATE TEMP TABLE IF NOT EXISTS prices_replaced (
+                orig_code text NOT NULL,
+                dest_code text NOT NULL,
+                day date NOT NULL,
+                PRIMARY KEY (orig_code, dest_code, day)
+            )"""
+    ),
+)
+
+TRUNCATE_STAGING = text("TRUNCATE prices_staging")
+
+STAGED_DAYS = text("SELECT MIN(day), MAX(day) FROM prices_staging")
+
+# Deletes the prices of staged lane days, once per run so later batches of the
+# same lane day add to it instead of replacing the earlier ones
+DELETE_REPLACED = text(
+    """ WITH fresh AS (
+                SELECT DISTINCT orig_code, dest_code, day FROM prices_staging
+                EXCEPT
+                SELECT orig_code, dest_code, day FROM prices_replaced
+            ), marked AS (
+                INSERT INTO prices_replaced SELECT * FROM fresh
+            )
+            DELETE FROM prices p
+            USING fresh f
+            WHERE p.orig_code = f.orig_code and
+                  p.dest_code = f.dest_code and
+                  p.day = f.day"""
+)
+
+INSERT_STAGED = text(
+    """ INSERT INTO prices (orig_code, dest_code, day, price)
+            SELECT orig_code, dest_code, day, price FROM prices_staging"""
+)
+
+HAS_AGGREGATES = text("SELECT to_regclass('daily_lane_stats') IS NOT NULL")
+
+# Recomputes the daily_lane_stats rows of the staged lane days only
+DELETE_STAGED_AGGREGATES = text(
+    """ DELETE FROM daily_lane_stats a
+            USING (SELECT DISTINCT orig_code, dest_code, day FROM prices_staging) s
+            WHERE a.orig_code = s.orig_code and
+                  a.dest_code = s.dest_code and
+                  a.day = s.day"""
+)
+
+INSERT_STAGED_AGGREGATES = text(
+    """ INSERT INTO daily_lane_stats (
+                orig_code, dest_code, day,
+                price_sum, price_count, price_min, price_max, price_sq_sum
+            )
+            SELECT p.orig_code, p.dest_code, p.day,
+                   SUM(p.price), COUNT(p.price), MIN(p.price), MAX(p.price),
+                   SUM(CAST(p.price AS numeric) * p.price)
+            FROM prices p
+            JOIN (SELECT DISTINCT orig_code, dest_code, day FROM prices_staging) s
+            ON p.orig_code = s.orig_code and p.dest_code = s.dest_code and p.day = s.day
+            WHERE p.price IS NOT NULL
+            GROUP BY p.orig_code, p.dest_code, p.day"""
+)
+
+
+class IngestReport(NamedTuple):
+    """
+    Outcome of an ingestion run.
+    """
+
+    rows: int
+    batches: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        """
+        Returns the ingestion throughput.
+        """
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def chunks(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    """
+    Splits rows into lists of at most `size` rows.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def copy_rows(
+    c: AsyncConnection, table: str, columns: Tuple[str, ...], rows: Iterable[Tuple]
+) -> int:
+    """
+    Bulk loads rows into a table with COPY, in chunks of COPY_CHUNK_ROWS.
+
+    Parameters:
+    c (AsyncConnection): The database connection, inside a transaction
+    table (str): The target table
+    columns (Tuple[str, ...]): The target columns, in row order
+    rows (Iterable[Tuple]): The rows to load
+
+    Returns:
+    int: The number of rows loaded
+    """
+    raw = await c.get_raw_connection()
+    loaded = 0
+    for chunk in chunks(rows, COPY_CHUNK_ROWS):
+        await raw.driver_connection.copy_records_to_table(
+            table, records=chunk, columns=columns
+        )
+        loaded += len(chunk)
+    return loaded
+
+
+def read_price_csv(stream: IO[str]) -> Iterator[Tuple[str, str, date, int]]:
+    """
+    Parses prices from CSV with an orig_code, dest_code, day and price header,
+    in any column order. Other columns are ignored.
+
+    Parameters:
+    stream (IO[str]): The CSV text
+
+    Returns:
+    Iterator[Tuple[str, str, date, int]]: The prices, in COPY column order
+    """
+    reader = csv.reader(stream)
+    header = [name.strip().lower() for name in next(reader, [])]
+    missing = [column for column in PRICE_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"CSV header is missing {', '.join(missing)}")
+    orig, dest, day, price = (header.index(column) for column in PRICE_COLUMNS)
+    for row in reader:
+        if not row:
+            continue
+        try:
+            yield row[orig], row[dest], date.fromisoformat(row[day]), int(row[price])
+        except (IndexError, ValueError) as e:
+            raise ValueError(f"Invalid price on line {reader.line_num}: {e}") from e
+
+
+async def merge_batch(
+    c: AsyncConnection,
+    batch: List[Tuple[str, str, date, int]],
+    mode: str,
+    partition_interval: str = "",
+    fold_aggregates: bool = False,
+) -> int:
+    """
+    Stages a batch of prices with COPY and merges it into prices.
+
+    Parameters:
+    c (AsyncConnection): The database connection, inside a transaction
+    batch (List[Tuple[str, str, date, int]]): The prices to merge
+    mode (str): "append" adds the prices, "replace" first deletes the prices
+        of their lane days
+    partition_interval (str): Create missing prices partitions of this
+        interval, empty when prices is not partitioned
+    fold_aggregates (bool): Recompute the daily_lane_stats rows of the batch
+
+    Returns:
+    int: The number of prices inserted
+    """
+    await c.execute(TRUNCATE_STAGING)
+    await copy_rows(c, "prices_staging", PRICE_COLUMNS, batch)
+    if partition_interval:
+        first, last = (await c.execute(STAGED_DAYS)).one()
+        await create_partitions(c, first, last, partition_interval)
+    if mode == "replace":
+        await c.execute(DELETE_REPLACED)
+    result = await c.execute(INSERT_STAGED)
+    if fold_aggregates:
+        await c.execute(DELETE_STAGED_AGGREGATES)
+        await c.execute(INSERT_STAGED_AGGREGATES)
+    return result.rowcount
+
+
+async def ingest_prices(
+    db: Database,
+    rows: Iterable[Tuple[str, str, date, int]],
+    mode: str = "append",
+    batch_rows: int = 500_000,
+    partition_interval: str = "month",
+    channel: str = "",
+) -> IngestReport:
+    """
+    Loads prices in batches, each merged and committed in its own transaction
+    together with its daily_lane_stats rows and a dataset version bump.
+
+    A failed batch is rolled back, the batches before it stay committed.
+
+    Parameters:
+    db (Database): The database
+    rows (Iterable[Tuple[str, str, date, int]]): The prices to load
+    mode (str): "append" or "replace", see merge_batch
+    batch_rows (int): Prices merged per transaction
+    partition_interval (str): Interval of the partitions created for new days
+        when prices is partitioned
+    channel (str): NOTIFY channel announcing version bumps, empty to skip
+
+    Returns:
+    IngestReport: The number of prices and batches loaded and the time taken
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown ingestion mode {mode}")
+    loaded = batches = 0
+    start = perf_counter()
+    async with db.connect() as conn:
+        async with conn.begin():
+            for statement in CREATE_STAGING:
+                await conn.execute(statement)
+            partitioned = await is_partitioned(conn, "prices")
+            fold_aggregates = bool((await conn.execute(HAS_AGGREGATES)).scalar())
+            if fold_aggregates and not (await conn.execute(HAS_STATS_COLUMNS)).scalar():
+                LOG.warning(
+                    "daily_lane_stats predates the statistics columns, "
+                    "run refresh-aggregates after ingesting"
+                )
+                fold_aggregates = False
+
+        for batch in chunks(rows, batch_rows):
+            batch_start = perf_counter()
+            async with conn.begin():
+                inserted = await merge_batch(
+                    conn,
+                    batch,
+                    mode,
+                    partition_interval if partitioned else "",
+                    fold_aggregates,
+                )
+                await bump_data_version(conn, channel)
+            elapsed = perf_counter() - batch_start
+            loaded += inserted
+            batches += 1
+            LOG.info(
+                "Batch %d: %d prices in %.2fs (%.0f rows/s)",
+                batches,
+                inserted,
+                elapsed,
+                inserted / elapsed if elapsed else 0.0,
+            )
+
+        async with conn.begin():
+            await conn.execute(text("DROP TABLE prices_staging, prices_replaced"))
+    report = IngestReport(loaded, batches, perf_counter() - start)
+    LOG.info(
+        "Ingested %d prices in %d batches in %.1fs (%.0f rows/s)",
+        report.rows,
+        report.batches,
+        report.seconds,
+        report.rows_per_second,
+    )
+    return report
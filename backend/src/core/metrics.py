@@ -0,0 +1,149 @@
+"""Metrics of the Rate Calculator service"""
+
+from lib.log import dropped_records
+from lib.metrics import CallbackCounter, Counter, Gauge, Histogram, Registry
+from .admission import admission
+from .cache import rates_cache
+from .db import database, query_profiler
+from .range_cache import range_cache
+from .singleflight import rates_flight
+
+# Rows per response buckets, from a single day up to multi-year ranges
+ROW_BUCKETS = (1, 7, 31, 92, 366, 731, 1827, 3653)
+
+registry = Registry()
+
+REQUESTS = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route, method and status",
+        ("route", "method", "status"),
+    )
+)
+REQUEST_LATENCY = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route, method and status",
+        ("route", "method", "status"),
+    )
+)
+STAGE_LATENCY = registry.register(
+    Histogram(
+        "rates_stage_duration_seconds",
+        "Time spent in each stage of a rates request: "
+        "resolve, pool_wait, query, serialize, "
+        "pool_wait and query once per connection checked out",
+        ("stage",),
+    )
+)
+ROWS_RETURNED = registry.register(
+    Histogram(
+        "rates_rows_returned",
+        "Days returned per rates request answered from the database, "
+        "response cache hits excluded",
+        buckets=ROW_BUCKETS,
+    )
+)
+STATEMENT_LATENCY = registry.register(
+    Histogram(
+        "db_statement_duration_seconds",
+        "Database statement latency by statement fingerprint, "
+        "see /debug/slow-queries for the statement texts",
+        ("statement",),
+    )
+)
+DB_ERRORS = registry.register(
+    Counter("db_errors_total", "Failed database operations by error type", ("error",))
+)
+
+registry.register(
+    Gauge(
+        "db_pool_connections",
+        "Connections of the database pool by state",
+        lambda: {
+            (state,): database.pool_status()[state]
+            for state in ("size", "checked_out", "idle", "overflow")
+        },
+        ("state",),
+    )
+)
+registry.register(
+    Gauge(
+        "db_replica_healthy",
+        "Whether a read replica is serving reads",
+        lambda: {(replica.name,): replica.healthy for replica in database.replicas},
+        ("replica",),
+    )
+)
+registry.register(
+    Gauge(
+        "db_replica_lag_seconds",
+        "Replication lag of a read replica at its last health check",
+        lambda: {
+            (replica.name,): replica.lag
+            for replica in database.replicas
+            if replica.lag is not None
+        },
+        ("replica",),
+    )
+)
+registry.register(
+    CallbackCounter(
+        "rates_cache_operations_total",
+        "Response cache hits, misses, backend errors and evictions",
+        lambda: {
+            (name,): value
+            for name, value in rates_cache.stats().items()
+            if name in ("hits", "misses", "errors", "evictions")
+        },
+        ("result",),
+    )
+)
+registry.register(
+    CallbackCounter(
+        "rates_range_cache_days_total",
+        "Days served by the range cache and from the database",
+        lambda: {
+            ("hits",): range_cache.hits,
+            ("misses",): range_cache.misses,
+        },
+        ("result",),
+    )
+)
+registry.register(
+    CallbackCounter(
+        "rates_coalesced_requests_total",
+        "Rates queries that ran against the database or shared an identical in-flight one",
+        lambda: {
+            ("executed",): rates_flight.executions,
+            ("shared",): rates_flight.shared,
+        },
+        ("result",),
+    )
+)
+registry.register(
+    Gauge(
+        "admission_requests",
+        "Admission controlled requests running and waiting for a slot",
+        lambda: {("active",): admission.active, ("queued",): admission.queued},
+        ("state",),
+    )
+)
+registry.register(
+    CallbackCounter(
+        "admission_rejected_total",
+        "Requests rejected by admission control by reason",
+        lambda: {(reason,): value for reason, value in admission.rejected.items()},
+        ("reason",),
+    )
+)
+registry.register(
+    CallbackCounter(
+        "log_records_dropped_total",
+        "Log records dropped because the log queue was full",
+        lambda: {(): dropped_records()},
+    )
+)
+
+database.add_checkout_listener(lambda waited: STAGE_LATENCY.observe(waited, "pool_wait"))
+query_profiler.add_listener(lambda key, elapsed: STATEMENT_LATENCY.observe(elapsed, key))
@@ -1,6 +1,6 @@
 """Pydantic BaseModel for FastAPI"""
 
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import date
 from pydantic import BaseModel
 
@@ -19,3 +19,116 @@ class PriceResponse(BaseModel):
 
     day: date
     average_price: Optional[float]
+
+
+class PriceStatsResponse(PriceResponse):
+    """
+    BaseModel structure for the get prices response API with the `stats` selector.
+    Only the selected statistics are part of the response.
+
+    Attributes:
+    - count (Optional[int]): Number of prices of the day.
+    - min (Optional[int]): Lowest price of the day.
+    - max (Optional[int]): Highest price of the day.
+    - median (Optional[float]): Median price of the day.
+    - p10 (Optional[float]): 10th percentile of the day's prices.
+    - p90 (Optional[float]): 90th percentile of the day's prices.
+    - stddev (Optional[float]): Sample standard deviation of the day's prices.
+      All statistics but the count are None below the minimum number of prices.
+    """
+
+    count: Optional[int] = None
+    min: Optional[int] = None
+    max: Optional[int] = None
+    median: Optional[float] = None
+    p10: Optional[float] = None
+    p90: Optional[float] = None
+    stddev: Optional[float] = None
+
+
+class ErrorResponse(BaseModel):
+    """
+    BaseModel structure of the error body built by `response_error`.
+
+    Attributes:
+    - status_code (int): The HTTP status code describing the error.
+    - message (str): A brief message describing the error.
+    - details (List[str]): Additional details about the error.
+    """
+
+    status_code: int
+    message: str
+    details: List[str]
+
+
+class LaneRequest(BaseModel):
+    """
+    BaseModel structure of one lane in a batch rates request.
+
+    Attributes:
+    - origin (str): The origin port code or slug name.
+    - destination (str): The destination port code or slug name.
+    - date_from (str): The start date in YYYY-MM-DD format.
+    - date_to (str): The end date in YYYY-MM-DD format.
+    - id (Optional[str]): Key of the lane in the response. Defaults to
+      "origin:destination:date_from:date_to".
+    """
+
+    origin: str
+    destination: str
+    date_from: str
+    date_to: str
+    id: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        """
+        The key of the lane in the batch response.
+        """
+        return self.id or (
+            f"{self.origin}:{self.destination}:{self.date_from}:{self.date_to}"
+        )
+
+
+class BatchRatesRequest(BaseModel):
+    """
+    BaseModel structure for the batch rates request API.
+
+    Attributes:
+    - lanes (List[LaneRequest]): The lanes and date ranges to fetch rates for.
+    """
+
+    lanes: List[LaneRequest]
+
+    def duplicate_keys(self) -> List[str]:
+        """
+        The lane keys used by more than one lane, in request order.
+        """
+        seen: Dict[str, int] = {}
+        for lane in self.lanes:
+            seen[lane.key] = seen.get(lane.key, 0) + 1
+        return [key for key, uses in seen.items() if uses > 1]
+
+
+class LaneResult(BaseModel):
+    """
+    BaseModel structure of one lane in the batch rates response.
+
+    Attributes:
+    - rates (Optional[List[PriceResponse]]): The average prices, None if the lane is invalid.
+    - error (Optional[ErrorResponse]): Why the lane is invalid, None on success.
+    """
+
+    rates: Optional[List[PriceResponse]] = None
+    error: Optional[ErrorResponse] = None
+
+
+class BatchRatesResponse(BaseModel):
+    """
+    BaseModel structure for the batch rates response API.
+
+    Attributes:
+    - results (Dict[str, LaneResult]): The result of every lane, keyed by lane.
+    """
+
+    results: Dict[str, LaneResult]
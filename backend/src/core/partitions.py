@@ -0,0 +1,318 @@
+"""Range partitioning of the prices table by day"""
+
+import re
+from datetime import date
+from logging import getLogger
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from lib.sqla.db import Database
+from .indexes import EXPECTED_INDEXES, is_partitioned
+
+LOG = getLogger("rate_calculator")
+
+# Supported partition sizes
+INTERVALS = ("month", "quarter")
+
+# Bound expression of a partition, as printed by pg_get_expr
+BOUND_PATTERN = re.compile(
+    r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)"
+)
+
+PARTITIONS_QUERY = text(
+    """ SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+        ORDER BY c.relname"""
+)
+
+# Foreign keys of a table, as name and definition. CREATE TABLE ... LIKE does
+# not copy them, so they are recreated on the partitioned table.
+FOREIGN_KEYS_QUERY = text(
+    """ SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(:table) and contype = 'f'
+        ORDER BY conname"""
+)
+
+
+def period_start(day: date, interval: str) -> date:
+    """
+    Returns the first day of the month or quarter containing `day`.
+    """
+    month = day.month if interval == "month" else (day.month - 1) // 3 * 3 + 1
+    return date(day.year, month, 1)
+
+
+def next_period(start: date, interval: str, count: int = 1) -> date:
+    """
+    Returns the first day of the `count`-th month or quarter after the one
+    starting at `start`.
+    """
+    months = count * (1 if interval == "month" else 3)
+    years, month = divmod(start.month - 1 + months, 12)
+    return date(start.year + years, month + 1, 1)
+
+
+def partition_name(table: str, start: date, interval: str) -> str:
+    """
+    Returns the partition name of a period, e.g. prices_2016_01 or prices_2016_q1.
+    """
+    if interval == "month":
+        return f"{table}_{start:%Y_%m}"
+    return f"{table}_{start.year}_q{(start.month - 1) // 3 + 1}"
+
+
+def periods(first: date, last: date, interval: str) -> List[Tuple[date, date]]:
+    """
+    Returns the [start, end) bounds of every period between two days.
+
+    Parameters:
+    first (date): A day of the first period
+    last (date): A day of the last period
+    interval (str): "month" or "quarter"
+
+    Returns:
+    List[Tuple[date, date]]: The period bounds, end exclusive
+    """
+    bounds = []
+    start = period_start(first, interval)
+    while start <= last:
+        end = next_period(start, interval)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+async def get_partitions(
+    c: AsyncConnection, table: str = "prices"
+) -> List[Tuple[str, Optional[date], Optional[date]]]:
+    """
+    Lists the partitions of a table with their bounds.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    table (str): The partitioned table
+
+    Returns:
+    List[Tuple[str, Optional[date], Optional[date]]]: Name, first day and exclusive
+    end of every partition, None bounds for a default partition
+    """
+    partitions = []
+    for name, bound in (await c.execute(PARTITIONS_QUERY, {"table": table})).fetchall():
+        match = BOUND_PATTERN.search(bound or "")
+        if match is None:
+            partitions.append((name, None, None))
+        else:
+            start, end = (date.fromisoformat(value) for value in match.groups())
+            partitions.append((name, start, end))
+    return partitions
+
+
+async def create_partitions(
+    c: AsyncConnection,
+    first: date,
+    last: date,
+    interval: str,
+    table: str = "prices",
+) -> List[str]:
+    """
+    Creates the partitions covering a day range that no partition covers yet.
+
+    Parameters:
+    c (AsyncConnection): The database connection
+    first (date): First day to cover
+    last (date): Last day to cover
+    interval (str): "month" or "quarter"
+    table (str): The partitioned table
+
+    Returns:
+    List[str]: Names of the partitions created
+    """
+    existing = [
+        (start, end) for _, start, end in await get_partitions(c, table) if start
+    ]
+    created = []
+    for start, end in periods(first, last, interval):
+        # Skip periods already covered, possibly by partitions of another interval
+        if any(start < e and s < end for s, e in existing):
+            continue
+        name = partition_name(table, start, interval)
+        await c.execute(
+            text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+        created.append(name)
+    return created
+
+
+async def ensure_partitions(
+    db: Database,
+    interval: str,
+    ahead: int,
+    today: Optional[date] = None,
+    table: str = "prices",
+) -> List[str]:
+    """
+    Creates the partitions of the current period and the `ahead` following ones.
+
+    Periods between the newest partition and the current one, left uncovered
+    when the command did not run for a while, are created as well, so inserts
+    of late prices keep finding a partition.
+
+    Parameters:
+    db (Database): The database
+    interval (str): "month" or "quarter"
+    ahead (int): Number of future periods to create
+    today (Optional[date]): The current day, defaults to date.today()
+    table (str): The partitioned table
+
+    Returns:
+    List[str]: Names of the partitions created
+    """
+    current = period_start(today or date.today(), interval)
+    last = next_period(current, interval, ahead)
+    async with db.begin() as conn:
+        if not await is_partitioned(conn, table):
+            raise RuntimeError(
+                f"{table} is not partitioned, run manage.py partition-prices first"
+            )
+        ends = [end for _, _, end in await get_partitions(conn, table) if end]
+        first = min(max(ends), current) if ends else current
+        created = await create_partitions(conn, first, last, interval, table)
+    LOG.info("Created %d partitions of %s", len(created), table)
+    return created
+
+
+async def copy_foreign_keys(
+    conn: AsyncConnection, source: str, target: str
+) -> List[str]:
+    """
+    Adds the foreign keys of one table to another, under the same names.
+
+    Parameters:
+    conn (AsyncConnection): The database connection
+    source (str): The table the foreign keys are read from
+    target (str): The table they are added to
+
+    Returns:
+    List[str]: Names of the foreign keys added
+    """
+    result = await conn.execute(FOREIGN_KEYS_QUERY, {"table": source})
+    foreign_keys = result.fetchall()
+    for name, definition in foreign_keys:
+        await conn.execute(
+            text(f'ALTER TABLE {target} ADD CONSTRAINT "{name}" {definition}')
+        )
+    return [name for name, _ in foreign_keys]
+
+
+async def partition_prices(
+    db: Database, interval: str, ahead: int, today: Optional[date] = None
+) -> int:
+    """
+    Converts a plain prices table into one range partitioned by day.
+
+    The rows are copied into partitions covering every period from the first
+    day of prices to the `ahead`-th period after the current one, with no gap
+    an insert could fall into. The foreign keys to ports are then recreated,
+    the plain table is dropped and the expected indexes are built. Everything
+    runs in one transaction, so readers see either the old or the new table;
+    writers wait on its exclusive lock of prices until the copy commits.
+
+    Parameters:
+    db (Database): The database
+    interval (str): "month" or "quarter"
+    ahead (int): Number of future periods to create
+    today (Optional[date]): The current day, defaults to date.today()
+
+    Returns:
+    int: The number of rows copied
+    """
+    today = today or date.today()
+    async with db.begin() as conn:
+        if await is_partitioned(conn, "prices"):
+            raise RuntimeError("prices is already partitioned")
+        await conn.execute(text("ALTER TABLE prices RENAME TO prices_unpartitioned"))
+        await conn.execute(
+            text(
+                """ CREATE TABLE prices (
+                        LIKE prices_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+                    ) PARTITION BY RANGE (day)"""
+            )
+        )
+        result = await conn.execute(
+            text("SELECT MIN(day), MAX(day) FROM prices_unpartitioned")
+        )
+        first, last = result.one()
+        current = period_start(today, interval)
+        end = next_period(current, interval, ahead)
+        created = await create_partitions(
+            conn,
+            min(first, current) if first else current,
+            max(last, end) if last else end,
+            interval,
+        )
+        result = await conn.execute(
+            text("INSERT INTO prices SELECT * FROM prices_unpartitioned")
+        )
+        # Added once the rows are in, so they are validated in a single pass
+        await copy_foreign_keys(conn, "prices_unpartitioned", "prices")
+        await conn.execute(text("DROP TABLE prices_unpartitioned"))
+        for spec in EXPECTED_INDEXES:
+            await conn.execute(text(spec.ddl(concurrently=False)))
+        await conn.execute(text("ANALYZE prices"))
+    LOG.info(
+        "prices partitioned by %s into %d partitions with %d rows",
+        interval,
+        len(created),
+        result.rowcount,
+    )
+    return result.rowcount
+
+
+async def detach_partitions(
+    db: Database,
+    before: date,
+    archive_schema: Optional[str] = None,
+    drop: bool = False,
+    table: str = "prices",
+) -> List[str]:
+    """
+    Detaches the partitions holding only days before `before`.
+
+    Detached partitions are kept as plain tables, moved to `archive_schema`
+    when given, or dropped when `drop` is set.
+
+    Parameters:
+    db (Database): The database
+    before (date): Partitions ending on or before this day are detached
+    archive_schema (Optional[str]): Schema the detached partitions are moved to
+    drop (bool): Drop the detached partitions
+    table (str): The partitioned table
+
+    Returns:
+    List[str]: Names of the detached partitions
+    """
+    detached = []
+    async with db.begin() as conn:
+        if archive_schema and not drop:
+            await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        for name, _, end in await get_partitions(conn, table):
+            if end is None or end > before:
+                continue
+            await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if drop:
+                await conn.execute(text(f"DROP TABLE {name}"))
+            elif archive_schema:
+                await conn.execute(
+                    text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+                )
+            detached.append(name)
+    LOG.info("Detached %d partitions of %s", len(detached), table)
+    return detached
@@ -0,0 +1,318 @@
+"""Parallel chunked execution of wide rates queries"""
+
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Sequence,
+    Tuple,
+)
+
+ONE_DAY = timedelta(days=1)
+
+
+class Chunk(NamedTuple):
+    """
+    One slice of a rates query: a subset of its origin ports over a sub-range
+    of its days.
+    """
+
+    origin: Tuple[str, ...]
+    destination: Tuple[str, ...]
+    date_from: date
+    date_to: date
+
+
+# Fetches (day, price sum, price count) rows for a chunk
+FetchChunk = Callable[[Chunk], Awaitable[List[Tuple[date, Decimal, int]]]]
+
+
+def estimate_rows(
+    origin: Sequence[str], destination: Sequence[str], date_from: date, date_to: date
+) -> int:
+    """
+    Estimates the work of a query as the number of (origin, destination, day)
+    combinations it may aggregate, i.e. the rows of daily_lane_stats it reads
+    at most. Raw prices scale with it, by the prices per lane and day.
+
+    Parameters:
+    origin (Sequence[str]): Resolved origin port codes
+    destination (Sequence[str]): Resolved destination port codes
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+
+    Returns:
+    int: The estimated row count
+    """
+    days = max(0, (date_to - date_from).days + 1)
+    return len(origin) * len(destination) * days
+
+
+def split_dates(date_from: date, date_to: date, parts: int) -> List[Tuple[date, date]]:
+    """
+    Splits an inclusive date range into at most `parts` contiguous ranges of
+    near equal length, in day order.
+    """
+    days = (date_to - date_from).days + 1
+    parts = max(1, min(parts, days))
+    size, extra = divmod(days, parts)
+    ranges = []
+    start = date_from
+    for i in range(parts):
+        end = start + timedelta(days=size + (i < extra) - 1)
+        ranges.append((start, end))
+        start = end + ONE_DAY
+    return ranges
+
+
+def split_ports(ports: Sequence[str], parts: int) -> List[Tuple[str, ...]]:
+    """
+    Splits port codes into at most `parts` disjoint subsets of near equal size.
+    """
+    parts = max(1, min(parts, len(ports)))
+    size, extra = divmod(len(ports), parts)
+    subsets = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        subsets.append(tuple(ports[start:end]))
+        start = end
+    return subsets
+
+
+def chunk_cost(rows: int, parts: int, fan_out: int, round_trip_rows: int) -> float:
+    """
+    Estimates the latency of a query split into `parts` chunks, in rows.
+
+    Chunks run in waves of `fan_out`, all at once when it is 0. Each wave
+    takes as long as one chunk: its share of the rows plus the fixed cost of
+    its own connection, i.e. the pool checkout, the pre-ping and
+    statement_timeout round trips and the query round trip, expressed as the
+    rows read meanwhile.
+
+    Parameters:
+    rows (int): Estimated rows of the whole query
+    parts (int): Number of chunks
+    fan_out (int): Chunks running at once, 0 for no bound
+    round_trip_rows (int): Fixed cost of a chunk, in rows
+
+    Returns:
+    float: The estimated latency, in rows
+    """
+    waves = -(-parts // fan_out) if fan_out > 0 else 1
+    return waves * (rows / parts + round_trip_rows)
+
+
+def plan_chunks(
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    threshold: int,
+    max_chunks: int,
+    min_chunk_days: int = 7,
+    fan_out: int = 0,
+    round_trip_rows: int = 0,
+) -> List[Chunk]:
+    """
+    Plans the chunks a query is run as.
+
+    Queries estimated below the threshold run as a single chunk. Wider ones
+    are split into at most one chunk per `threshold` rows and `max_chunks`,
+    choosing the number of chunks with the lowest chunk_cost, so a split is
+    only made when it saves more than the round trips it adds. Long ranges
+    are split by date, so each chunk only scans its own partitions; short
+    ranges over many origins are split by origin port subset. The chunks
+    never overlap, so summing their per-day results is exact.
+
+    Parameters:
+    origin (Sequence[str]): Resolved origin port codes
+    destination (Sequence[str]): Resolved destination port codes
+    date_from (date): Start date for the range (inclusive)
+    date_to (date): End date for the range (inclusive)
+    threshold (int): Estimated rows above which a query is split, 0 disables splitting
+    max_chunks (int): Upper bound for the number of chunks
+    min_chunk_days (int): Shortest date range a date chunk covers
+    fan_out (int): Chunks of one query running at once, 0 for no bound
+    round_trip_rows (int): Fixed cost of a chunk, see chunk_cost
+
+    Returns:
+    List[Chunk]: The chunks, a single one covering the whole query when not split
+    """
+    whole = [Chunk(tuple(origin), tuple(destination), date_from, date_to)]
+    rows = estimate_rows(origin, destination, date_from, date_to)
+    if not threshold or max_chunks < 2 or rows <= threshold:
+        return whole
+    parts = min(
+        range(1, min(max_chunks, -(-rows // threshold)) + 1),
+        key=lambda n: (chunk_cost(rows, n, fan_out, round_trip_rows), n),
+    )
+    if parts < 2:
+        return whole
+    days = (date_to - date_from).days + 1
+    by_date = min(parts, days // max(1, min_chunk_days))
+    if by_date >= 2:
+        return [
+            Chunk(tuple(origin), tuple(destination), start, end)
+            for start, end in split_dates(date_from, date_to, by_date)
+        ]
+    if len(origin) >= 2:
+        return [
+            Chunk(subset, tuple(destination), date_from, date_to)
+            for subset in split_ports(origin, parts)
+        ]
+    return whole
+
+
+def merge_sums(
+    partials: Iterable[Iterable[Tuple[date, Decimal, int]]]
+) -> List[Tuple[date, Decimal, int]]:
+    """
+    Adds up the per-day price sums and counts of several chunks.
+
+    Parameters:
+    partials (Iterable[Iterable[Tuple[date, Decimal, int]]]): (day, price sum,
+        price count) rows of each chunk
+
+    Returns:
+    List[Tuple[date, Decimal, int]]: (day, price sum, price count) in day order
+    """
+    days: Dict[date, Tuple[Decimal, int]] = {}
+    for rows in partials:
+        for day, price_sum, price_count in rows:
+            total, count = days.get(day, (Decimal(0), 0))
+            days[day] = (total + Decimal(price_sum), count + price_count)
+    return [(day, *days[day]) for day in sorted(days)]
+
+
+class ChunkSlots:
+    """
+    Connections shared by the chunks of every query of the process, on top of
+    the one connection each admitted request uses.
+
+    A query always runs one chunk at a time on its own connection, and runs
+    more at once only for the slots it can take without waiting. Under load
+    queries degrade to running their chunks one after another, so chunked
+    queries never need more connections than the admitted requests plus
+    `capacity`, which is sized to fit in the pool.
+    """
+
+    def __init__(self) -> None:
+        self.capacity = 0
+        self.in_use = 0
+        self.taken = 0
+        self.denied = 0
+
+    def configure(self, capacity: int):
+        """
+        Sets the shared connections.
+
+        Parameters:
+        capacity (int): Extra connections chunks may hold at once, 0 runs
+            every query's chunks one after another
+        """
+        self.capacity = capacity
+
+    @property
+    def free(self) -> int:
+        """
+        Slots not taken.
+        """
+        return max(0, self.capacity - self.in_use)
+
+    def try_take(self) -> bool:
+        """
+        Takes a slot if one is free, without waiting.
+        """
+        if self.in_use >= self.capacity:
+            self.denied += 1
+            return False
+        self.in_use += 1
+        self.taken += 1
+        return True
+
+    def give_back(self):
+        """
+        Returns a slot taken with try_take.
+        """
+        self.in_use -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the slot usage counters.
+        """
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "taken": self.taken,
+            "denied": self.denied,
+        }
+
+    def __call__(self) -> "ChunkSlots":
+        """
+        Make the ChunkSlots object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        ChunkSlots: The chunk slots object itself
+        """
+        return self
+
+
+async def fetch_chunks(
+    chunks: Sequence[Chunk], fetch: FetchChunk, fan_out: int, slots: ChunkSlots
+) -> List[Tuple[date, Decimal, int]]:
+    """
+    Runs the chunks, up to `fan_out` at a time, and merges their per-day sums.
+
+    Each fetch is expected to check out its own connection. The first runner
+    uses the request's own connection; the others each hold one of the shared
+    `slots`, taken without waiting, so the process never asks the pool for
+    more than it holds. When a chunk fails the others are cancelled and the
+    error is raised.
+
+    Parameters:
+    chunks (Sequence[Chunk]): The planned chunks
+    fetch (FetchChunk): Loads the (day, price sum, price count) rows of a chunk
+    fan_out (int): Upper bound for the chunks running at once
+    slots (ChunkSlots): The shared connections
+
+    Returns:
+    List[Tuple[date, Decimal, int]]: (day, price sum, price count) in day order
+    """
+    if len(chunks) == 1:
+        return merge_sums([await fetch(chunks[0])])
+    pending = list(enumerate(chunks))
+    partials: List[List[Tuple[date, Decimal, int]]] = [[] for _ in chunks]
+
+    async def run(shared: bool):
+        try:
+            while pending:
+                index, chunk = pending.pop(0)
+                partials[index] = await fetch(chunk)
+        finally:
+            if shared:
+                slots.give_back()
+
+    extra = 0
+    while extra < min(fan_out, len(chunks)) - 1 and slots.try_take():
+        extra += 1
+    tasks = [asyncio.ensure_future(run(False))]
+    tasks += [asyncio.ensure_future(run(True)) for _ in range(extra)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return merge_sums(partials)
+
+
+# Create an instance of the ChunkSlots class shared by the chunked rates queries
+chunk_slots = ChunkSlots()
@@ -0,0 +1,205 @@
+"""Per-day range cache for the rates API"""
+
+from bisect import insort
+from collections import OrderedDict
+from datetime import date, timedelta
+from decimal import Decimal
+from time import monotonic
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+
+from .crud import DailyAverage, averages_from_sums
+
+ONE_DAY = timedelta(days=1)
+
+# Fetches (day, price sum, price count) rows for an inclusive date range
+Fetch = Callable[[date, date], Awaitable[List[Tuple[date, Decimal, int]]]]
+
+
+class LaneDays:
+    """
+    Per-day price sums and counts of one lane, along with the date ranges
+    that have been loaded. Days inside a loaded range without an entry had no
+    prices.
+    """
+
+    def __init__(self, created: float) -> None:
+        self.created = created
+        # Size charged against the cache bound when the lane was last stored
+        self.charged = 0
+        self.ranges: List[Tuple[date, date]] = []
+        self.days: Dict[date, Tuple[Decimal, int]] = {}
+
+    @property
+    def size(self) -> int:
+        """
+        Number of days covered by the loaded ranges.
+        """
+        return sum((end - start).days + 1 for start, end in self.ranges)
+
+    def gaps(self, date_from: date, date_to: date) -> List[Tuple[date, date]]:
+        """
+        Returns the sub-ranges of the window that have not been loaded yet.
+        """
+        gaps = []
+        cursor = date_from
+        for start, end in self.ranges:
+            if end < cursor:
+                continue
+            if start > date_to:
+                break
+            if start > cursor:
+                gaps.append((cursor, start - ONE_DAY))
+            cursor = max(cursor, end + ONE_DAY)
+            if cursor > date_to:
+                return gaps
+        if cursor <= date_to:
+            gaps.append((cursor, date_to))
+        return gaps
+
+    def add(self, date_from: date, date_to: date, rows: List[Tuple[date, Decimal, int]]):
+        """
+        Records the rows loaded for a range and merges it with the adjacent ranges.
+        """
+        for day, price_sum, price_count in rows:
+            self.days[day] = (price_sum, price_count)
+        insort(self.ranges, (date_from, date_to))
+        merged = [self.ranges[0]]
+        for start, end in self.ranges[1:]:
+            last_start, last_end = merged[-1]
+            if start <= last_end + ONE_DAY:
+                merged[-1] = (last_start, max(last_end, end))
+            else:
+                merged.append((start, end))
+        self.ranges = merged
+
+    def averages(self, date_from: date, date_to: date) -> List[DailyAverage]:
+        """
+        Returns the ordered daily averages for a fully loaded window.
+        """
+        days = sorted(day for day in self.days if date_from <= day <= date_to)
+        return averages_from_sums((day, *self.days[day]) for day in days)
+
+
+class DayRangeCache:
+    """
+    Cache of per-day price sums and counts per lane, so overlapping and
+    sliding windows only query the days that are not cached yet.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.max_days = 0
+        self.ttl = 0.0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = monotonic
+        self._generation = 0
+        self._lanes: "OrderedDict[Hashable, LaneDays]" = OrderedDict()
+
+    def configure(
+        self, max_days: int, ttl: float, clock: Callable[[], float] = monotonic
+    ):
+        """
+        Enables the cache.
+
+        Parameters:
+        max_days (int): Upper bound for the cached days summed over all lanes
+        ttl (float): Seconds a lane is kept before it is reloaded
+        clock (Callable[[], float]): Time source, replaceable in tests
+        """
+        self.enabled = True
+        self.max_days = max_days
+        self.ttl = ttl
+        self._clock = clock
+
+    async def get_averages(
+        self, lane: Hashable, date_from: date, date_to: date, fetch: Fetch
+    ) -> List[DailyAverage]:
+        """
+        Returns the daily averages of a lane, fetching only the missing days.
+
+        Parameters:
+        lane (Hashable): The normalized lane, e.g. the resolved port codes
+        date_from (date): Start date for the range (inclusive)
+        date_to (date): End date for the range (inclusive)
+        fetch (Fetch): Loads (day, price sum, price count) rows for a range
+
+        Returns:
+        List[DailyAverage]: The day and average price, ordered by day
+        """
+        now = self._clock()
+        entry = self._lanes.get(lane)
+        if entry is not None and entry.created + self.ttl <= now:
+            self._drop(lane)
+            entry = None
+        if entry is None:
+            entry = LaneDays(now)
+        generation = self._generation
+
+        gaps = entry.gaps(date_from, date_to)
+        days = (date_to - date_from).days + 1
+        missing = sum((end - start).days + 1 for start, end in gaps)
+        self.hits += days - missing
+        self.misses += missing
+        for start, end in gaps:
+            entry.add(start, end, await fetch(start, end))
+
+        result = entry.averages(date_from, date_to)
+        # Only keep what was loaded if the data did not change meanwhile
+        if generation == self._generation:
+            self._store(lane, entry)
+        return result
+
+    def invalidate(self, _version: int = 0):
+        """
+        Drops every lane after a dataset version change.
+        """
+        self._generation += 1
+        self._lanes.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+        Dict[str, int]: Days served from cache and from the database, lane
+        evictions, cached lanes and cached days
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "lanes": len(self._lanes),
+            "days": self.size,
+        }
+
+    def _store(self, lane: Hashable, entry: LaneDays):
+        if lane in self._lanes:
+            self._drop(lane)
+        if entry.size > self.max_days:
+            return
+        entry.charged = entry.size
+        self._lanes[lane] = entry
+        self.size += entry.charged
+        while self.size > self.max_days:
+            self._drop(next(iter(self._lanes)))
+            self.evictions += 1
+
+    def _drop(self, lane: Hashable):
+        self.size -= self._lanes.pop(lane).charged
+
+    def __call__(self) -> "DayRangeCache":
+        """
+        Make the DayRangeCache object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        DayRangeCache: The cache object itself
+        """
+        return self
+
+
+# Create an instance of the DayRangeCache class
+range_cache = DayRangeCache()
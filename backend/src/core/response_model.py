@@ -1,7 +1,31 @@
 """Library utilities for FastAPI"""
 
-from typing import List, Optional
+import json
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
 from fastapi.responses import JSONResponse
+from sqlalchemy.engine import Row
+
+
+def error_content(
+    status_code: int, message: str, details: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Build the body of an error response.
+
+    Args:
+        status_code (int): The HTTP status code for the error response.
+        message (str): A brief message describing the error.
+        details (Optional[List[str]]): Additional details about the error, if any.
+
+    Returns:
+        Dict[str, Any]: The status code, message, and details.
+    """
+    return {
+        "status_code": status_code,
+        "message": message,
+        "details": details or [],
+    }
 
 
 def response_error(
@@ -23,9 +47,102 @@ def response_error(
     """
     return JSONResponse(
         status_code=status_code,
-        content={
-            "status_code": status_code,
-            "message": message,
-            "details": details or [],
-        },
+        content=error_content(status_code, message, details),
     )
+
+
+def encode_price(day: date, average_price: Optional[Any]) -> str:
+    """
+    Encode one day and average price as a PriceResponse JSON object.
+
+    The schema is fixed, so the object is formatted directly instead of going
+    through model validation and json.dumps. The output matches the default
+    FastAPI response for the same PriceResponse byte for byte.
+
+    Args:
+        day (date): The day.
+        average_price (Optional[Any]): The average price, a float, Decimal or None.
+
+    Returns:
+        str: The encoded JSON object.
+    """
+    if average_price is None:
+        return '{"day":"%s","average_price":null}' % day.isoformat()
+    return '{"day":"%s","average_price":%r}' % (day.isoformat(), float(average_price))
+
+
+def encode_prices(rows: Iterable[Row]) -> bytes:
+    """
+    Encode day and average price rows into the JSON body of a PriceResponse list.
+
+    Args:
+        rows (Iterable[Row]): Rows with `day` and `average_price` columns, in that order.
+
+    Returns:
+        bytes: The encoded JSON array.
+    """
+    return ("[" + ",".join([encode_price(row[0], row[1]) for row in rows]) + "]").encode()
+
+
+def encode_price_stats(rows: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Encode per day statistics into the JSON body of a PriceStatsResponse list.
+
+    Args:
+        rows (Iterable[Dict[str, Any]]): The day, average price and selected statistics.
+
+    Returns:
+        bytes: The encoded JSON array, formatted like the default FastAPI response.
+    """
+    return json.dumps(
+        [{**row, "day": row["day"].isoformat()} for row in rows],
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+# Media types served row by row by the streaming output mode
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+def streaming_media_type(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the streaming output format requested by an Accept header.
+
+    Args:
+        accept (Optional[str]): The Accept header value.
+
+    Returns:
+        Optional[str]: NDJSON_MEDIA_TYPE or CSV_MEDIA_TYPE, None for a regular JSON response.
+    """
+    if not accept:
+        return None
+    for media_type in (NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE):
+        if media_type in accept:
+            return media_type
+    return None
+
+
+async def encode_price_stream(
+    rows: AsyncIterator[Row], media_type: str
+) -> AsyncIterator[bytes]:
+    """
+    Encode day and average price rows one line at a time.
+
+    Args:
+        rows (AsyncIterator[Row]): Rows with `day` and `average_price` columns.
+        media_type (str): NDJSON_MEDIA_TYPE or CSV_MEDIA_TYPE.
+
+    Returns:
+        AsyncIterator[bytes]: The encoded lines, preceded by a header line for CSV.
+    """
+    if media_type == CSV_MEDIA_TYPE:
+        yield b"day,average_price\n"
+    async for row in rows:
+        if media_type == CSV_MEDIA_TYPE:
+            price = "" if row.average_price is None else repr(float(row.average_price))
+            yield f"{row.day.isoformat()},{price}\n".encode()
+        else:
+            yield (encode_price(row.day, row.average_price) + "\n").encode()
@@ -1,22 +1,105 @@
 """Component API routers"""
 
-from datetime import datetime
+from datetime import date, datetime, timezone
 from logging import getLogger
-from typing import Dict, Any, List
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import asyncpg
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from sqlalchemy.exc import DBAPIError
+
+from lib.sqla.db import DeadlineExceeded, deadline_exceeded
+from lib.sqla.profiler import QueryProfiler
+from . import __version__
+from .admission import AdmissionControl, admission
+from .cache import RatesCache, rates_cache
+from .conditional import not_modified, validator_headers
+from .db import Database, database, query_profiler
+from .response_model import (
+    CSV_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+    encode_price_stats,
+    encode_price_stream,
+    encode_prices,
+    error_content,
+    response_error,
+    streaming_media_type,
+)
+from .crud import (
+    MIN_PRICE_COUNT,
+    PRICE_STATS,
+    averages_from_sums,
+    get_average_prices,
+    get_batch_daily_sums,
+    get_bucketed_sums,
+    get_daily_sums,
+    get_price_stats,
+    stream_average_prices,
+)
+from .hierarchy import PortHierarchy, port_hierarchy
+from .metrics import DB_ERRORS, ROWS_RETURNED, STAGE_LATENCY, registry
+from .planner import Chunk, ChunkSlots, chunk_slots, fetch_chunks, plan_chunks
+from .range_cache import DayRangeCache, range_cache
+from .singleflight import SingleFlight, rates_flight
+from .version import DataVersion, data_version
+from .model import (
+    BatchRatesRequest,
+    BatchRatesResponse,
+    PriceResponse,
+    PriceStatsResponse,
+)
 
-from .db import Database, database
-from .response_model import response_error
-from .crud import get_average_prices, get_port_codes
-from .model import PriceResponse
+import config as cfg
 
 root = APIRouter()
 
 LOG = getLogger("rate_calculator")
 
 
+DATE_FORMAT = "%Y-%m-%d"
+
+# Largest moving average window of /rates, in buckets
+MAX_ROLLING = 366
+
+
+def deadline_error() -> Response:
+    """
+    Create the response of a request whose queries ran past its deadline.
+
+    Returns:
+        Response: A 503 error response asking the client to retry later.
+    """
+    response = response_error(
+        503, "Query deadline exceeded", ["The query took too long, retry later"]
+    )
+    response.headers["Retry-After"] = str(cfg.ADMISSION_RETRY_AFTER)
+    return response
+
+
+def parse_date(value: str) -> date:
+    """
+    Parse a date string already checked by validate_dates.
+
+    Args:
+        value (str): The date in YYYY-MM-DD format.
+
+    Returns:
+        date: The parsed date.
+    """
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+
 async def validate_dates(date_from: str, date_to: str) -> str:
     """
     Validate the date format and ensure date_from is earlier than date_to.
@@ -30,8 +113,8 @@ async def validate_dates(date_from: str, date_to: str) -> str:
     """
     try:
         # Parse the date strings into datetime objects
-        date_from = datetime.strptime(date_from, "%Y-%m-%d")
-        date_to = datetime.strptime(date_to, "%Y-%m-%d")
+        date_from = datetime.strptime(date_from, DATE_FORMAT)
+        date_to = datetime.strptime(date_to, DATE_FORMAT)
 
         # Check if date_from is earlier than date_to
         if date_from > date_to:
@@ -43,10 +126,279 @@ async def validate_dates(date_from: str, date_to: str) -> str:
         return "Invalid date format. Use YYYY-MM-DD format."
 
 
+async def validate_lane(
+    hierarchy: PortHierarchy,
+    origin: str,
+    destination: str,
+    date_from: str,
+    date_to: str,
+) -> Tuple[Tuple[str, ...], Tuple[str, ...], List[str]]:
+    """
+    Resolve the origin and destination and validate the date range of a lane.
+
+    Args:
+        hierarchy (PortHierarchy): The port hierarchy.
+        origin (str): The origin port code or slug name.
+        destination (str): The destination port code or slug name.
+        date_from (str): The start date in YYYY-MM-DD format.
+        date_to (str): The end date in YYYY-MM-DD format.
+
+    Returns:
+        Tuple[Tuple[str, ...], Tuple[str, ...], List[str]]: The origin and destination
+        port codes, and the validation error messages.
+    """
+    error_msg = []
+    # Validate if the port or slug name is valid
+    port_origin = hierarchy.resolve(origin)
+    port_destination = hierarchy.resolve(destination)
+    # Validate the date range provided
+    validate_date = await validate_dates(date_from, date_to)
+    if not port_origin:
+        error_msg.append(
+            f"Origin port code or slug name provided {origin} is not valid"
+        )
+    if not port_destination:
+        error_msg.append(
+            f"Destination port code or slug name provided {destination} is not valid"
+        )
+    if validate_date:
+        error_msg.append(validate_date)
+    return port_origin, port_destination, error_msg
+
+
+def parse_stats(stats: Optional[str]) -> Tuple[Tuple[str, ...], Optional[str]]:
+    """
+    Parse the comma separated `stats` selector.
+
+    Args:
+        stats (Optional[str]): The selector, e.g. "median,p90".
+
+    Returns:
+        Tuple[Tuple[str, ...], Optional[str]]: The selected statistics in
+        PRICE_STATS order, and an error message for unknown ones.
+    """
+    if not stats:
+        return (), None
+    selected = {name.strip() for name in stats.split(",") if name.strip()}
+    unknown = sorted(selected.difference(PRICE_STATS))
+    if unknown:
+        return (), (
+            f"Unknown statistics {', '.join(unknown)}, "
+            f"choose from {', '.join(PRICE_STATS)}"
+        )
+    return tuple(name for name in PRICE_STATS if name in selected), None
+
+
+async def load_average_prices(
+    db: Database,
+    days: DayRangeCache,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+) -> List[Any]:
+    """
+    Load the daily average prices of a resolved lane, through the range cache when enabled.
+
+    Queries estimated wider than RATES_PARALLEL_THRESHOLD are split into
+    chunks run concurrently, whose per-day sums are merged before averaging.
+
+    Args:
+        db (Database): The database to query.
+        days (DayRangeCache): The per-day range cache.
+        origin (Sequence[str]): Resolved origin port codes.
+        destination (Sequence[str]): Resolved destination port codes.
+        date_from (date): Start date for the range (inclusive).
+        date_to (date): End date for the range (inclusive).
+
+    Returns:
+        List[Any]: Rows with `day` and `average_price`, ordered by day.
+    """
+    async def fetch_chunk(chunk: Chunk):
+        async with db.read() as conn:
+            with STAGE_LATENCY.time("query"):
+                return await get_daily_sums(
+                    conn,
+                    chunk.origin,
+                    chunk.destination,
+                    chunk.date_from,
+                    chunk.date_to,
+                    use_aggregates=cfg.RATES_FROM_AGGREGATES,
+                )
+
+    def plan(gap_from: date, gap_to: date) -> List[Chunk]:
+        return plan_chunks(
+            origin,
+            destination,
+            gap_from,
+            gap_to,
+            threshold=cfg.RATES_PARALLEL_THRESHOLD,
+            max_chunks=cfg.RATES_PARALLEL_MAX_CHUNKS,
+            min_chunk_days=cfg.RATES_PARALLEL_MIN_CHUNK_DAYS,
+            fan_out=min(cfg.RATES_PARALLEL_FAN_OUT, 1 + chunk_slots.free),
+            round_trip_rows=cfg.RATES_PARALLEL_ROUND_TRIP_ROWS,
+        )
+
+    if not days.enabled:
+        chunks = plan(date_from, date_to)
+        if len(chunks) > 1:
+            return averages_from_sums(
+                await fetch_chunks(
+                    chunks, fetch_chunk, cfg.RATES_PARALLEL_FAN_OUT, chunk_slots
+                ),
+                MIN_PRICE_COUNT,
+            )
+        async with db.read() as conn:
+            with STAGE_LATENCY.time("query"):
+                return await get_average_prices(
+                    conn,
+                    origin,
+                    destination,
+                    date_from,
+                    date_to,
+                    use_aggregates=cfg.RATES_FROM_AGGREGATES,
+                )
+
+    async def fetch(gap_from: date, gap_to: date):
+        return await fetch_chunks(
+            plan(gap_from, gap_to), fetch_chunk, cfg.RATES_PARALLEL_FAN_OUT, chunk_slots
+        )
+
+    return await days.get_averages(
+        (tuple(origin), tuple(destination)), date_from, date_to, fetch
+    )
+
+
+async def load_rates_body(
+    db: Database,
+    days: DayRangeCache,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    stats: Sequence[str],
+    min_samples: int,
+    bucket: str,
+    rolling: int,
+) -> Tuple[bytes, int]:
+    """
+    Load and encode the /rates response body of a resolved lane.
+
+    Args:
+        db (Database): The database to query.
+        days (DayRangeCache): The per-day range cache.
+        origin (Sequence[str]): Resolved origin port codes.
+        destination (Sequence[str]): Resolved destination port codes.
+        date_from (date): Start date for the range (inclusive).
+        date_to (date): End date for the range (inclusive).
+        stats (Sequence[str]): Selected statistics, see parse_stats.
+        min_samples (int): Days or buckets with fewer prices have no average.
+        bucket (str): "day", "week" or "month".
+        rolling (int): Number of buckets of the moving average.
+
+    Returns:
+        Tuple[bytes, int]: The JSON body and the number of entries in it.
+    """
+    if bucket != "day" or rolling > 1:
+        async with db.read() as conn:
+            with STAGE_LATENCY.time("query"):
+                sums = await get_bucketed_sums(
+                    conn,
+                    origin,
+                    destination,
+                    date_from,
+                    date_to,
+                    bucket,
+                    rolling,
+                    use_aggregates=cfg.RATES_FROM_AGGREGATES,
+                )
+        result = averages_from_sums(sums, min_samples)
+        encode = encode_prices
+    elif stats or min_samples != MIN_PRICE_COUNT:
+        async with db.read() as conn:
+            with STAGE_LATENCY.time("query"):
+                result = await get_price_stats(
+                    conn,
+                    origin,
+                    destination,
+                    date_from,
+                    date_to,
+                    stats,
+                    min_samples,
+                    use_aggregates=cfg.RATES_FROM_AGGREGATES,
+                )
+        encode = encode_price_stats
+    else:
+        result = await load_average_prices(
+            db, days, origin, destination, date_from, date_to
+        )
+        encode = encode_prices
+    with STAGE_LATENCY.time("serialize"):
+        body = encode(result)
+    return body, len(result)
+
+
+async def stream_rates(
+    db: Database,
+    origin: Sequence[str],
+    destination: Sequence[str],
+    date_from: date,
+    date_to: date,
+    media_type: str,
+) -> AsyncIterator[bytes]:
+    """
+    Stream the encoded daily average prices of a resolved lane as they are read.
+
+    The connection is held until the last row has been sent. The streamed rows
+    are counted in ROWS_RETURNED once the last one is sent; no query stage is
+    timed, as reading the rows and sending them overlap.
+
+    Args:
+        db (Database): The database to query.
+        origin (Sequence[str]): Resolved origin port codes.
+        destination (Sequence[str]): Resolved destination port codes.
+        date_from (date): Start date for the range (inclusive).
+        date_to (date): End date for the range (inclusive).
+        media_type (str): NDJSON_MEDIA_TYPE or CSV_MEDIA_TYPE.
+
+    Returns:
+        AsyncIterator[bytes]: The encoded lines.
+    """
+    async with db.read() as conn:
+        rows = stream_average_prices(
+            conn,
+            origin,
+            destination,
+            date_from,
+            date_to,
+            use_aggregates=cfg.RATES_FROM_AGGREGATES,
+        )
+        lines = 0
+        async for line in encode_price_stream(rows, media_type):
+            lines += 1
+            yield line
+    # Less the header line of CSV
+    ROWS_RETURNED.observe(lines - (media_type == CSV_MEDIA_TYPE))
+
+
 @root.get(
     "/rates",
     tags=["Rate"],
-    response_model=List[PriceResponse],
+    response_model=Union[List[PriceResponse], List[PriceStatsResponse]],
+    responses={
+        200: {
+            "description": "Send `Accept: application/x-ndjson` or `Accept: text/csv` "
+            "to stream one line per day instead of a JSON array. With `stats` or "
+            "`min_samples`, every day is a PriceStatsResponse with the selected "
+            "statistics. With `bucket`, every entry is a week or month labelled with "
+            "its first day, with `rolling` the moving average ending at it",
+            "content": {NDJSON_MEDIA_TYPE: {}, CSV_MEDIA_TYPE: {}},
+        },
+        304: {
+            "description": "The dataset did not change since the response matching "
+            "`If-None-Match` or `If-Modified-Since`",
+        },
+    },
     summary="Get Average Prices",
     description="Fetch avg price for each day between origin and destination within date range",
 )
@@ -56,6 +408,26 @@ async def get_rates(
     origin: str,
     destination: str,
     db: Database = Depends(database),
+    hierarchy: PortHierarchy = Depends(port_hierarchy),
+    cache: RatesCache = Depends(rates_cache),
+    version: DataVersion = Depends(data_version),
+    days: DayRangeCache = Depends(range_cache),
+    flight: SingleFlight = Depends(rates_flight),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    stats: Optional[str] = Query(
+        None, description=f"Comma separated statistics: {', '.join(PRICE_STATS)}"
+    ),
+    min_samples: int = Query(
+        MIN_PRICE_COUNT, ge=1, description="Minimum prices of a day to report it"
+    ),
+    bucket: Literal["day", "week", "month"] = Query(
+        "day", description="Average the prices per day, week or month"
+    ),
+    rolling: int = Query(
+        1, ge=1, le=MAX_ROLLING, description="Moving average over this many buckets"
+    ),
 ) -> Dict[str, Any]:
     """
     Fetch average prices for each day between the origin and destination ports or slug names
@@ -67,47 +439,295 @@ async def get_rates(
         origin (str): The origin port code or slug name.
         destination (str): The destination port code or slug name.
         db (Database): The database dependency.
+        hierarchy (PortHierarchy): The port hierarchy dependency.
+        cache (RatesCache): The response cache dependency.
+        version (DataVersion): The dataset version dependency.
+        days (DayRangeCache): The per-day range cache dependency.
+        flight (SingleFlight): The dependency coalescing identical concurrent queries.
+        accept (Optional[str]): The Accept header, selecting the streaming output mode.
+        if_none_match (Optional[str]): ETags of the client's copies, for a 304 response.
+        if_modified_since (Optional[str]): Date of the client's copy, for a 304 response.
+        stats (Optional[str]): Comma separated statistics to report next to the average.
+        min_samples (int): Days with fewer prices have no average nor statistics.
+        bucket (str): Average the prices per "day", "week" or "month".
+        rolling (int): Number of buckets of the moving average ending at each bucket.
 
     Returns:
         Dict[str, Any]: A list of average prices for each day or an error response.
     """
     try:
-        error_msg = []
-        async with db.connect() as conn:
-            # Validate if the port or slug name is valid
-            port_origin = await get_port_codes(conn, origin)
-            port_destination = await get_port_codes(conn, destination)
-            # Validate the date range provided
-            validate_date = await validate_dates(date_from, date_to)
-            if not port_origin:
-                error_msg.append(
-                    f"Origin port code or slug name provided {origin} is not valid"
-                )
-            if not port_destination:
-                error_msg.append(
-                    f"Destination port code or slug name provided {destination} is not valid"
-                )
-            if validate_date:
-                error_msg.append(validate_date)
+        with STAGE_LATENCY.time("resolve"):
+            port_origin, port_destination, error_msg = await validate_lane(
+                hierarchy, origin, destination, date_from, date_to
+            )
+        selected, stats_error = parse_stats(stats)
+        if stats_error:
+            error_msg.append(stats_error)
+        bucketed = bucket != "day" or rolling > 1
+        if selected and bucketed:
+            error_msg.append("stats can not be combined with bucket or rolling")
+        if error_msg:
+            return response_error(
+                404,
+                "Invalid input data, more information in details",
+                error_msg,
+            )
+
+        day_from, day_to = parse_date(date_from), parse_date(date_to)
+        options = bucketed or bool(selected) or min_samples != MIN_PRICE_COUNT
+        media_type = None if options else streaming_media_type(accept)
+        cache_key = cache.key(
+            version.version,
+            port_origin,
+            port_destination,
+            day_from,
+            day_to,
+            (
+                f"{','.join(selected)};{min_samples};{bucket};{rolling}"
+                if options
+                else ""
+            ),
+        )
+        # Validated before any query, so repeat polls cost no database work
+        headers = validator_headers(
+            cache_key,
+            media_type or "application/json",
+            version.updated_at,
+            day_to,
+            datetime.now(timezone.utc).date(),
+            cfg.RATES_MAX_AGE_HISTORICAL,
+            cfg.RATES_MAX_AGE_CURRENT,
+        )
+        if not_modified(headers, if_none_match, if_modified_since):
+            return Response(status_code=304, headers=headers)
+        if media_type:
+            return StreamingResponse(
+                stream_rates(
+                    db, port_origin, port_destination, day_from, day_to, media_type
+                ),
+                media_type=media_type,
+                headers=headers,
+            )
+
+        if cache.enabled:
+            body = await cache.get(cache_key)
+            if body is not None:
+                return Response(body, media_type="application/json", headers=headers)
+
+        async def compute() -> Tuple[bytes, int]:
+            body, rows = await load_rates_body(
+                db,
+                days,
+                port_origin,
+                port_destination,
+                day_from,
+                day_to,
+                selected,
+                min_samples,
+                bucket,
+                rolling,
+            )
+            if cache.enabled:
+                await cache.set(cache_key, body)
+            return body, rows
+
+        if cfg.RATES_COALESCE:
+            body, rows = await flight.do(cache_key, compute)
+        else:
+            body, rows = await compute()
+        ROWS_RETURNED.observe(rows)
+        return Response(body, media_type="application/json", headers=headers)
+    except (asyncpg.PostgresError, DBAPIError, DeadlineExceeded) as e:
+        DB_ERRORS.inc(type(getattr(e, "orig", None) or e).__name__)
+        if deadline_exceeded(e):
+            LOG.warning("Query deadline exceeded: %s", e)
+            return deadline_error()
+        LOG.error("Database error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Database error: {e}") from e
+    except Exception as e:
+        LOG.error("Unexpected error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {e}") from e
+
+
+@root.post(
+    "/rates/batch",
+    tags=["Rate"],
+    response_model=BatchRatesResponse,
+    summary="Get Average Prices For Many Lanes",
+    description="Fetch avg price for each day of many origin and destination lanes at once",
+)
+async def get_batch_rates(
+    request: BatchRatesRequest,
+    db: Database = Depends(database),
+    hierarchy: PortHierarchy = Depends(port_hierarchy),
+) -> Dict[str, Any]:
+    """
+    Fetch average prices for each day of many lanes with a single query.
+
+    Invalid lanes get an error in the same structure as the /rates error
+    response, the other lanes are still computed. Lanes sharing a key are
+    rejected, as their results would overwrite each other.
+
+    Args:
+        request (BatchRatesRequest): The lanes and date ranges.
+        db (Database): The database dependency.
+        hierarchy (PortHierarchy): The port hierarchy dependency.
+
+    Returns:
+        Dict[str, Any]: The average prices or error of every lane, keyed by lane.
+    """
+    if len(request.lanes) > cfg.RATES_BATCH_MAX_LANES:
+        return response_error(
+            400,
+            "Too many lanes in batch request",
+            [f"At most {cfg.RATES_BATCH_MAX_LANES} lanes are allowed per request"],
+        )
+    duplicates = request.duplicate_keys()
+    if duplicates:
+        return response_error(
+            400,
+            "Duplicate lanes in batch request",
+            [f"Lane {key} is requested more than once" for key in duplicates],
+        )
+    try:
+        results: Dict[str, Any] = {}
+        keys: List[str] = []
+        lanes = []
+        for lane in request.lanes:
+            port_origin, port_destination, error_msg = await validate_lane(
+                hierarchy, lane.origin, lane.destination, lane.date_from, lane.date_to
+            )
             if error_msg:
-                return response_error(
-                    404,
-                    "Invalid input data, more information in details",
-                    error_msg,
+                results[lane.key] = {
+                    "error": error_content(
+                        404, "Invalid input data, more information in details", error_msg
+                    )
+                }
+                continue
+            # Reserve the slot so results keep the request order
+            results[lane.key] = None
+            keys.append(lane.key)
+            lanes.append(
+                (
+                    port_origin,
+                    port_destination,
+                    parse_date(lane.date_from),
+                    parse_date(lane.date_to),
                 )
-
-            origin_list = ",".join("'" + row[0] + "'" for row in port_origin)
-            destination_list = ",".join("'" + row[0] + "'" for row in port_destination)
-            result = await get_average_prices(
-                conn, origin_list, destination_list, date_from, date_to
             )
-            await conn.close()
-        if result:
-            return [row._asdict() for row in result]
-        return []
-    except asyncpg.PostgresError as e:
+
+        sums: List[List[Any]] = [[] for _ in lanes]
+        if lanes:
+            async with db.read() as conn:
+                rows = await get_batch_daily_sums(
+                    conn, lanes, use_aggregates=cfg.RATES_FROM_AGGREGATES
+                )
+            for row in rows:
+                sums[row.lane].append((row.day, row.price_sum, row.price_count))
+        for key, lane_sums in zip(keys, sums):
+            results[key] = {
+                "rates": [row._asdict() for row in averages_from_sums(lane_sums)]
+            }
+        return {"results": results}
+    except (asyncpg.PostgresError, DBAPIError, DeadlineExceeded) as e:
+        DB_ERRORS.inc(type(getattr(e, "orig", None) or e).__name__)
+        if deadline_exceeded(e):
+            LOG.warning("Query deadline exceeded: %s", e)
+            return deadline_error()
         LOG.error("Database error: %s", e)
         raise HTTPException(status_code=500, detail=f"Database error: {e}") from e
     except Exception as e:
         LOG.error("Unexpected error: %s", e)
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}") from e
+
+
+@root.get(
+    "/health",
+    tags=["Status"],
+    summary="Get Service Health",
+    description="Report the service version, live connection pool gauges and cache counters",
+)
+async def get_health(
+    db: Database = Depends(database),
+    cache: RatesCache = Depends(rates_cache),
+    version: DataVersion = Depends(data_version),
+    days: DayRangeCache = Depends(range_cache),
+    flight: SingleFlight = Depends(rates_flight),
+    control: AdmissionControl = Depends(admission),
+    slots: ChunkSlots = Depends(chunk_slots),
+) -> Dict[str, Any]:
+    """
+    Report the service version, the connection pool usage, the replica health,
+    the cache and coalescing counters, the admission control state and the
+    connections shared by chunked queries.
+
+    Args:
+        db (Database): The database dependency.
+        cache (RatesCache): The response cache dependency.
+        version (DataVersion): The dataset version dependency.
+        days (DayRangeCache): The per-day range cache dependency.
+        flight (SingleFlight): The query coalescing dependency.
+        control (AdmissionControl): The admission control dependency.
+        slots (ChunkSlots): The chunked query connections dependency.
+
+    Returns:
+        Dict[str, Any]: The service status, version, pool gauges and cache counters.
+    """
+    return {
+        "status": "ok",
+        "version": __version__,
+        "data_version": version.version,
+        "pool": db.pool_status(),
+        "replicas": db.replica_status(),
+        "cache": cache.stats(),
+        "range_cache": days.stats(),
+        "coalescing": flight.stats(),
+        "admission": control.stats(),
+        "parallel": slots.stats(),
+    }
+
+
+@root.get(
+    "/metrics",
+    tags=["Status"],
+    response_class=PlainTextResponse,
+    summary="Get Service Metrics",
+    description="Report request, stage latency, pool and cache metrics in Prometheus format",
+)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Report the service metrics in the Prometheus text exposition format.
+
+    Returns:
+        PlainTextResponse: The metrics of this worker process.
+    """
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@root.get(
+    "/debug/slow-queries",
+    tags=["Status"],
+    summary="Get Slow Queries",
+    description="Report the recent slow statements and their sampled EXPLAIN plans",
+)
+async def get_slow_queries(
+    profiler: QueryProfiler = Depends(query_profiler),
+) -> Dict[str, Any]:
+    """
+    Report the slow statements of this worker process with their bound
+    parameters, and the EXPLAIN (ANALYZE, BUFFERS) plans captured for a sample.
+
+    Args:
+        profiler (QueryProfiler): The statement profiler dependency.
+
+    Returns:
+        Dict[str, Any]: The statement counters, slow statements and plans, or
+        an error response when the endpoint is disabled.
+    """
+    if not cfg.SLOW_QUERY_ENDPOINT:
+        return response_error(
+            404, "Not found", ["Set SLOW_QUERY_ENDPOINT=True to enable this endpoint"]
+        )
+    return profiler.stats()
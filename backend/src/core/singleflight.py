@@ -0,0 +1,91 @@
+"""Coalescing of identical concurrent computations"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    """
+    An in-flight computation and the number of callers waiting for it.
+    """
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time, concurrent callers with the
+    same key wait for and share its result.
+
+    The computation runs in its own task, so a caller that is cancelled, e.g.
+    because its client disconnected, does not cancel it for the others. It is
+    only cancelled once every caller waiting for it is gone. Exceptions are
+    raised to every caller.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the result of `fn()`, or of the in-flight call with the same key.
+
+        Parameters:
+        key (Hashable): Identifies calls that compute the same result
+        fn (Callable[[], Awaitable[Any]]): Starts the computation
+
+        Returns:
+        Any: The result of the computation
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.shared += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: Hashable, call: _Call):
+        """
+        Removes a finished call, so the next caller starts a new computation.
+        """
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of computations run, callers that shared one, and
+        computations in flight.
+        """
+        return {
+            "executions": self.executions,
+            "shared": self.shared,
+            "in_flight": len(self._calls),
+        }
+
+    def __call__(self) -> "SingleFlight":
+        """
+        Make the SingleFlight object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        SingleFlight: The single-flight object itself
+        """
+        return self
+
+
+# Create an instance of the SingleFlight class coalescing /rates queries
+rates_flight = SingleFlight()
@@ -0,0 +1,194 @@
+"""Dataset version tracking"""
+
+import asyncio
+from datetime import datetime
+from logging import getLogger
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from lib.sqla.db import Database
+
+LOG = getLogger("rate_calculator")
+
+CREATE_TABLE = text(
+    """ CREATE TABLE IF NOT EXISTS data_version (
+            id boolean PRIMARY KEY DEFAULT true CHECK (id),
+            version bigint NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now()
+        )"""
+)
+
+SELECT_VERSION = text("SELECT version, updated_at FROM data_version")
+
+BUMP_VERSION = text(
+    """ INSERT INTO data_version (version) VALUES (1)
+            ON CONFLICT (id) DO UPDATE
+            SET version = data_version.version + 1, updated_at = now()
+            RETURNING version"""
+)
+
+
+async def bump_data_version(c: AsyncConnection, channel: str = "") -> int:
+    """
+    Increments the dataset version after prices changed and notifies the listeners.
+
+    The notification is only delivered once the surrounding transaction commits.
+
+    Parameters:
+    c (AsyncConnection): The database connection, inside a transaction
+    channel (str): NOTIFY channel the application listens on, empty to skip
+
+    Returns:
+    int: The new dataset version
+    """
+    await c.execute(CREATE_TABLE)
+    version = (await c.execute(BUMP_VERSION)).scalar()
+    if channel:
+        await c.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": channel, "payload": str(version)},
+        )
+    LOG.info("Dataset version bumped to %d", version)
+    return version
+
+
+class DataVersion:
+    """
+    In-process copy of the dataset version, kept current through NOTIFY.
+
+    Anything derived from prices (caches, validators) is tagged with this
+    version, so a bump makes it stale without explicit invalidation.
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        self.updated_at: Optional[datetime] = None
+        self._callbacks: List[Callable[[int], None]] = []
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._unlisten: Optional[Callable[[], Awaitable[None]]] = None
+
+    def on_change(self, callback: Callable[[int], None]):
+        """
+        Registers a callback invoked with the new version whenever it changes.
+
+        Parameters:
+        callback (Callable[[int], None]): The callback
+        """
+        self._callbacks.append(callback)
+
+    def set(self, version: int, updated_at: Optional[datetime] = None):
+        """
+        Records a new version and notifies the registered callbacks.
+
+        Parameters:
+        version (int): The dataset version
+        updated_at (Optional[datetime]): When the dataset last changed
+        """
+        changed = version != self.version
+        self.version = version
+        self.updated_at = updated_at
+        if changed:
+            for callback in self._callbacks:
+                callback(version)
+
+    async def load(self, db: Database):
+        """
+        Reads the current version from the database.
+
+        Parameters:
+        db (Database): The database to read from
+        """
+        async with db.connect() as conn:
+            # No writer has created the table yet, keep the initial version
+            exists = await conn.execute(text("SELECT to_regclass('data_version')"))
+            if exists.scalar() is None:
+                return
+            row = (await conn.execute(SELECT_VERSION)).first()
+        if row is not None:
+            self.set(row.version, row.updated_at)
+
+    async def start(self, db: Database, interval: int, channel: str = ""):
+        """
+        Loads the version and starts reloading it periodically and whenever a
+        bump is notified.
+
+        The periodic reload catches bumps whose notification was lost, e.g.
+        while the LISTEN connection was down. A lost LISTEN connection is
+        re-established on the next reload.
+
+        Parameters:
+        db (Database): The database to read from
+        interval (int): Seconds between periodic reloads
+        channel (str): NOTIFY channel announcing bumps, empty to disable
+        """
+        await self.load(db)
+        # Created here rather than in __init__ so it binds to the running loop
+        self._changed = asyncio.Event()
+        if channel:
+            await self._listen(db, channel)
+        self._task = asyncio.create_task(self._refresh_loop(db, interval, channel))
+
+    async def stop(self):
+        """
+        Stops the background reload and releases the NOTIFY connection.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._unlisten is not None:
+            await self._unlisten()
+            self._unlisten = None
+
+    async def _listen(self, db: Database, channel: str):
+        """
+        Subscribes to the bump notifications, waking the reload loop on every
+        bump and when the connection is lost.
+        """
+
+        def closed():
+            self._unlisten = None
+            self._changed.set()
+
+        self._unlisten = await db.listen(
+            channel, lambda _: self._changed.set(), on_close=closed
+        )
+
+    async def _refresh_loop(self, db: Database, interval: int, channel: str):
+        """
+        Reloads the version every `interval` seconds or as soon as a bump is
+        notified, subscribing again first when the LISTEN connection was lost.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            try:
+                if channel and self._unlisten is None:
+                    await self._listen(db, channel)
+                    LOG.info("Listening on %s again", channel)
+                await self.load(db)
+            except Exception as e:  # pylint: disable=broad-except
+                # Keep the current version until the next attempt
+                LOG.error("Dataset version reload failed: %s", e)
+
+    def __call__(self) -> "DataVersion":
+        """
+        Make the DataVersion object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        DataVersion: The data version object itself
+        """
+        return self
+
+
+# Create an instance of the DataVersion class
+data_version = DataVersion()
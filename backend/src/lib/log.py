@@ -1,6 +1,13 @@
 """Generic logging configuration for different components"""
 
-from typing import Any, Dict
+import json
+import logging
+import queue
+import random
+from copy import deepcopy
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, TextIO
 
 # Logging configuration dictionary
 LOG_CONFIG = {
@@ -48,11 +55,153 @@ LOG_CONFIG = {
 }
 
 
-def get_config(*, log_level: str = "DEBUG") -> Dict[str, Any]:
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """
+    Lets through a random share of the records below WARNING, and every
+    warning and error.
+    """
+
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class _Listener(QueueListener):
+    """
+    QueueListener whose stop waits for room in a full queue instead of failing.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+# Live queued handlers, for the drop counter
+_QUEUED_HANDLERS: List["QueuedStreamHandler"] = []
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    Hands records to a background thread writing them to a stream, so logging
+    never blocks the calling thread on a slow stream.
+
+    The queue is bounded: records arriving while it is full are dropped and
+    counted instead of waiting. The formatter set on this handler is used by
+    the writing thread.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, maxsize: int = 10000) -> None:
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = _Listener(self.queue, self.target)
+        self.listener.start()
+        _QUEUED_HANDLERS.append(self)
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Resolves the message arguments and traceback, which may not be safe
+        to read from another thread, and keeps the rest for the formatter.
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+        Writes out the queued records and stops the writing thread.
+        """
+        if self in _QUEUED_HANDLERS:
+            _QUEUED_HANDLERS.remove(self)
+            self.listener.stop()
+            if self.dropped:
+                self.target.stream.write(
+                    f"{self.dropped} log records dropped, the log queue was full\n"
+                )
+            self.target.close()
+        super().close()
+
+
+def dropped_records() -> int:
+    """
+    Returns the number of records dropped by the live queued handlers.
+    """
+    return sum(handler.dropped for handler in _QUEUED_HANDLERS)
+
+
+def get_config(
+    *,
+    log_level: str = "DEBUG",
+    queued: bool = False,
+    json_lines: bool = False,
+    access_sample_rate: float = 1.0,
+    queue_size: int = 10000,
+) -> Dict[str, Any]:
     """
     Returns a logging configuration with the specified log level.
+
+    Parameters:
+    log_level (str): Level of the application loggers
+    queued (bool): Write records from a background thread through a bounded
+        queue, see QueuedStreamHandler
+    json_lines (bool): Format records as JSON lines
+    access_sample_rate (float): Share of the uvicorn access log records kept
+    queue_size (int): Records buffered per queued handler before dropping
+
+    Returns:
+    Dict[str, Any]: The configuration for logging.config.dictConfig
     """
-    cfg = {**LOG_CONFIG}
+    cfg = deepcopy(LOG_CONFIG)
     cfg["loggers"]["default"]["level"] = log_level
     cfg["loggers"]["rate_calculator"]["level"] = log_level
+    if json_lines:
+        for formatter in cfg["formatters"].values():
+            formatter.clear()
+            formatter["()"] = JsonFormatter
+    if queued:
+        for handler in cfg["handlers"].values():
+            handler.pop("class")
+            handler["()"] = QueuedStreamHandler
+            handler["maxsize"] = queue_size
+    if access_sample_rate < 1.0:
+        cfg["filters"] = {
+            "access_sample": {"()": SampleFilter, "rate": access_sample_rate}
+        }
+        cfg["loggers"]["uvicorn.access"] = {"filters": ["access_sample"]}
     return cfg
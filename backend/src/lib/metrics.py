@@ -0,0 +1,216 @@
+"""Minimal Prometheus metrics with text exposition"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Default latency buckets in seconds, from 1ms to 10s
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """
+    Formats a label set as {name="value",...}, empty without labels.
+    """
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """
+    Base class of a metric family with a fixed set of label names.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """
+        Yields (sample name, formatted labels, value) for the exposition.
+        """
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """
+        Returns the exposition lines of the metric family.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {value!r}")
+        return lines
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing counter.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        """
+        Increments the counter of a label set.
+        """
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        """
+        Returns the current value of a label set.
+        """
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Histogram(Metric):
+    """
+    Histogram with fixed buckets. Observing is a bisect and two additions.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (the last one is +Inf), sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        """
+        Records an observation for a label set.
+        """
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """
+        Observes the wall-clock seconds spent inside the block.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        label_names = self.labels + ("le",)
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket", _format_labels(
+                    label_names, labels + (le,)
+                ), float(cumulative)
+            yield self.name + "_sum", _format_labels(self.labels, labels), total[0]
+            yield self.name + "_count", _format_labels(
+                self.labels, labels
+            ), float(cumulative)
+
+
+class Gauge(Metric):
+    """
+    Gauge read from a callback when the metrics are collected.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Dict[LabelValues, float]],
+        labels: Sequence[str] = (),
+    ):
+        super().__init__(name, documentation, labels)
+        self._collect = collect
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for labels, value in self._collect().items():
+            yield self.name, _format_labels(self.labels, labels), float(value)
+
+
+class CallbackCounter(Gauge):
+    """
+    Counter kept by another component and read from a callback when the
+    metrics are collected.
+    """
+
+    kind = "counter"
+
+
+class Registry:
+    """
+    Collection of metric families rendered together.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Adds a metric family and returns it.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except RuntimeError:
+                # Gauges of components that are not configured yet
+                continue
+        return "\n".join(lines) + "\n"
@@ -1,9 +1,28 @@
 """Database connectivity"""
 
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from functools import wraps
+from itertools import count
 from logging import getLogger
-from typing import Optional
+from time import monotonic, perf_counter
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+)
 
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 from sqlalchemy.ext.asyncio.engine import create_async_engine
 
@@ -48,6 +67,122 @@ def create_psql_connection_string(
     return f"postgresql+asyncpg://{username}:{password}@{hostname}:{port}/{database}"
 
 
+# Seconds a replica is behind the primary, 0 on a primary or a replica that
+# replayed everything it received, so an idle primary does not look like lag
+REPLICATION_LAG_QUERY = text(
+    """ SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(
+                EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+            )
+        END"""
+)
+
+# Ways of spreading reads over the healthy replicas
+REPLICA_POLICIES = ("round_robin", "least_connections")
+
+# Errors of a replica connection attempt that send the read to the primary instead
+CONNECT_ERRORS = (OSError, asyncio.TimeoutError, DBAPIError)
+
+# Limits the statements of the current transaction, reset when it ends
+SET_STATEMENT_TIMEOUT = text("SELECT set_config('statement_timeout', :timeout, true)")
+
+# SQLSTATE of a statement cancelled by statement_timeout or a cancel request
+QUERY_CANCELED = "57014"
+
+# Monotonic time by which the statements of the current task must finish
+STATEMENT_DEADLINE: ContextVar[Optional[float]] = ContextVar(
+    "statement_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a connection is requested after the deadline passed.
+    """
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Bounds the statements run by the current task, and the tasks it starts,
+    to finish within `seconds`.
+
+    Every connection checked out inside the block gets a statement_timeout of
+    the time left, so Postgres cancels the statements still running when the
+    deadline passes.
+
+    Parameters:
+    seconds (Optional[float]): Time allowed, None or 0 for no deadline
+    """
+    token = STATEMENT_DEADLINE.set(monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        STATEMENT_DEADLINE.reset(token)
+
+
+def deadline_exceeded(error: BaseException) -> bool:
+    """
+    Tells whether an error comes from a passed deadline or statement_timeout.
+    """
+    orig = getattr(error, "orig", None) or error
+    return (
+        isinstance(error, DeadlineExceeded)
+        or getattr(orig, "sqlstate", None) == QUERY_CANCELED
+    )
+
+
+async def apply_deadline(conn: AsyncConnection):
+    """
+    Sets the statement_timeout of a connection to the time left before the
+    current deadline, if any.
+
+    Only connections checked out inside deadline() are bounded, so background
+    and maintenance work keeps the server default.
+
+    Parameters:
+    conn (AsyncConnection): The connection, its transaction bounds the setting
+    """
+    expires = STATEMENT_DEADLINE.get()
+    if expires is None:
+        return
+    remaining = expires - monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline passed before the query started")
+    await conn.execute(
+        SET_STATEMENT_TIMEOUT, {"timeout": f"{max(1, int(remaining * 1000))}ms"}
+    )
+
+
+class Replica:
+    """
+    A read replica engine with its health as seen by the last check.
+    """
+
+    def __init__(self, name: str, engine: AsyncEngine) -> None:
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        # Reads currently holding a connection of this replica
+        self.active = 0
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Returns the replica health for status reporting.
+        """
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "active": self.active,
+            "error": self.error,
+        }
+
+
 class Database:
     """
     Database class to maintain database connection
@@ -55,38 +190,369 @@ class Database:
 
     def __init__(self) -> None:
         self.engine: Optional[AsyncEngine] = None
+        self.replicas: List[Replica] = []
+        self.replica_policy = "round_robin"
+        self.max_replica_lag = 10.0
+        # Connections the pool hands out at once, None when unbounded
+        self.pool_capacity: Optional[int] = None
+        # Pool checkout wait accounting, see pool_status()
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._wait_seconds_max = 0.0
+        self._checkout_listeners: List[Callable[[float], None]] = []
+        self._round_robin = count()
+        self._primary_until = 0.0
+        self._health_task: Optional[asyncio.Task] = None
 
-    def configure(self, connection_string: str):
+    def configure(
+        self,
+        connection_string: str,
+        replicas: Sequence[str] = (),
+        replica_policy: str = "round_robin",
+        max_replica_lag: float = 10.0,
+        **kwargs,
+    ):
         """
         Configures the database engine with the given connection string.
 
         Parameters:
         connection_string (str): The connection string for the database
+        replicas (Sequence[str]): Connection strings of read replicas, see read()
+        replica_policy (str): "round_robin" or "least_connections"
+        max_replica_lag (float): Seconds of replication lag after which a
+            replica stops serving reads
+        kwargs: Extra options passed through to create_async_engine, for the
+            primary and every replica
         """
-        kwargs = {}
-
+        if replica_policy not in REPLICA_POLICIES:
+            raise ValueError(f"Unknown replica policy {replica_policy}")
         self.engine: AsyncEngine = create_async_engine(connection_string, **kwargs)
-        LOG.debug("Database connection configured")
+        self.replicas = [
+            Replica(
+                make_url(replica).render_as_string(hide_password=True),
+                create_async_engine(replica, **kwargs),
+            )
+            for replica in replicas
+        ]
+        self.replica_policy = replica_policy
+        self.max_replica_lag = max_replica_lag
+        # QueuePool defaults, a negative max_overflow lifts the bound
+        max_overflow = kwargs.get("max_overflow", 10)
+        self.pool_capacity = (
+            kwargs.get("pool_size", 5) + max_overflow if max_overflow >= 0 else None
+        )
+        LOG.debug("Database connection configured with %d replicas", len(self.replicas))
+
+    @require_configured
+    async def warm_up(self, connections: int):
+        """
+        Opens connections up front so the first requests do not pay for them.
+
+        The number is capped at what the pool can hand out at once, pool size
+        plus overflow, as the connections are all held until every one opened.
+
+        Parameters:
+        connections (int): Number of connections to open and return to the pool
+        """
+        if self.pool_capacity is not None and connections > self.pool_capacity:
+            LOG.warning(
+                "Pool warm-up of %d connections capped at the pool capacity %d",
+                connections,
+                self.pool_capacity,
+            )
+            connections = self.pool_capacity
+        if connections <= 0:
+            return
+        conns = [self.engine.connect() for _ in range(connections)]
+        results = await asyncio.gather(
+            *(conn.start() for conn in conns), return_exceptions=True
+        )
+        # Return the connections that did open before reporting any failure
+        await asyncio.gather(
+            *(
+                conn.close()
+                for conn, result in zip(conns, results)
+                if not isinstance(result, BaseException)
+            )
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        LOG.debug("Database pool warmed up with %d connections", connections)
+
+    @require_configured
+    def pool_status(self) -> Dict[str, float]:
+        """
+        Returns live gauges of the connection pool.
+
+        Returns:
+        Dict[str, float]: Pool size, checked out, idle and overflow connections,
+        plus the number of checkouts and the total and maximum seconds spent
+        waiting for them
+        """
+        pool = self.engine.pool
+        return {
+            "size": pool.size() if hasattr(pool, "size") else 0,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else 0,
+            "idle": pool.checkedin() if hasattr(pool, "checkedin") else 0,
+            "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0,
+            "checkouts": self._waits,
+            "wait_seconds_total": self._wait_seconds,
+            "wait_seconds_max": self._wait_seconds_max,
+        }
+
+    def add_checkout_listener(self, listener: Callable[[float], None]):
+        """
+        Registers a callback invoked with the seconds every pool checkout waited.
+
+        Parameters:
+        listener (Callable[[float], None]): The callback
+        """
+        self._checkout_listeners.append(listener)
+
+    def _record_wait(self, waited: float):
+        """
+        Accounts the seconds a checkout waited and notifies the listeners.
+        """
+        self._waits += 1
+        self._wait_seconds += waited
+        self._wait_seconds_max = max(self._wait_seconds_max, waited)
+        for listener in self._checkout_listeners:
+            listener(waited)
+
+    @asynccontextmanager
+    async def _checkout(
+        self, ctx: AsyncContextManager[AsyncConnection]
+    ) -> AsyncIterator[AsyncConnection]:
+        """
+        Enters a connection context while recording how long the checkout took,
+        and applies the current deadline to it.
+        """
+        start = perf_counter()
+        async with ctx as conn:
+            self._record_wait(perf_counter() - start)
+            await apply_deadline(conn)
+            yield conn
 
     @require_configured
-    def begin(self, *args, **kwargs) -> AsyncConnection:
+    def begin(self, *args, **kwargs) -> AsyncContextManager[AsyncConnection]:
         """
         Convenience method for AsyncEngine.begin()
 
         Returns:
-        AsyncConnection: The asynchronous connection object
+        AsyncContextManager[AsyncConnection]: The asynchronous connection object
         """
-        return self.engine.begin(*args, **kwargs)
+        return self._checkout(self.engine.begin(*args, **kwargs))
 
     @require_configured
-    def connect(self, *args, **kwargs) -> AsyncConnection:
+    def connect(self, *args, **kwargs) -> AsyncContextManager[AsyncConnection]:
         """
         Convenience method for AsyncEngine.connect()
 
         Returns:
-        AsyncConnection: The asynchronous connection object
+        AsyncContextManager[AsyncConnection]: The asynchronous connection object
+        """
+        return self._checkout(self.engine.connect(*args, **kwargs))
+
+    def _pick_replica(self) -> Optional[Replica]:
+        """
+        Returns the replica the next read goes to, None to use the primary.
+        """
+        if monotonic() < self._primary_until:
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.replica_policy == "least_connections":
+            return min(healthy, key=lambda replica: replica.active)
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    @require_configured
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[AsyncConnection]:
+        """
+        Checks out a connection for read-only queries.
+
+        Reads are spread over the healthy replicas, and go to the primary when
+        there are none or right after prefer_primary() was called. A replica
+        that cannot be connected to is marked unhealthy until its next
+        successful health check, and the read is retried on the primary.
+
+        Returns:
+        AsyncContextManager[AsyncConnection]: The asynchronous connection object
+        """
+        replica = self._pick_replica()
+        conn = None
+        if replica is not None:
+            start = perf_counter()
+            try:
+                conn = await replica.engine.connect().start()
+            except CONNECT_ERRORS as e:
+                LOG.warning(
+                    "Replica %s unavailable, reading from the primary: %s",
+                    replica.name,
+                    e,
+                )
+                replica.healthy = False
+                replica.error = str(e)
+            else:
+                self._record_wait(perf_counter() - start)
+        if conn is not None:
+            try:
+                await apply_deadline(conn)
+            except BaseException:
+                await conn.close()
+                raise
+        if conn is None:
+            async with self.connect() as conn:
+                yield conn
+            return
+        replica.active += 1
+        try:
+            yield conn
+        finally:
+            replica.active -= 1
+            await conn.close()
+
+    def prefer_primary(self, seconds: float):
+        """
+        Sends all reads to the primary for a while, e.g. after data changed,
+        so replicas still replaying the change are not read.
+
+        Parameters:
+        seconds (float): How long reads avoid the replicas
+        """
+        self._primary_until = max(self._primary_until, monotonic() + seconds)
+
+    async def check_replica(self, replica: Replica, timeout: float = 5.0):
+        """
+        Measures the replication lag of a replica and updates its health.
+
+        Parameters:
+        replica (Replica): The replica to check
+        timeout (float): Seconds after which the replica counts as dead
+        """
+
+        async def measure() -> float:
+            async with replica.engine.connect() as conn:
+                return float((await conn.execute(REPLICATION_LAG_QUERY)).scalar())
+
+        try:
+            replica.lag = await asyncio.wait_for(measure(), timeout)
+        except CONNECT_ERRORS as e:
+            replica.lag = None
+            replica.error = str(e) or type(e).__name__
+        else:
+            replica.error = (
+                None
+                if replica.lag <= self.max_replica_lag
+                else f"Replication lag {replica.lag:.1f}s over {self.max_replica_lag}s"
+            )
+        healthy = replica.error is None
+        if healthy != replica.healthy:
+            if healthy:
+                LOG.info("Replica %s is back in rotation", replica.name)
+            else:
+                LOG.warning("Replica %s ejected: %s", replica.name, replica.error)
+        replica.healthy = healthy
+
+    async def _health_loop(self, interval: float):
+        """
+        Checks every replica each `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.gather(
+                *(self.check_replica(replica, interval) for replica in self.replicas),
+                return_exceptions=True,
+            )
+
+    async def start_health_checks(self, interval: float):
+        """
+        Checks the replicas once, then keeps checking them in the background.
+
+        Parameters:
+        interval (float): Seconds between checks, also the timeout of a check
+        """
+        if not self.replicas or self._health_task is not None:
+            return
+        await asyncio.gather(
+            *(self.check_replica(replica, interval) for replica in self.replicas)
+        )
+        self._health_task = asyncio.create_task(self._health_loop(interval))
+
+    def replica_status(self) -> List[Dict[str, Any]]:
+        """
+        Returns the health of every replica.
+        """
+        return [replica.status() for replica in self.replicas]
+
+    async def dispose(self):
+        """
+        Stops the replica health checks and closes every pooled connection.
+        """
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    @require_configured
+    async def listen(
+        self,
+        channel: str,
+        callback: Callable[[str], None],
+        on_close: Optional[Callable[[], None]] = None,
+    ) -> Callable[[], Awaitable[None]]:
+        """
+        Subscribes to a PostgreSQL NOTIFY channel on a dedicated connection.
+
+        The connection is held for as long as the subscription is active.
+        Notifications sent while it is down are lost, so callers relying on
+        them should subscribe again from `on_close`.
+
+        Parameters:
+        channel (str): The channel name to LISTEN on
+        callback (Callable[[str], None]): Called with the payload of every notification
+        on_close (Optional[Callable[[], None]]): Called when the connection is
+            lost, not when unsubscribing
+
+        Returns:
+        Callable[[], Awaitable[None]]: Coroutine function that unsubscribes and
+        releases the connection
         """
-        return self.engine.connect(*args, **kwargs)
+        conn = await self.engine.connect()
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+
+        def _on_notify(_connection, _pid, _channel, payload):
+            callback(payload)
+
+        def _on_terminate(_connection):
+            LOG.warning("Lost the connection listening on channel %s", channel)
+            on_close()
+
+        await driver.add_listener(channel, _on_notify)
+        if on_close is not None:
+            driver.add_termination_listener(_on_terminate)
+        LOG.debug("Listening on channel %s", channel)
+
+        async def unlisten():
+            if on_close is not None:
+                driver.remove_termination_listener(_on_terminate)
+            try:
+                if not driver.is_closed():
+                    await driver.remove_listener(channel, _on_notify)
+            finally:
+                await conn.close()
+
+        return unlisten
 
     def __call__(self) -> "Database":
         """
@@ -0,0 +1,272 @@
+"""Statement timing, slow query log and sampled EXPLAIN capture"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+from collections import deque
+from datetime import datetime, timezone
+from hashlib import sha1
+from logging import getLogger
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+LOG = getLogger(__name__)
+
+# Longest bound parameters representation kept per slow statement
+MAX_PARAMS_LENGTH = 500
+
+# Prefix of the statements capturing a plan, not timed themselves
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) "
+
+# Only statements that can be run again without side effects are explained
+READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|COPY|CALL)\b", re.IGNORECASE)
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Returns a short stable name of a statement text, for bounded metric labels.
+    """
+    return sha1(statement.encode()).hexdigest()[:12]
+
+
+def explainable(statement: str) -> bool:
+    """
+    Tells whether a statement only reads, so EXPLAIN ANALYZE may run it again.
+    """
+    return bool(READ_ONLY.match(statement)) and not WRITES.search(statement)
+
+
+class QueryProfiler:
+    """
+    Times every statement of the engines it is attached to.
+
+    Statements slower than the threshold are logged with their bound
+    parameters and kept in memory. A sampled share of the read-only ones is
+    run again under EXPLAIN (ANALYZE, BUFFERS) on a separate connection, off
+    the request path, and its plan is kept and written to a rotating file.
+    """
+
+    def __init__(self) -> None:
+        self.threshold = 0.0
+        self.explain_sample_rate = 0.0
+        self.explain_timeout = 30.0
+        self.slow: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self.plans: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self.statements = 0
+        self.slow_statements = 0
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._explaining: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._file: Optional[RotatingFileHandler] = None
+
+    def configure(
+        self,
+        threshold: float,
+        explain_sample_rate: float = 0.0,
+        explain_path: str = "",
+        explain_max_bytes: int = 10_000_000,
+        explain_backups: int = 3,
+        explain_timeout: float = 30.0,
+        keep: int = 100,
+    ):
+        """
+        Sets the slow statement threshold and the EXPLAIN sampling.
+
+        Parameters:
+        threshold (float): Seconds above which a statement is slow, 0 disables the log
+        explain_sample_rate (float): Share of the slow statements explained
+        explain_path (str): File the plans are appended to, empty to keep them
+            in memory only
+        explain_max_bytes (int): Size at which the plan file is rotated
+        explain_backups (int): Rotated plan files kept
+        explain_timeout (float): Seconds an EXPLAIN ANALYZE may run
+        keep (int): Slow statements kept in memory, plans keep a fifth of it
+        """
+        self.threshold = threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_timeout = explain_timeout
+        self.slow = deque(maxlen=keep)
+        self.plans = deque(maxlen=max(1, keep // 5))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if explain_path:
+            self._file = RotatingFileHandler(
+                explain_path,
+                maxBytes=explain_max_bytes,
+                backupCount=explain_backups,
+                encoding="utf-8",
+                delay=True,
+            )
+            self._file.setFormatter(logging.Formatter("%(message)s"))
+
+    def add_listener(self, listener: Callable[[str, float], None]):
+        """
+        Registers a callback invoked with the fingerprint and duration of every statement.
+
+        Parameters:
+        listener (Callable[[str, float], None]): The callback
+        """
+        self._listeners.append(listener)
+
+    def attach(self, engine: AsyncEngine, name: str = "primary"):
+        """
+        Starts timing the statements of an engine.
+
+        Parameters:
+        engine (AsyncEngine): The engine to instrument
+        name (str): Engine name reported with its slow statements
+        """
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _before(conn, _cursor, _statement, _parameters, _context, _executemany):
+            conn.info.setdefault("query_start", []).append(perf_counter())
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def _after(conn, _cursor, statement, parameters, _context, _executemany):
+            elapsed = perf_counter() - conn.info["query_start"].pop()
+            if not statement.startswith(EXPLAIN_PREFIX):
+                self.record(engine, name, statement, parameters, elapsed)
+
+        # Failed and cancelled statements never reach after_cursor_execute, their
+        # start is popped here so it is not left on the pooled connection
+        @event.listens_for(engine.sync_engine, "handle_error")
+        def _error(context):
+            conn = context.connection
+            starts = conn.info.get("query_start") if conn is not None else None
+            if not starts or context.statement is None:
+                return
+            elapsed = perf_counter() - starts.pop()
+            if not context.statement.startswith(EXPLAIN_PREFIX):
+                self.record(
+                    engine, name, context.statement, context.parameters, elapsed
+                )
+
+    def record(
+        self,
+        engine: AsyncEngine,
+        name: str,
+        statement: str,
+        parameters: Any,
+        elapsed: float,
+    ):
+        """
+        Accounts for one executed statement, logging and explaining it when slow.
+        """
+        self.statements += 1
+        key = fingerprint(statement)
+        for listener in self._listeners:
+            listener(key, elapsed)
+        if not self.threshold or elapsed < self.threshold:
+            return
+        self.slow_statements += 1
+        params = repr(parameters)
+        if len(params) > MAX_PARAMS_LENGTH:
+            params = params[:MAX_PARAMS_LENGTH] + "..."
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "engine": name,
+            "fingerprint": key,
+            "seconds": round(elapsed, 6),
+            "statement": statement,
+            "parameters": params,
+        }
+        self.slow.append(entry)
+        LOG.warning(
+            "Slow statement %s on %s took %.3fs: %s parameters=%s",
+            key,
+            name,
+            elapsed,
+            " ".join(statement.split()),
+            params,
+        )
+        if (
+            key not in self._explaining
+            and random.random() < self.explain_sample_rate
+            and explainable(statement)
+        ):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # Synchronous use of the engine, e.g. from a script
+                return
+            # At most one EXPLAIN per statement text at a time
+            self._explaining.add(key)
+            task = loop.create_task(self._explain(engine, entry, statement, parameters))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _explain(
+        self,
+        engine: AsyncEngine,
+        entry: Dict[str, Any],
+        statement: str,
+        parameters: Any,
+    ):
+        """
+        Runs a slow statement again under EXPLAIN (ANALYZE, BUFFERS) and stores its plan.
+        """
+        try:
+            async with engine.connect() as conn:
+                await conn.exec_driver_sql(
+                    f"SET LOCAL statement_timeout = {int(self.explain_timeout * 1000)}"
+                )
+                result = await conn.exec_driver_sql(
+                    EXPLAIN_PREFIX + statement,
+                    tuple(parameters) if isinstance(parameters, list) else parameters,
+                )
+                plan = "\n".join(row[0] for row in result.fetchall())
+                await conn.rollback()
+        except Exception as e:  # pylint: disable=broad-except
+            LOG.warning(
+                "EXPLAIN of slow statement %s failed: %s", entry["fingerprint"], e
+            )
+            return
+        finally:
+            self._explaining.discard(entry["fingerprint"])
+        captured = {**entry, "plan": plan}
+        self.plans.append(captured)
+        if self._file is not None:
+            await asyncio.to_thread(self._write, captured)
+
+    def _write(self, captured: Dict[str, Any]):
+        """
+        Appends a captured plan to the rotating file, as one JSON line.
+        """
+        self._file.handle(logging.makeLogRecord({"msg": json.dumps(captured)}))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the statement counters and the slow statements and plans kept.
+        """
+        return {
+            "threshold_seconds": self.threshold,
+            "statements": self.statements,
+            "slow_statements": self.slow_statements,
+            "slow": list(self.slow),
+            "plans": list(self.plans),
+        }
+
+    def close(self):
+        """
+        Closes the plan file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __call__(self) -> "QueryProfiler":
+        """
+        Make the QueryProfiler object callable, as per FastAPI dependency injection mechanism.
+
+        Returns:
+        QueryProfiler: The profiler object itself
+        """
+        return self
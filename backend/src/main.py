@@ -1,12 +1,11 @@
 """Rate calculator API"""
 
+import os
 from argparse import ArgumentParser
 from uvicorn import run
 
 from core import __version__
-from core.app import RateCalculator
 from lib.log import get_config
-from lib.sqla.db import create_psql_connection_string
 
 import config as cfg
 
@@ -36,6 +35,50 @@ if __name__ == "__main__":
         default=cfg.PORT,
     )
 
+    # Add production server options
+    parser.add_argument(
+        "--workers",
+        help="number of worker processes, each with its own database pool",
+        type=int,
+        default=cfg.WORKERS,
+    )
+    parser.add_argument(
+        "--loop",
+        help="event loop implementation, uvloop requires the uvloop package",
+        choices=["auto", "asyncio", "uvloop"],
+        default=cfg.LOOP,
+    )
+    parser.add_argument(
+        "--http",
+        help="HTTP protocol implementation, httptools requires the httptools package",
+        choices=["auto", "h11", "httptools"],
+        default=cfg.HTTP,
+    )
+    parser.add_argument(
+        "--backlog",
+        help="maximum number of connections waiting to be accepted",
+        type=int,
+        default=cfg.BACKLOG,
+    )
+    parser.add_argument(
+        "--timeout-keep-alive",
+        help="seconds an idle keep-alive connection is held open",
+        type=int,
+        default=cfg.TIMEOUT_KEEP_ALIVE,
+    )
+    parser.add_argument(
+        "--limit-concurrency",
+        help="maximum concurrent connections per worker before responding 503, 0 for no limit",
+        type=int,
+        default=cfg.LIMIT_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--timeout-graceful-shutdown",
+        help="seconds to wait for in-flight requests on shutdown",
+        type=int,
+        default=cfg.TIMEOUT_GRACEFUL_SHUTDOWN,
+    )
+
     # Add version argument to display the version information
     parser.add_argument(
         "-v",
@@ -48,25 +91,34 @@ if __name__ == "__main__":
     # Parse command line arguments
     flags = parser.parse_args()
 
-    # Create RateCalculator instance with the parsed flags and database connection string
-    rc = RateCalculator(
-        flags,
-        create_psql_connection_string(
-            cfg.DB_USERNAME,
-            cfg.DB_PASSWORD,
-            cfg.DB_HOSTNAME,
-            cfg.DB_DATABASE,
-            cfg.DB_PORT,
-        ),
-    )
+    if flags.debug:
+        # The application factory reads the configuration, which worker
+        # processes load again from the environment
+        os.environ["DEBUG"] = "True"
+        cfg.DEBUG = True
 
     # Configure logging based on the debug flag
-    log_config = get_config(log_level="DEBUG" if flags.debug else cfg.LOG_LEVEL)
+    log_config = get_config(
+        log_level="DEBUG" if flags.debug else cfg.LOG_LEVEL,
+        queued=cfg.LOG_QUEUED,
+        json_lines=cfg.LOG_JSON,
+        access_sample_rate=cfg.LOG_ACCESS_SAMPLE_RATE,
+        queue_size=cfg.LOG_QUEUE_SIZE,
+    )
 
-    # Run the FastAPI application using Uvicorn
+    # Run the FastAPI application using Uvicorn. Every worker calls the factory
+    # after it started, so no database connection is shared across processes.
     run(
-        rc.app,
+        "core.app:create_app",
+        factory=True,
         host=flags.host,
         port=flags.port,
+        workers=flags.workers,
+        loop=flags.loop,
+        http=flags.http,
+        backlog=flags.backlog,
+        timeout_keep_alive=flags.timeout_keep_alive,
+        limit_concurrency=flags.limit_concurrency or None,
+        timeout_graceful_shutdown=flags.timeout_graceful_shutdown,
         log_config=log_config,
     )
@@ -0,0 +1,458 @@
+"""Rate calculator maintenance commands"""
+
+import asyncio
+import csv
+import sys
+from argparse import ArgumentParser, FileType, Namespace
+from datetime import datetime
+from logging import getLogger
+from logging.config import dictConfig
+from pathlib import Path
+
+from bench.dataset import DatasetSpec
+from core import __version__
+from core.aggregates import refresh_daily_lane_stats
+from core.db import database
+from core.hierarchy import create_hierarchy_trigger
+from core.indexes import EXPECTED_INDEXES, OPTIONAL_INDEXES, create_indexes
+from core.ingest import MODES, ingest_prices, read_price_csv
+from core.partitions import detach_partitions, ensure_partitions, partition_prices
+from core.version import bump_data_version
+from lib.log import get_config
+from lib.sqla.db import create_psql_connection_string
+
+import config as cfg
+
+LOG = getLogger("rate_calculator")
+
+
+def iso_date(value: str):
+    """
+    Argument type parsing a YYYY-MM-DD date.
+    """
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+async def refresh_aggregates(flags: Namespace):
+    """
+    Folds new prices rows into the daily_lane_stats table.
+    """
+    await refresh_daily_lane_stats(
+        database, flags.since, flags.until, cfg.AGGREGATE_LOOKBACK_DAYS
+    )
+    if cfg.RATES_FROM_AGGREGATES:
+        await bump_version(flags)
+
+
+async def bump_version(_flags: Namespace):
+    """
+    Marks the dataset as changed so cached rates are recomputed.
+    """
+    async with database.begin() as conn:
+        await bump_data_version(conn, cfg.DATA_VERSION_CHANNEL)
+
+
+async def ingest(flags: Namespace):
+    """
+    Loads prices from CSV into the prices table.
+    """
+    with flags.file:
+        await ingest_prices(
+            database,
+            read_price_csv(flags.file),
+            flags.mode,
+            flags.batch_rows,
+            cfg.PRICES_PARTITION_INTERVAL,
+            cfg.DATA_VERSION_CHANNEL,
+        )
+
+
+async def migrate_indexes(flags: Namespace):
+    """
+    Creates the indexes the rates queries expect, plus the optional ones requested.
+    """
+    specs = EXPECTED_INDEXES + (OPTIONAL_INDEXES if flags.brin else ())
+    created = await create_indexes(database, specs)
+    LOG.info("Created %d of %d indexes, the others exist", len(created), len(specs))
+
+
+async def hierarchy_trigger(_flags: Namespace):
+    """
+    Installs the triggers notifying the applications of port hierarchy changes.
+    """
+    if not cfg.HIERARCHY_NOTIFY_CHANNEL:
+        LOG.error("HIERARCHY_NOTIFY_CHANNEL is empty, nothing listens for changes")
+        sys.exit(1)
+    await create_hierarchy_trigger(database, cfg.HIERARCHY_NOTIFY_CHANNEL)
+
+
+async def partition_table(flags: Namespace):
+    """
+    Converts prices into a table range partitioned by day.
+    """
+    await partition_prices(database, flags.interval, flags.ahead)
+    await bump_version(flags)
+
+
+async def create_partitions(flags: Namespace):
+    """
+    Creates the prices partitions of the coming months or quarters.
+    """
+    await ensure_partitions(database, flags.interval, flags.ahead)
+
+
+async def detach_old_partitions(flags: Namespace):
+    """
+    Detaches the prices partitions that ended before a day.
+    """
+    detached = await detach_partitions(
+        database, flags.before, flags.archive_schema, flags.drop
+    )
+    if detached:
+        await bump_version(flags)
+
+
+async def export(flags: Namespace):
+    """
+    Writes prices and the port hierarchy to a snapshot directory.
+    """
+    # Imported here so the other commands do not need numpy
+    from analytics.snapshot import export_snapshot  # pylint: disable=import-outside-toplevel
+
+    await export_snapshot(database, flags.path)
+
+
+async def snapshot_rates(flags: Namespace):
+    """
+    Computes the daily average prices of the lanes of a CSV from a snapshot.
+    """
+    # pylint: disable=import-outside-toplevel
+    from analytics.engine import lane_average_prices
+    from analytics.snapshot import load_snapshot
+
+    with flags.lanes:
+        lanes = [
+            (row["origin"], row["destination"]) for row in csv.DictReader(flags.lanes)
+        ]
+    result = lane_average_prices(
+        load_snapshot(flags.snapshot), lanes, flags.date_from, flags.date_to
+    )
+    writer = csv.writer(sys.stdout)
+    writer.writerow(("origin", "destination", "day", "average_price"))
+    for lane, (origin, destination) in enumerate(lanes):
+        for day, average_price in result.rows(lane):
+            writer.writerow((origin, destination, day.isoformat(), average_price))
+
+
+def dataset_spec(flags: Namespace) -> DatasetSpec:
+    """
+    Builds the benchmark dataset shape from the command line flags.
+    """
+    return DatasetSpec(
+        prices=flags.prices,
+        depth=flags.depth,
+        fanout=flags.fanout,
+        ports_per_region=flags.ports_per_region,
+        days=flags.days,
+        seed=flags.seed,
+    )
+
+
+async def bench_seed(flags: Namespace):
+    """
+    Loads a synthetic benchmark dataset into the database.
+    """
+    from bench.seed import seed_dataset  # pylint: disable=import-outside-toplevel
+
+    await seed_dataset(database, dataset_spec(flags), reset=flags.reset)
+    await bump_version(flags)
+
+
+async def bench_run(flags: Namespace):
+    """
+    Drives /rates of a running service and compares the run against the baseline.
+    """
+    # Imported here so the other commands do not need httpx
+    # pylint: disable=import-outside-toplevel
+    from bench.loadgen import (
+        compare,
+        format_report,
+        load_baseline,
+        run_benchmark,
+        save_baseline,
+    )
+
+    baseline = load_baseline(flags.baseline)
+    if baseline is None and not flags.update_baseline:
+        # Checked before the run, a missing baseline would let any regression pass
+        LOG.error(
+            "No baseline at %s, record one with --update-baseline", flags.baseline
+        )
+        sys.exit(1)
+    results = await run_benchmark(
+        flags.url,
+        dataset_spec(flags),
+        flags.requests,
+        flags.concurrency,
+        flags.warmup,
+    )
+    print(format_report(results, baseline))
+    if flags.update_baseline:
+        save_baseline(flags.baseline, results)
+        return
+    regressions = compare(results, baseline, flags.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+def add_dataset_arguments(parser: ArgumentParser):
+    """
+    Adds the flags describing the benchmark dataset shape.
+    """
+    parser.add_argument(
+        "--prices", type=int, default=100_000, help="number of price rows"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=3, help="levels of nested regions"
+    )
+    parser.add_argument(
+        "--fanout", type=int, default=3, help="child regions of every region"
+    )
+    parser.add_argument(
+        "--ports-per-region", type=int, default=5, help="ports of every leaf region"
+    )
+    parser.add_argument("--days", type=int, default=365, help="days of prices")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+
+
+async def run_command(flags: Namespace):
+    """
+    Configures the database, runs the selected command and releases the connections.
+    """
+    database.configure(
+        create_psql_connection_string(
+            cfg.DB_USERNAME,
+            cfg.DB_PASSWORD,
+            cfg.DB_HOSTNAME,
+            cfg.DB_DATABASE,
+            cfg.DB_PORT,
+        )
+    )
+    try:
+        await flags.command(flags)
+    finally:
+        await database.dispose()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        "Rate Calculator Manage", description="Rate Calculator maintenance commands"
+    )
+
+    # Add debug option to enable debug logging
+    parser.add_argument(
+        "-d",
+        "--debug",
+        help="enable debug logging",
+        action="store_true",
+    )
+
+    # Add version argument to display the version information
+    parser.add_argument(
+        "-v",
+        "--version",
+        action="version",
+        version=f"Rate Calculator v{__version__}",
+        help="show version information and exit",
+    )
+
+    commands = parser.add_subparsers(title="commands", required=True)
+
+    # Incrementally refresh the daily_lane_stats pre-aggregation
+    refresh = commands.add_parser(
+        "refresh-aggregates", help="fold new prices into daily_lane_stats"
+    )
+    refresh.add_argument(
+        "--since",
+        type=iso_date,
+        help="first day to recompute, defaults to the lookback window",
+    )
+    refresh.add_argument(
+        "--until", type=iso_date, help="last day to recompute, defaults to all"
+    )
+    refresh.set_defaults(command=refresh_aggregates)
+
+    # Announce that prices were changed by an external loader
+    bump = commands.add_parser(
+        "bump-version", help="invalidate cached rates after prices changed"
+    )
+    bump.set_defaults(command=bump_version)
+
+    # Bulk load prices through COPY
+    load = commands.add_parser("ingest-prices", help="load prices from a CSV file")
+    load.add_argument(
+        "file",
+        type=FileType("r", encoding="utf-8"),
+        help="CSV with orig_code, dest_code, day and price columns, - for stdin",
+    )
+    load.add_argument(
+        "--mode",
+        choices=MODES,
+        default="append",
+        help="add the prices, or replace the prices of their lane days",
+    )
+    load.add_argument(
+        "--batch-rows",
+        type=int,
+        default=cfg.INGEST_BATCH_ROWS,
+        help="prices merged and committed per transaction",
+    )
+    load.set_defaults(command=ingest)
+
+    # Create the indexes matching the rates access pattern
+    indexes = commands.add_parser(
+        "create-indexes", help="create the indexes the rates queries expect"
+    )
+    indexes.add_argument(
+        "--brin",
+        action="store_true",
+        help="also create a BRIN index on prices.day for day range scans",
+    )
+    indexes.set_defaults(command=migrate_indexes)
+
+    # Notify the applications when ports or regions change
+    trigger = commands.add_parser(
+        "create-hierarchy-trigger",
+        help="reload the port hierarchy of running applications on changes",
+    )
+    trigger.set_defaults(command=hierarchy_trigger)
+
+    # Convert prices into a partitioned table
+    partition = commands.add_parser(
+        "partition-prices",
+        help="convert prices into a table partitioned by day, writes to prices "
+        "wait on an exclusive lock until the copy commits",
+    )
+    # Keep the partitions ahead of incoming prices, run from a scheduler
+    ahead = commands.add_parser(
+        "create-partitions", help="create the prices partitions of the coming periods"
+    )
+    for subparser in (partition, ahead):
+        subparser.add_argument(
+            "--interval",
+            choices=("month", "quarter"),
+            default=cfg.PRICES_PARTITION_INTERVAL,
+            help="partition size",
+        )
+        subparser.add_argument(
+            "--ahead",
+            type=int,
+            default=cfg.PRICES_PARTITIONS_AHEAD,
+            help="future partitions to create",
+        )
+    partition.set_defaults(command=partition_table)
+    ahead.set_defaults(command=create_partitions)
+
+    # Detach or archive partitions past the retention
+    detach = commands.add_parser(
+        "detach-partitions", help="detach prices partitions that ended before a day"
+    )
+    detach.add_argument(
+        "--before",
+        type=iso_date,
+        required=True,
+        help="detach partitions whose days all precede this day",
+    )
+    detach.add_argument(
+        "--archive-schema", help="schema the detached partitions are moved to"
+    )
+    detach.add_argument(
+        "--drop", action="store_true", help="drop the detached partitions"
+    )
+    detach.set_defaults(command=detach_old_partitions)
+
+    # Export a snapshot for offline analytics
+    snapshot = commands.add_parser(
+        "export-snapshot", help="write prices and the port hierarchy to a snapshot"
+    )
+    snapshot.add_argument("path", type=Path, help="snapshot directory")
+    snapshot.set_defaults(command=export)
+
+    # Compute lanes from a snapshot without touching the database
+    offline = commands.add_parser(
+        "snapshot-rates", help="compute daily average prices of lanes from a snapshot"
+    )
+    offline.add_argument("snapshot", type=Path, help="snapshot directory")
+    offline.add_argument(
+        "lanes",
+        type=FileType("r", encoding="utf-8"),
+        help="CSV with origin and destination columns, - for stdin",
+    )
+    offline.add_argument("--date-from", type=iso_date, required=True, help="first day")
+    offline.add_argument("--date-to", type=iso_date, required=True, help="last day")
+    offline.set_defaults(command=snapshot_rates)
+
+    # Load a synthetic dataset for benchmarking
+    seed = commands.add_parser(
+        "bench-seed", help="load a synthetic benchmark dataset"
+    )
+    add_dataset_arguments(seed)
+    seed.add_argument(
+        "--reset",
+        action="store_true",
+        help="replace existing ports, regions and prices",
+    )
+    seed.set_defaults(command=bench_seed)
+
+    # Benchmark /rates of a running service against the seeded dataset
+    bench = commands.add_parser(
+        "bench-run", help="benchmark /rates and compare against the baseline"
+    )
+    add_dataset_arguments(bench)
+    bench.add_argument(
+        "--url", default="http://127.0.0.1:8000", help="URL of the running service"
+    )
+    bench.add_argument(
+        "--requests", type=int, default=1000, help="requests per scenario"
+    )
+    bench.add_argument(
+        "--concurrency", type=int, default=32, help="concurrent requests"
+    )
+    bench.add_argument(
+        "--warmup", type=int, default=100, help="unmeasured requests per scenario"
+    )
+    bench.add_argument(
+        "--baseline",
+        default="bench-baseline.json",
+        help="baseline file to compare against",
+    )
+    bench.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed relative change against the baseline",
+    )
+    bench.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store this run as the new baseline",
+    )
+    bench.set_defaults(command=bench_run)
+
+    # Parse command line arguments
+    flags = parser.parse_args()
+
+    # Configure logging based on the debug flag
+    dictConfig(
+        get_config(
+            log_level="DEBUG" if flags.debug else cfg.LOG_LEVEL,
+            queued=cfg.LOG_QUEUED,
+            json_lines=cfg.LOG_JSON,
+            access_sample_rate=cfg.LOG_ACCESS_SAMPLE_RATE,
+            queue_size=cfg.LOG_QUEUE_SIZE,
+        )
+    )
+
+    asyncio.run(run_command(flags))
@@ -0,0 +1,138 @@
+"""Unit testcases for the admission control"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from core.admission import AdmissionControl, AdmissionMiddleware, Rejected
+
+
+def make_control(**kwargs) -> AdmissionControl:
+    """
+    Create an AdmissionControl with small limits.
+    """
+    control = AdmissionControl()
+    control.configure(**{"max_concurrent": 1, "queue_timeout": 0.05, **kwargs})
+    return control
+
+
+@pytest.mark.asyncio
+async def test_client_limit():
+    """
+    Test case to ensure a client over its cap is rejected with 429 while others are queued.
+    """
+    control = make_control(max_per_client=1, max_queue=1)
+    async with control.admit("a"):
+        with pytest.raises(Rejected) as rejected:
+            async with control.admit("a"):
+                pass
+        assert rejected.value.status_code == 429
+        with pytest.raises(Rejected) as rejected:
+            async with control.admit("b"):
+                pass
+        assert rejected.value.status_code == 503
+    assert control.rejected == {"client_limit": 1, "queue_full": 0, "queue_timeout": 1}
+    assert (control.active, control.queued) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_queue_full():
+    """
+    Test case to ensure requests beyond the queue are rejected at once with 503.
+    """
+    control = make_control(queue_timeout=1.0)
+    async with control.admit("a"):
+        with pytest.raises(Rejected) as rejected:
+            async with control.admit("b"):
+                pass
+    assert rejected.value.status_code == 503
+    assert control.rejected["queue_full"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queued_request_gets_released_slot():
+    """
+    Test case to ensure a queued request runs once the slot is released.
+    """
+    control = make_control(max_queue=1, queue_timeout=1.0)
+    order = []
+
+    async def run(client, hold):
+        async with control.admit(client):
+            order.append(client)
+            await asyncio.sleep(hold)
+
+    await asyncio.gather(run("a", 0.02), run("b", 0))
+    assert order == ["a", "b"]
+    assert not control.stats()["queued"]
+
+
+@pytest.mark.asyncio
+async def test_rejection_response():
+    """
+    Test case to ensure rejections are error responses with a Retry-After header.
+    """
+    control = make_control(retry_after=3)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    middleware = AdmissionMiddleware(None, control)
+    scope = {"type": "http", "path": "/rates", "headers": [], "client": ("1.2.3.4", 1)}
+    async with control.admit("other"):
+        await middleware(scope, receive, send)
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"3") in sent[0]["headers"]
+    assert b'"message":"Server busy"' in sent[1]["body"]
+
+
+def test_other_paths_pass_through():
+    """
+    Test case to ensure paths outside the admission controlled prefixes are not capped.
+    """
+    control = make_control()
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, control=control)
+    with TestClient(app) as client:
+        assert client.get("/health").json() == {"ok": True}
+    assert control.active == 0 and not any(control.rejected.values())
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_request():
+    """
+    Test case to ensure a request is cancelled when its client disconnects.
+    """
+    cancelled = asyncio.Event()
+
+    async def slow_app(_scope, receive, _send):
+        await receive()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    messages = [
+        {"type": "http.request", "body": b"", "more_body": False},
+        {"type": "http.disconnect"},
+    ]
+
+    async def receive():
+        await asyncio.sleep(0.01)
+        return messages.pop(0)
+
+    middleware = AdmissionMiddleware(slow_app, AdmissionControl())
+    scope = {"type": "http", "path": "/rates", "headers": [], "client": ("1.2.3.4", 1)}
+    await asyncio.wait_for(middleware(scope, receive, None), 1)
+    assert cancelled.is_set()
@@ -0,0 +1,92 @@
+"""Unit testcases for the daily_lane_stats maintenance"""
+
+from datetime import date
+
+import pytest
+from core.aggregates import (
+    ADD_STATS_COLUMNS,
+    CREATE_TABLE,
+    DELETE_DAYS,
+    HAS_STATS_COLUMNS,
+    INSERT_DAYS,
+    aggregate_window,
+    refresh_daily_lane_stats,
+)
+from .test_base import StandInConnection, StandInDatabase
+
+NEWEST_DAY = date(2016, 1, 31)
+
+
+def catalog(has_stats_columns: bool = True, newest=NEWEST_DAY) -> StandInConnection:
+    """
+    Returns a connection answering the statistics columns and newest day queries.
+    """
+
+    def answer(statement, _params):
+        if statement is HAS_STATS_COLUMNS:
+            return has_stats_columns
+        if "MAX(day)" in str(statement):
+            return newest
+        return None
+
+    return StandInConnection(answer=answer)
+
+
+@pytest.mark.asyncio
+async def test_window_looks_back_from_newest_day():
+    """
+    Test case to ensure the default window starts lookback_days before the newest aggregated day.
+    """
+    assert await aggregate_window(catalog(), None, None, 7) == (
+        date(2016, 1, 24),
+        date.max,
+    )
+    assert await aggregate_window(catalog(), None, None, 0) == (NEWEST_DAY, date.max)
+    assert await aggregate_window(catalog(newest=None), None, None, 7) == (
+        date.min,
+        date.max,
+    )
+
+
+@pytest.mark.asyncio
+async def test_window_keeps_given_bounds():
+    """
+    Test case to ensure explicit bounds are used as given, without reading the newest day.
+    """
+    conn = catalog()
+    window = await aggregate_window(conn, date(2016, 1, 1), date(2016, 1, 10), 7)
+    assert window == (date(2016, 1, 1), date(2016, 1, 10))
+    assert not conn.statements
+
+
+@pytest.mark.asyncio
+async def test_refresh_replaces_window():
+    """
+    Test case to ensure the window's days are deleted and re-inserted with inclusive bounds.
+    """
+    conn = catalog()
+    conn.rowcount = 12
+    rows = await refresh_daily_lane_stats(StandInDatabase(conn), lookback_days=7)
+    assert rows == 12
+    assert conn.statements[:2] == [CREATE_TABLE, HAS_STATS_COLUMNS]
+    assert conn.statements[-2:] == [DELETE_DAYS, INSERT_DAYS]
+    window = {"since": date(2016, 1, 24), "until": date.max}
+    assert conn.params[-2:] == [window, window]
+    insert = " ".join(str(INSERT_DAYS).split())
+    assert "day between CAST(:since AS date) and CAST(:until AS date)" in insert
+    assert "price IS NOT NULL" in insert
+    assert "GROUP BY orig_code, dest_code, day" in insert
+
+
+@pytest.mark.asyncio
+async def test_refresh_recomputes_all_days_after_adding_columns():
+    """
+    Test case to ensure a table without the statistics columns gets them and is fully recomputed.
+    """
+    conn = catalog(has_stats_columns=False)
+    await refresh_daily_lane_stats(
+        StandInDatabase(conn), until=date(2016, 1, 10), lookback_days=7
+    )
+    assert ADD_STATS_COLUMNS in conn.statements
+    assert not any("MAX(day)" in str(statement) for statement in conn.statements)
+    assert conn.params[-1] == {"since": date.min, "until": date(2016, 1, 10)}
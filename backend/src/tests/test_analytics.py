@@ -0,0 +1,191 @@
+"""Unit testcases for the offline analytics engine"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from analytics import engine
+from analytics.engine import lane_average_prices
+from analytics.snapshot import build_snapshot, load_snapshot, save_snapshot
+from bench.dataset import DatasetSpec, generate_ports, generate_prices, generate_regions
+from core.crud import averages_from_sums
+from core.hierarchy import build_index
+
+SPEC = DatasetSpec(prices=20000, depth=2, fanout=2, ports_per_region=3, days=60)
+
+PORTS = [(code, parent_slug) for code, _, parent_slug in generate_ports(SPEC)]
+REGIONS = [(slug, parent_slug) for slug, _, parent_slug in generate_regions(SPEC)]
+PRICES = list(generate_prices(SPEC))
+
+
+def reference_averages(origin, destination, date_from, date_to, min_count=3):
+    """
+    Per-day averages the way the SQL path computes them: prices of every
+    resolved port pair summed per day, then averaged by averages_from_sums.
+    """
+    index = build_index(PORTS, REGIONS)
+    origins, destinations = set(index.get(origin, ())), set(index.get(destination, ()))
+    sums = {}
+    for orig_code, dest_code, day, price in PRICES:
+        in_lane = orig_code in origins and dest_code in destinations
+        if in_lane and date_from <= day <= date_to:
+            price_sum, price_count = sums.get(day, (Decimal(0), 0))
+            sums[day] = (price_sum + price, price_count + 1)
+    return averages_from_sums([(day, *sums[day]) for day in sorted(sums)], min_count)
+
+
+def assert_same_averages(rows, expected):
+    """
+    Compares engine rows with Decimal reference averages.
+    """
+    assert [day for day, _ in rows] == [day for day, _ in expected]
+    for (_, average), (_, expected_average) in zip(rows, expected):
+        if expected_average is None:
+            assert average is None
+        else:
+            assert average == pytest.approx(float(expected_average), rel=1e-12)
+
+
+def test_lanes_match_sql_semantics():
+    """
+    Test case to ensure every lane, from single ports to nested regions, matches the SQL averages.
+    """
+    snapshot = build_snapshot(PORTS, REGIONS, PRICES)
+    orig_code, dest_code, _, _ = PRICES[0]
+    lanes = [(orig_code, dest_code), ("r0", "r1"), ("r0_1", dest_code), ("r1", "r1_0_1")]
+    date_from, date_to = date(2016, 1, 10), date(2016, 2, 5)
+    result = lane_average_prices(snapshot, lanes, date_from, date_to)
+    for lane, (origin, destination) in enumerate(lanes):
+        assert_same_averages(
+            result.rows(lane),
+            reference_averages(origin, destination, date_from, date_to),
+        )
+
+
+def test_many_port_pairs(monkeypatch):
+    """
+    Test case to ensure lanes over tens of thousands of port pairs are summed block by block exactly.
+    """
+    rng = random.Random(7)
+    ports = [(f"P{i:04d}", "west" if i % 2 else "east") for i in range(300)]
+    regions = [("west", None), ("east", None)]
+    prices = [
+        (
+            rng.choice(ports)[0],
+            rng.choice(ports)[0],
+            date(2016, 1, 1) + timedelta(days=rng.randrange(5)),
+            rng.randrange(100, 5000),
+        )
+        for _ in range(60000)
+    ]
+    snapshot = build_snapshot(ports, regions, prices)
+    lanes = [("west", "east"), ("east", "east"), ("west", "west")]
+    lanes += [(orig_code, dest_code) for orig_code, dest_code, _, _ in prices[:2000]]
+    # A few pair rows per block, so lanes straddle blocks
+    monkeypatch.setattr(engine, "CELL_BUDGET", 64)
+    bincount = np.bincount
+    sizes = []
+
+    def counted_bincount(cells, weights=None, minlength=0):
+        sizes.append(minlength)
+        return bincount(cells, weights=weights, minlength=minlength)
+
+    monkeypatch.setattr(np, "bincount", counted_bincount)
+    date_from, date_to = date(2016, 1, 1), date(2016, 1, 5)
+    result = lane_average_prices(snapshot, lanes, date_from, date_to)
+    monkeypatch.undo()
+    # Pair by day sums never exceed the budget, whatever the number of pairs
+    assert sizes and max(sizes) <= 64
+    assert len(result.sums) == len(lanes)
+    expected = {}
+    for orig_code, dest_code, day, price in prices:
+        for lane, (origin, destination) in enumerate(lanes[:3]):
+            regions_of = (origin, destination)
+            parents = (
+                "west" if int(orig_code[1:]) % 2 else "east",
+                "west" if int(dest_code[1:]) % 2 else "east",
+            )
+            if parents == regions_of:
+                offset = (day - date_from).days
+                price_sum, count = expected.get((lane, offset), (0, 0))
+                expected[(lane, offset)] = (price_sum + price, count + 1)
+    for (lane, offset), (price_sum, count) in expected.items():
+        assert result.sums[lane, offset] == price_sum
+        assert result.counts[lane, offset] == count
+    orig_code, dest_code, day, price = prices[0]
+    lane_prices = [
+        p for o, d, t, p in prices if (o, d, t) == (orig_code, dest_code, day)
+    ]
+    assert result.sums[3, (day - date_from).days] == sum(lane_prices)
+
+
+def test_matches_aggregate_query_semantics():
+    """
+    Test case to ensure results follow crud.AGGREGATE_QUERY: the 3 price minimum applies to
+    a day's prices across all port pairs, averages weigh every price alike, both date bounds
+    are inclusive and days without prices are left out.
+    """
+    ports = [("CNSGH", "china"), ("CNNBO", "china"), ("NOTAE", None)]
+    regions = [("china", None)]
+    prices = [
+        # Outside the range on both sides
+        ("CNSGH", "NOTAE", date(2016, 1, 9), 999),
+        ("CNSGH", "NOTAE", date(2016, 1, 13), 999),
+        # First day: 2 + 1 prices over two pairs reach the minimum together
+        ("CNSGH", "NOTAE", date(2016, 1, 10), 100),
+        ("CNSGH", "NOTAE", date(2016, 1, 10), 200),
+        ("CNNBO", "NOTAE", date(2016, 1, 10), 600),
+        # Second day: 2 prices, below the minimum
+        ("CNSGH", "NOTAE", date(2016, 1, 11), 100),
+        ("CNNBO", "NOTAE", date(2016, 1, 11), 300),
+        # Last day: 3 prices on one pair
+        ("CNNBO", "NOTAE", date(2016, 1, 12), 10),
+        ("CNNBO", "NOTAE", date(2016, 1, 12), 20),
+        ("CNNBO", "NOTAE", date(2016, 1, 12), 60),
+    ]
+    snapshot = build_snapshot(ports, regions, prices)
+    lanes = [("china", "NOTAE"), ("CNSGH", "NOTAE")]
+    result = lane_average_prices(snapshot, lanes, date(2016, 1, 10), date(2016, 1, 12))
+    assert result.rows(0) == [
+        (date(2016, 1, 10), 300.0),
+        (date(2016, 1, 11), None),
+        (date(2016, 1, 12), 30.0),
+    ]
+    assert result.rows(1) == [(date(2016, 1, 10), None), (date(2016, 1, 11), None)]
+    single = lane_average_prices(snapshot, lanes, date(2016, 1, 12), date(2016, 1, 12))
+    assert single.rows(0) == [(date(2016, 1, 12), 30.0)] and not single.rows(1)
+
+
+def test_min_count_and_unknown_ports():
+    """
+    Test case to ensure the minimum count applies and unknown ports have no prices.
+    """
+    snapshot = build_snapshot(PORTS, REGIONS, PRICES)
+    orig_code, dest_code, _, _ = PRICES[0]
+    lanes = [(orig_code, dest_code), ("XXXXX", dest_code)]
+    date_from, date_to = date(2016, 1, 1), date(2016, 3, 1)
+    result = lane_average_prices(snapshot, lanes, date_from, date_to, min_count=6)
+    assert_same_averages(
+        result.rows(0), reference_averages(orig_code, dest_code, date_from, date_to, 6)
+    )
+    assert not result.rows(1)
+
+
+def test_snapshot_roundtrip(tmp_path):
+    """
+    Test case to ensure a saved snapshot loads memory-mapped with the same results.
+    """
+    snapshot = build_snapshot(PORTS, REGIONS, PRICES, version=7)
+    save_snapshot(snapshot, tmp_path)
+    loaded = load_snapshot(tmp_path)
+    assert loaded.version == 7
+    assert len(loaded) == len(PRICES)
+    assert list(loaded.index["r0"]) == list(snapshot.index["r0"])
+    lanes = [("r0", "r1")]
+    date_from, date_to = date(2016, 1, 1), date(2016, 1, 31)
+    assert (
+        lane_average_prices(loaded, lanes, date_from, date_to).sums
+        == lane_average_prices(snapshot, lanes, date_from, date_to).sums
+    ).all()
@@ -1,7 +1,8 @@
 """Unit testcases base for rate calculator API"""
 
+from contextlib import asynccontextmanager
 from types import SimpleNamespace
-from typing import Generator, Any
+from typing import Any, Callable, Generator, List, Optional
 
 import pytest
 from fastapi import FastAPI
@@ -77,3 +78,145 @@ def client(test_app: FastAPI, db_session: Database):
 
     with TestClient(test_app) as test_client:
         yield test_client
+
+
+class StandInConnection:
+    """
+    Stand-in for AsyncConnection recording the statements and parameters it
+    executes and the COPY calls it receives.
+
+    Results are the fixed `rows` for fetchall() and `value` for scalar(), or
+    whatever `answer(statement, params)` returns when given.
+    """
+
+    def __init__(
+        self,
+        engine: Optional["StandInEngine"] = None,
+        rows: Any = (),
+        value: Any = None,
+        answer: Optional[Callable[[Any, Any], Any]] = None,
+    ):
+        self.engine = engine
+        self.rows = rows
+        self.value = value
+        self.answer = answer
+        self.statements: List[Any] = []
+        self.params: List[Any] = []
+        self.copied: List[Any] = []
+        self.rowcount = 0
+        self.result: Any = None
+
+    @property
+    def statement(self) -> Any:
+        """
+        The last statement executed.
+        """
+        return self.statements[-1]
+
+    async def start(self):
+        if self.engine is not None and self.engine.down:
+            raise OSError(f"{self.engine.name} is down")
+        return self
+
+    async def close(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *_exc):
+        await self.close()
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+        self.params.append(params)
+        if self.engine is not None:
+            self.engine.executed.append((statement, params))
+        self.result = self.answer(statement, params) if self.answer else None
+        return self
+
+    exec_driver_sql = execute
+
+    @asynccontextmanager
+    async def stream(self, statement, params=None, **_options):
+        await self.execute(statement, params)
+        yield self._iterate()
+
+    async def _iterate(self):
+        for row in self.fetchall():
+            yield row
+
+    def fetchall(self):
+        return self.result if self.answer else list(self.rows)
+
+    def scalar(self):
+        return self.result if self.answer else self.value
+
+    def one(self):
+        return self.result if self.answer else self.rows[0]
+
+    def first(self):
+        return self.result if self.answer else next(iter(self.rows), None)
+
+    @property
+    def driver_connection(self):
+        return self
+
+    async def get_raw_connection(self):
+        return self
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.append((table, columns, records))
+        self.rowcount = len(records)
+
+
+class StandInEngine:
+    """
+    Stand-in for AsyncEngine with a configurable replication lag and outage,
+    recording the statements run on its connections.
+    """
+
+    def __init__(
+        self, name: str = "primary", lag: float = 0.0, down: bool = False, rows=()
+    ):
+        self.name = name
+        self.lag = lag
+        self.down = down
+        self.rows = rows
+        self.executed: List[Any] = []
+
+    def connect(self) -> StandInConnection:
+        return StandInConnection(self, rows=self.rows, value=self.lag)
+
+
+class StandInDatabase(Database):
+    """
+    Database whose transactions and reads run on a single stand-in connection.
+    """
+
+    def __init__(self, conn: StandInConnection):
+        super().__init__()
+        self.conn = conn
+
+    @asynccontextmanager
+    async def begin(self):
+        yield self.conn
+
+    @asynccontextmanager
+    async def read(self):
+        yield self.conn
+
+
+class Clock:
+    """
+    Manually advanced stand-in for time.monotonic.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
@@ -0,0 +1,82 @@
+"""Unit testcases for the benchmark suite"""
+
+from bench.dataset import DatasetSpec, generate_ports, generate_prices, generate_regions
+from bench.loadgen import build_scenarios, compare, percentile, summarize
+
+SPEC = DatasetSpec(prices=5000, depth=2, fanout=2, ports_per_region=3, days=30)
+
+
+def test_dataset_is_deterministic():
+    """
+    Test case to ensure the same spec always generates the same prices.
+    """
+    assert list(generate_prices(SPEC)) == list(generate_prices(SPEC))
+    assert list(generate_prices(SPEC)) != list(generate_prices(SPEC._replace(seed=1)))
+    assert len(list(generate_prices(SPEC))) == SPEC.prices
+
+
+def test_regions_are_nested():
+    """
+    Test case to ensure regions nest `depth` levels and ports belong to leaf regions.
+    """
+    regions = generate_regions(SPEC)
+    parents = {slug: parent_slug for slug, _, parent_slug in regions}
+    assert len(regions) == 2 + 4 + 8
+    assert parents["r1_0_1"] == "r1_0"
+    assert parents["r1_0"] == "r1"
+    assert parents["r1"] is None
+    ports = generate_ports(SPEC)
+    assert len(ports) == 8 * 3
+    assert all(parent_slug.count("_") == 2 for _, _, parent_slug in ports)
+
+
+def test_scenarios_query_loaded_lanes():
+    """
+    Test case to ensure port scenarios query lanes with prices and region scenarios their ancestors.
+    """
+    lanes = {(orig_code, dest_code) for orig_code, dest_code, _, _ in generate_prices(SPEC)}
+    scenarios = {scenario.name: scenario.params for scenario in build_scenarios(SPEC)}
+    assert set(scenarios) == {"port-narrow", "port-wide", "region-narrow", "region-wide"}
+    assert all(
+        (params["origin"], params["destination"]) in lanes
+        for params in scenarios["port-narrow"]
+    )
+    assert all(params["origin"].startswith("r") for params in scenarios["region-wide"])
+    assert scenarios["port-wide"][0]["date_from"] == "2016-01-01"
+    assert scenarios["port-wide"][0]["date_to"] == "2016-01-30"
+
+
+def test_percentile():
+    """
+    Test case to ensure percentiles use the nearest rank.
+    """
+    latencies = [float(i) for i in range(1, 101)]
+    assert percentile(latencies, 50) == 50.0
+    assert percentile(latencies, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+
+def test_compare_reports_regressions():
+    """
+    Test case to ensure slower runs and failed requests are reported as regressions.
+    """
+    baseline = {"port-narrow": summarize([0.01] * 100, 0, 1.0)}
+    assert compare({"port-narrow": summarize([0.0105] * 100, 0, 1.0)}, baseline, 0.1) == []
+    slower = compare({"port-narrow": summarize([0.02] * 100, 0, 2.0)}, baseline, 0.1)
+    assert [message.split(" ")[1] for message in slower] == [
+        "throughput",
+        "p50",
+        "p95",
+        "p99",
+    ]
+    assert compare({"port-narrow": summarize([0.01] * 100, 3, 1.0)}, baseline, 0.1) == [
+        "port-narrow: 3 failed requests"
+    ]
+
+
+def test_compare_reports_missing_baseline():
+    """
+    Test case to ensure scenarios without a baseline fail the comparison instead of passing.
+    """
+    results = {"port-narrow": summarize([0.01] * 100, 0, 1.0)}
+    assert compare(results, {}, 0.1) == ["port-narrow: no baseline to compare against"]
@@ -0,0 +1,122 @@
+"""Unit testcases for the rates response cache"""
+
+from datetime import date
+
+import pytest
+from core.cache import LocalBackend, RatesCache
+from .test_base import Clock
+
+
+def make_cache(max_bytes: int = 1024, ttl: float = 60.0):
+    """
+    Create a RatesCache backed by a LocalBackend with a manual clock.
+    """
+    clock = Clock()
+    cache = RatesCache()
+    cache.configure(LocalBackend(max_bytes, clock=clock), ttl)
+    return cache, clock
+
+
+def test_key_normalization():
+    """
+    Test case to ensure keys depend on the lane, the date range and the version.
+    """
+    key = RatesCache.key(1, ("CNSGH",), ("NOTAE",), date(2016, 1, 1), date(2016, 1, 31))
+    assert key == RatesCache.key(
+        1, ["CNSGH"], ["NOTAE"], date(2016, 1, 1), date(2016, 1, 31)
+    )
+    assert key != RatesCache.key(
+        2, ("CNSGH",), ("NOTAE",), date(2016, 1, 1), date(2016, 1, 31)
+    )
+    assert key != RatesCache.key(
+        1, ("NOTAE",), ("CNSGH",), date(2016, 1, 1), date(2016, 1, 31)
+    )
+
+
+@pytest.mark.asyncio
+async def test_hit_and_miss():
+    """
+    Test case to ensure hits and misses are counted.
+    """
+    cache, _ = make_cache()
+    assert await cache.get("a") is None
+    await cache.set("a", b"[]")
+    assert await cache.get("a") == b"[]"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ttl_expiry():
+    """
+    Test case to ensure entries expire after the TTL.
+    """
+    cache, clock = make_cache(ttl=10)
+    await cache.set("a", b"[]")
+    clock.now = 9.9
+    assert await cache.get("a") == b"[]"
+    clock.now = 10
+    assert await cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction():
+    """
+    Test case to ensure the least recently used entries are evicted once the
+    size bound is exceeded.
+    """
+    cache, _ = make_cache(max_bytes=25)
+    await cache.set("a", b"x" * 9)
+    await cache.set("b", b"x" * 9)
+    await cache.get("a")
+    await cache.set("c", b"x" * 9)
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    assert await cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 20
+
+
+@pytest.mark.asyncio
+async def test_invalidate():
+    """
+    Test case to ensure a dataset version change drops local entries.
+    """
+    cache, _ = make_cache()
+    await cache.set("a", b"[]")
+    cache.invalidate(2)
+    assert await cache.get("a") is None
+
+
+class FailingBackend:
+    """
+    Stand-in for an unreachable RedisBackend.
+    """
+
+    evictions = 0
+
+    async def get(self, _key):
+        raise ConnectionError("Connection refused")
+
+    async def set(self, _key, _value, _ttl):
+        raise TimeoutError("Timeout writing to socket")
+
+    def clear(self):
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+
+@pytest.mark.asyncio
+async def test_backend_errors_are_misses():
+    """
+    Test case to ensure a failing backend turns reads into misses and writes into no-ops.
+    """
+    cache = RatesCache()
+    cache.configure(FailingBackend(), 60)
+    assert await cache.get("a") is None
+    await cache.set("a", b"[]")
+    stats = cache.stats()
+    assert (stats["misses"], stats["errors"]) == (1, 2)
@@ -0,0 +1,68 @@
+"""Unit testcases for the HTTP conditional requests"""
+
+from datetime import date, datetime, timezone
+
+from core.conditional import cache_control, entity_tag, not_modified, validator_headers
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+
+
+def make_headers(updated_at=UPDATED_AT, media_type="application/json"):
+    """
+    Create the headers of a January 2016 response.
+    """
+    return validator_headers(
+        "3:lane:2016-01-01:2016-01-31",
+        media_type,
+        updated_at,
+        date(2016, 1, 31),
+        date(2024, 5, 2),
+        86400,
+        60,
+    )
+
+
+def test_cache_control():
+    """
+    Test case to ensure windows in the past are cached long and windows reaching today briefly.
+    """
+    today = date(2024, 5, 2)
+    assert cache_control(date(2024, 5, 1), today, 86400, 60) == "public, max-age=86400"
+    assert cache_control(date(2024, 5, 2), today, 86400, 60) == "public, max-age=60"
+
+
+def test_validator_headers():
+    """
+    Test case to ensure validators depend on the representation and need a tracked version.
+    """
+    headers = make_headers()
+    assert headers["Last-Modified"] == "Wed, 01 May 2024 12:30:15 GMT"
+    assert headers["ETag"] == entity_tag("3:lane:2016-01-01:2016-01-31", "application/json")
+    assert make_headers(media_type="text/csv")["ETag"] != headers["ETag"]
+    untracked = make_headers(updated_at=None)
+    assert "ETag" not in untracked and "Last-Modified" not in untracked
+    assert untracked["Cache-Control"] == "no-cache"
+
+
+def test_if_none_match():
+    """
+    Test case to ensure matching, weak and wildcard tags are not modified and take precedence.
+    """
+    headers = make_headers()
+    etag = headers["ETag"]
+    assert not_modified(headers, etag, None)
+    assert not_modified(headers, f'"other", W/{etag}', None)
+    assert not_modified(headers, "*", None)
+    assert not not_modified(headers, '"other"', "Wed, 01 May 2024 12:30:15 GMT")
+    assert not not_modified(make_headers(updated_at=None), "*", None)
+
+
+def test_if_modified_since():
+    """
+    Test case to ensure If-Modified-Since compares at second precision and ignores bad dates.
+    """
+    headers = make_headers()
+    assert not_modified(headers, None, "Wed, 01 May 2024 12:30:15 GMT")
+    assert not not_modified(headers, None, "Wed, 01 May 2024 12:30:14 GMT")
+    assert not not_modified(headers, None, "yesterday")
+    assert not not_modified(headers, None, None)
@@ -0,0 +1,217 @@
+"""Unit testcases for DB Crud operations"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from core.crud import (
+    AGGREGATE_BUCKET_SUMS_QUERY,
+    AGGREGATE_QUERY,
+    AGGREGATE_STATS_QUERY,
+    PORTS_QUERY,
+    QUERY,
+    REGIONS_QUERY,
+    averages_from_sums,
+    bucket_start,
+    buckets_before,
+    get_average_prices,
+    get_batch_daily_sums,
+    get_bucketed_sums,
+    get_ports,
+    get_price_stats,
+    get_regions,
+    shape_price_stats,
+    stats_from_aggregates,
+    stats_query,
+)
+from .test_base import StandInConnection
+
+
+def test_averages_from_sums():
+    """
+    Test case to ensure averages are only computed from 3 prices upwards.
+    """
+    assert averages_from_sums(
+        [(date(2016, 1, 1), Decimal(300), 3), (date(2016, 1, 2), Decimal(200), 2)]
+    ) == [(date(2016, 1, 1), Decimal(100)), (date(2016, 1, 2), None)]
+
+
+def test_averages_from_sums_min_count():
+    """
+    Test case to ensure the minimum count applies to whole buckets.
+    """
+    sums = [(date(2016, 1, 4), Decimal(1000), 10), (date(2016, 1, 11), Decimal(50), 5)]
+    assert averages_from_sums(sums, 6) == [
+        (date(2016, 1, 4), Decimal(100)),
+        (date(2016, 1, 11), None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batch_params_flatten_lanes():
+    """
+    Test case to ensure every lane's port codes are flattened into (lane, code) arrays.
+    """
+    conn = StandInConnection()
+    await get_batch_daily_sums(
+        conn,
+        [
+            (("CNNBO", "CNSGH"), ("NOTAE",), date(2016, 1, 1), date(2016, 1, 31)),
+            (("NOTAE",), ("CNSGH",), date(2016, 2, 1), date(2016, 2, 2)),
+        ],
+    )
+    assert conn.params[-1] == {
+        "lane_ids": [0, 1],
+        "dates_from": [date(2016, 1, 1), date(2016, 2, 1)],
+        "dates_to": [date(2016, 1, 31), date(2016, 2, 2)],
+        "origin_lanes": [0, 0, 1],
+        "origin_codes": ["CNNBO", "CNSGH", "NOTAE"],
+        "destination_lanes": [0, 1],
+        "destination_codes": ["NOTAE", "CNSGH"],
+        "span_from": date(2016, 1, 1),
+        "span_to": date(2016, 2, 2),
+    }
+
+
+def test_stats_query_selects_columns():
+    """
+    Test case to ensure only the selected statistics are computed, percentiles in one pass.
+    """
+    sql = str(stats_query(("count", "median", "p90")))
+    assert "percentile_cont(ARRAY[0.5, 0.9]) WITHIN GROUP (ORDER BY price)" in sql
+    assert "MIN(price)" not in sql
+    assert "stddev_samp" in str(stats_query(("stddev",)))
+    assert stats_query(("min",)) is stats_query(("min",))
+
+
+def test_shape_price_stats():
+    """
+    Test case to ensure statistics below the minimum samples are dropped, but not the count.
+    """
+    rows = [
+        {
+            "day": date(2016, 1, 1),
+            "count": 2,
+            "average_price": 150.0,
+            "min": 100,
+            "percentiles": [150.0],
+        },
+        {
+            "day": date(2016, 1, 2),
+            "count": 5,
+            "average_price": 300.0,
+            "min": 100,
+            "percentiles": [250.0],
+        },
+    ]
+    assert shape_price_stats(rows, ("count", "min", "median"), 3) == [
+        {
+            "day": date(2016, 1, 1),
+            "average_price": None,
+            "count": 2,
+            "min": None,
+            "median": None,
+        },
+        {
+            "day": date(2016, 1, 2),
+            "average_price": 300.0,
+            "count": 5,
+            "min": 100,
+            "median": 250.0,
+        },
+    ]
+
+
+def test_stats_from_aggregates():
+    """
+    Test case to ensure the sample standard deviation is recovered from sums of squares.
+    """
+    # Prices 100, 200, 300 and 400
+    stats = stats_from_aggregates(
+        {"count": 4, "price_sum": 1000, "price_sq_sum": 300000, "min": 100, "max": 400}
+    )
+    assert stats["average_price"] == 250.0
+    assert stats["stddev"] == pytest.approx(129.0994, abs=1e-4)
+    assert stats["min"] == 100 and stats["max"] == 400
+
+
+@pytest.mark.asyncio
+async def test_price_stats_use_aggregates_without_percentiles():
+    """
+    Test case to ensure daily_lane_stats only answers selections without percentiles.
+    """
+    conn = StandInConnection()
+    lane = (["CNSGH"], ["NOTAE"], date(2016, 1, 1), date(2016, 1, 2))
+    await get_price_stats(conn, *lane, ("max", "count"), use_aggregates=True)
+    assert conn.statement is AGGREGATE_STATS_QUERY
+    await get_price_stats(conn, *lane, ("median",), use_aggregates=True)
+    assert conn.statement is stats_query(("median",))
+
+
+def test_bucket_bounds():
+    """
+    Test case to ensure buckets start on Mondays and first days of months.
+    """
+    assert bucket_start(date(2016, 1, 7), "week") == date(2016, 1, 4)
+    assert bucket_start(date(2016, 1, 31), "month") == date(2016, 1, 1)
+    assert bucket_start(date(2016, 1, 7), "day") == date(2016, 1, 7)
+    assert buckets_before(date(2016, 1, 4), "week", 2) == date(2015, 12, 21)
+    assert buckets_before(date(2016, 2, 1), "month", 3) == date(2015, 11, 1)
+    assert buckets_before(date(2016, 1, 1), "day", 6) == date(2015, 12, 26)
+
+
+@pytest.mark.asyncio
+async def test_bucketed_sums_fetch_preceding_buckets():
+    """
+    Test case to ensure rolling windows are filled with the preceding full buckets.
+    """
+    conn = StandInConnection()
+    lane = (["CNSGH"], ["NOTAE"], date(2016, 3, 15), date(2016, 6, 30))
+    await get_bucketed_sums(conn, *lane, "month", 3, use_aggregates=True)
+    assert conn.statement is AGGREGATE_BUCKET_SUMS_QUERY
+    assert conn.params[-1]["first_bucket"] == date(2016, 3, 1)
+    assert conn.params[-1]["fetch_from"] == date(2016, 1, 1)
+    assert (conn.params[-1]["window_months"], conn.params[-1]["window_days"]) == (2, 0)
+
+    await get_bucketed_sums(conn, *lane, "week")
+    assert conn.params[-1]["first_bucket"] == date(2016, 3, 14)
+    assert conn.params[-1]["fetch_from"] == date(2016, 3, 15)
+    assert (conn.params[-1]["window_months"], conn.params[-1]["window_days"]) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_average_prices_bind_port_arrays():
+    """
+    Test case to ensure every lane runs the same statement with its ports bound as arrays.
+    """
+    conn = StandInConnection()
+    lanes = [(("CNSGH",), ("NOTAE",)), (("CNNBO", "CNSGH"), ("NLRTM",))]
+    for origin, destination in lanes:
+        await get_average_prices(
+            conn, origin, destination, date(2016, 1, 1), date(2016, 1, 31)
+        )
+    assert conn.statements == [QUERY, QUERY]
+    assert conn.params[-1] == {
+        "origin": ["CNNBO", "CNSGH"],
+        "destination": ["NLRTM"],
+        "date_from": date(2016, 1, 1),
+        "date_to": date(2016, 1, 31),
+    }
+    assert "CNSGH" not in str(QUERY)
+    await get_average_prices(
+        conn, ("CNSGH",), ("NOTAE",), date(2016, 1, 1), date(2016, 1, 31), True
+    )
+    assert conn.statement is AGGREGATE_QUERY
+
+
+@pytest.mark.asyncio
+async def test_hierarchy_queries_are_constant():
+    """
+    Test case to ensure ports and regions are read with fixed statements and no parameters.
+    """
+    conn = StandInConnection(rows=[("CNSGH", "china_main")])
+    assert await get_ports(conn) == [("CNSGH", "china_main")]
+    assert await get_regions(conn) == [("CNSGH", "china_main")]
+    await get_ports(conn)
+    assert conn.statements == [PORTS_QUERY, REGIONS_QUERY, PORTS_QUERY]
+    assert conn.params == [None, None, None]
@@ -0,0 +1,82 @@
+"""Unit testcases for the port hierarchy index"""
+
+import pytest
+from core.hierarchy import PortHierarchy, build_index, create_hierarchy_trigger
+
+from .test_base import StandInConnection, StandInDatabase
+
+PORTS = [
+    ("CNSGH", "china_east_main"),
+    ("CNNBO", "china_east_main"),
+    ("CNYTN", "china_south_main"),
+    ("NOOSL", "norway_south_east"),
+    ("NOTAE", None),
+]
+
+REGIONS = [
+    ("china_main", None),
+    ("china_east_main", "china_main"),
+    ("china_south_main", "china_main"),
+    ("northern_europe", None),
+    ("scandinavia", "northern_europe"),
+    ("norway_south_east", "scandinavia"),
+    ("empty_region", None),
+]
+
+
+def test_build_index_ports():
+    """
+    Test case to ensure every port code resolves to itself.
+    """
+    index = build_index(PORTS, REGIONS)
+    assert index["CNSGH"] == ("CNSGH",)
+    assert index["NOTAE"] == ("NOTAE",)
+
+
+def test_build_index_nested_regions():
+    """
+    Test case to ensure regions include ports from every level of nesting.
+    """
+    index = build_index(PORTS, REGIONS)
+    assert index["china_main"] == ("CNNBO", "CNSGH", "CNYTN")
+    assert index["china_east_main"] == ("CNNBO", "CNSGH")
+    assert index["northern_europe"] == ("NOOSL",)
+
+
+def test_build_index_skips_empty_regions():
+    """
+    Test case to ensure regions without any ports are not resolvable.
+    """
+    assert "empty_region" not in build_index(PORTS, REGIONS)
+
+
+def test_build_index_cycle():
+    """
+    Test case to ensure a cyclic region hierarchy does not loop forever.
+    """
+    index = build_index([("AAAAA", "a")], [("a", "b"), ("b", "a")])
+    assert index["a"] == ("AAAAA",)
+    assert index["b"] == ("AAAAA",)
+
+
+def test_resolve_unknown():
+    """
+    Test case to ensure unknown codes and slugs resolve to nothing.
+    """
+    hierarchy = PortHierarchy()
+    assert hierarchy.resolve("CNX9AM") == ()
+
+
+@pytest.mark.asyncio
+async def test_create_hierarchy_trigger():
+    """
+    Test case to ensure both hierarchy tables get a trigger notifying the channel.
+    """
+    conn = StandInConnection()
+    await create_hierarchy_trigger(StandInDatabase(conn), "port_hierarchy_changed")
+    statements = [str(statement) for statement in conn.statements]
+    assert "pg_notify(TG_ARGV[0], TG_TABLE_NAME)" in statements[0]
+    for table in ("ports", "regions"):
+        create = next(s for s in statements if s.startswith(f"CREATE TRIGGER {table}_"))
+        assert "FOR EACH STATEMENT" in create
+        assert create.endswith("notify_port_hierarchy_changed('port_hierarchy_changed')")
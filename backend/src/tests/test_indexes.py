@@ -0,0 +1,54 @@
+"""Unit testcases for the index advisor"""
+
+import pytest
+from core.indexes import PRICES_DAY_BRIN, PRICES_LANE_DAY, missing_indexes
+from .test_base import StandInConnection
+
+
+def catalog(indexes, tables=("prices",)) -> StandInConnection:
+    """
+    Returns a connection answering the table and index catalog queries.
+    """
+
+    def answer(_statement, params):
+        return params["table"] in tables if "table" in params else indexes
+
+    return StandInConnection(answer=answer)
+
+
+def test_ddl():
+    """
+    Test case to ensure the covering and BRIN indexes are created concurrently.
+    """
+    assert PRICES_LANE_DAY.ddl() == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS prices_orig_dest_day_idx "
+        "ON prices USING btree (orig_code, dest_code, day) INCLUDE (price)"
+    )
+    assert PRICES_DAY_BRIN.ddl() == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS prices_day_brin_idx "
+        "ON prices USING brin (day)"
+    )
+
+
+@pytest.mark.asyncio
+async def test_missing_indexes():
+    """
+    Test case to ensure only indexes with the same leading keys and included columns count.
+    """
+    partial = ("prices", "btree", ["orig_code", "dest_code"], ["orig_code", "dest_code"])
+    assert await missing_indexes(catalog([partial])) == [PRICES_LANE_DAY]
+
+    keys = ["orig_code", "dest_code", "day"]
+    not_covering = ("prices", "btree", keys, keys)
+    assert await missing_indexes(catalog([not_covering])) == [PRICES_LANE_DAY]
+
+    wider = ("prices", "btree", keys + ["price"], keys + ["price"])
+    assert await missing_indexes(catalog([wider])) == []
+
+
+@pytest.mark.asyncio
+async def test_missing_table_is_skipped():
+    """
+    Test case to ensure indexes of tables that do not exist are not reported.
+    """
+    assert await missing_indexes(catalog([], tables=())) == []
@@ -0,0 +1,77 @@
+"""Unit testcases for the bulk price ingestion"""
+
+from datetime import date
+from io import StringIO
+
+import pytest
+from core.ingest import (
+    DELETE_REPLACED,
+    INSERT_STAGED,
+    INSERT_STAGED_AGGREGATES,
+    IngestReport,
+    chunks,
+    merge_batch,
+    read_price_csv,
+)
+from .test_base import StandInConnection
+
+
+def test_read_price_csv():
+    """
+    Test case to ensure CSV prices are parsed by header name, in COPY column order.
+    """
+    stream = StringIO(
+        "day,price,orig_code,dest_code,source\n"
+        "2016-01-01,1244,CNSGH,NOTAE,feed\n"
+        "\n"
+        "2016-01-02,1100,CNSGH,NOTAE,feed\n"
+    )
+    assert list(read_price_csv(stream)) == [
+        ("CNSGH", "NOTAE", date(2016, 1, 1), 1244),
+        ("CNSGH", "NOTAE", date(2016, 1, 2), 1100),
+    ]
+
+
+def test_read_price_csv_errors():
+    """
+    Test case to ensure missing columns and invalid values are reported with their line.
+    """
+    with pytest.raises(ValueError, match="missing price"):
+        list(read_price_csv(StringIO("orig_code,dest_code,day\n")))
+    stream = StringIO("orig_code,dest_code,day,price\nCNSGH,NOTAE,2016-01-01,abc\n")
+    with pytest.raises(ValueError, match="line 2"):
+        list(read_price_csv(stream))
+
+
+def test_chunks_and_report():
+    """
+    Test case to ensure rows are split in batches and throughput is reported.
+    """
+    assert list(chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert IngestReport(1000, 1, 0.5).rows_per_second == 2000
+    assert IngestReport(0, 0, 0.0).rows_per_second == 0.0
+
+
+@pytest.mark.asyncio
+async def test_merge_batch_append():
+    """
+    Test case to ensure an appended batch is copied to staging and inserted as is.
+    """
+    conn = StandInConnection()
+    batch = [("CNSGH", "NOTAE", date(2016, 1, 1), 1244)]
+    assert await merge_batch(conn, batch, "append") == 1
+    assert conn.copied[0][0] == "prices_staging"
+    assert DELETE_REPLACED not in conn.statements
+    assert conn.statements[-1] is INSERT_STAGED
+
+
+@pytest.mark.asyncio
+async def test_merge_batch_replace_folds_aggregates():
+    """
+    Test case to ensure a replace clears the lane days and refreshes their aggregates.
+    """
+    conn = StandInConnection()
+    batch = [("CNSGH", "NOTAE", date(2016, 1, 1), 1244)]
+    await merge_batch(conn, batch, "replace", fold_aggregates=True)
+    assert conn.statements.index(DELETE_REPLACED) < conn.statements.index(INSERT_STAGED)
+    assert conn.statements[-1] is INSERT_STAGED_AGGREGATES
@@ -0,0 +1,87 @@
+"""Unit testcases for the logging configuration"""
+
+import json
+import logging
+import sys
+from io import StringIO
+
+from lib.log import (
+    LOG_CONFIG,
+    JsonFormatter,
+    QueuedStreamHandler,
+    SampleFilter,
+    dropped_records,
+    get_config,
+)
+
+
+def make_record(level=logging.INFO, msg="price %d", args=(42,)) -> logging.LogRecord:
+    """
+    Create a record of the rate_calculator logger.
+    """
+    return logging.LogRecord("rate_calculator", level, __file__, 1, msg, args, None)
+
+
+def test_get_config_modes():
+    """
+    Test case to ensure the queued, JSON and sampled modes are configured without changing LOG_CONFIG.
+    """
+    config = get_config(
+        log_level="WARNING", queued=True, json_lines=True, access_sample_rate=0.1
+    )
+    assert config["handlers"]["default"]["()"] is QueuedStreamHandler
+    assert config["formatters"]["default"] == {"()": JsonFormatter}
+    assert config["filters"]["access_sample"]["rate"] == 0.1
+    assert config["loggers"]["uvicorn.access"] == {"filters": ["access_sample"]}
+    assert LOG_CONFIG["handlers"]["default"]["class"] == "logging.StreamHandler"
+    assert LOG_CONFIG["loggers"]["rate_calculator"]["level"] == "INFO"
+    assert "filters" not in get_config()
+
+
+def test_json_formatter():
+    """
+    Test case to ensure records are formatted as JSON lines with their exception.
+    """
+    try:
+        raise ValueError("bad price")
+    except ValueError:
+        record = logging.LogRecord(
+            "rate_calculator", logging.ERROR, __file__, 1, "failed", (), sys.exc_info()
+        )
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "ERROR" and entry["logger"] == "rate_calculator"
+    assert entry["message"] == "failed"
+    assert "ValueError: bad price" in entry["exception"]
+
+
+def test_sample_filter_keeps_warnings():
+    """
+    Test case to ensure sampling drops info records but never warnings.
+    """
+    sample = SampleFilter(0.0)
+    assert not sample.filter(make_record())
+    assert sample.filter(make_record(logging.WARNING))
+    assert SampleFilter(1.0).filter(make_record())
+
+
+def test_queued_handler_writes_and_drops():
+    """
+    Test case to ensure records are written by the listener and dropped when the queue is full.
+    """
+    stream = StringIO()
+    handler = QueuedStreamHandler(stream, maxsize=1)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    handler.handle(make_record())
+    # Stop draining so the queue fills up
+    handler.listener.stop()
+    for _ in range(3):
+        handler.handle(make_record())
+    assert handler.dropped == 2
+    assert dropped_records() >= 2
+    handler.listener.start()
+    handler.close()
+    assert stream.getvalue().splitlines() == [
+        "INFO price 42",
+        "INFO price 42",
+        "2 log records dropped, the log queue was full",
+    ]
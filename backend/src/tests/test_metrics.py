@@ -0,0 +1,47 @@
+"""Unit testcases for the metrics exposition"""
+
+from lib.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_render():
+    """
+    Test case to ensure counters are rendered per label set.
+    """
+    counter = Counter("requests_total", "Requests", ("route",))
+    counter.inc("/rates")
+    counter.inc("/rates", amount=2)
+    assert counter.render() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/rates"} 3.0',
+    ]
+
+
+def test_histogram_buckets():
+    """
+    Test case to ensure histogram buckets are cumulative and inclusive.
+    """
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2.0',
+        'latency_seconds_bucket{le="1.0"} 3.0',
+        'latency_seconds_bucket{le="+Inf"} 4.0',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4.0",
+    ]
+
+
+def test_registry_skips_unconfigured_gauges():
+    """
+    Test case to ensure a gauge whose component is not configured is left out.
+    """
+
+    def unconfigured():
+        raise RuntimeError("Database engine not yet configured")
+
+    registry = Registry()
+    registry.register(Gauge("pool", "Pool", unconfigured))
+    registry.register(Gauge("up", "Up", lambda: {(): 1}))
+    assert registry.render() == "# HELP up Up\n# TYPE up gauge\nup 1.0\n"
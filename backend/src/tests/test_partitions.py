@@ -0,0 +1,152 @@
+"""Unit testcases for the prices partitioning"""
+
+from datetime import date
+
+import pytest
+from core.indexes import IS_PARTITIONED
+from core.partitions import (
+    FOREIGN_KEYS_QUERY,
+    PARTITIONS_QUERY,
+    create_partitions,
+    ensure_partitions,
+    next_period,
+    partition_name,
+    partition_prices,
+    periods,
+)
+from .test_base import StandInConnection, StandInDatabase
+
+
+def test_periods():
+    """
+    Test case to ensure month and quarter periods cover the range with exclusive ends.
+    """
+    assert periods(date(2016, 11, 15), date(2017, 1, 1), "month") == [
+        (date(2016, 11, 1), date(2016, 12, 1)),
+        (date(2016, 12, 1), date(2017, 1, 1)),
+        (date(2017, 1, 1), date(2017, 2, 1)),
+    ]
+    assert periods(date(2016, 2, 29), date(2016, 4, 1), "quarter") == [
+        (date(2016, 1, 1), date(2016, 4, 1)),
+        (date(2016, 4, 1), date(2016, 7, 1)),
+    ]
+    assert next_period(date(2016, 10, 1), "quarter", 2) == date(2017, 4, 1)
+
+
+def test_partition_name():
+    """
+    Test case to ensure partitions are named after their month or quarter.
+    """
+    assert partition_name("prices", date(2016, 3, 1), "month") == "prices_2016_03"
+    assert partition_name("prices", date(2016, 10, 1), "quarter") == "prices_2016_q4"
+
+
+@pytest.mark.asyncio
+async def test_create_partitions_skips_covered_periods():
+    """
+    Test case to ensure only periods without an overlapping partition are created.
+    """
+    conn = StandInConnection(
+        rows=[("prices_2016_q1", "FOR VALUES FROM ('2016-01-01') TO ('2016-04-01')")]
+    )
+    created = await create_partitions(conn, date(2016, 3, 1), date(2016, 4, 30), "month")
+    assert created == ["prices_2016_04"]
+    assert str(conn.statement) == (
+        "CREATE TABLE prices_2016_04 PARTITION OF prices "
+        "FOR VALUES FROM ('2016-04-01') TO ('2016-05-01')"
+    )
+
+
+@pytest.mark.asyncio
+async def test_partition_prices_keeps_foreign_keys():
+    """
+    Test case to ensure the foreign keys to ports survive the conversion to a partitioned table.
+    """
+    foreign_keys = [
+        ("prices_dest_code_fkey", "FOREIGN KEY (dest_code) REFERENCES ports(code)"),
+        ("prices_orig_code_fkey", "FOREIGN KEY (orig_code) REFERENCES ports(code)"),
+    ]
+
+    def answer(statement, params):
+        if statement is IS_PARTITIONED:
+            return False
+        if statement is FOREIGN_KEYS_QUERY:
+            assert params == {"table": "prices_unpartitioned"}
+            return foreign_keys
+        return [] if params else (None, None)
+
+    conn = StandInConnection(answer=answer)
+    await partition_prices(StandInDatabase(conn), "month", 0, date(2016, 1, 15))
+    statements = [str(statement) for statement in conn.statements]
+    added = [
+        'ALTER TABLE prices ADD CONSTRAINT "prices_dest_code_fkey" '
+        "FOREIGN KEY (dest_code) REFERENCES ports(code)",
+        'ALTER TABLE prices ADD CONSTRAINT "prices_orig_code_fkey" '
+        "FOREIGN KEY (orig_code) REFERENCES ports(code)",
+    ]
+    assert all(statement in statements for statement in added)
+    # Validated once the rows are copied, before the plain table goes away
+    insert = statements.index("INSERT INTO prices SELECT * FROM prices_unpartitioned")
+    drop = statements.index("DROP TABLE prices_unpartitioned")
+    assert insert < statements.index(added[0]) < drop
+
+
+def created_partitions(conn: StandInConnection):
+    """
+    Returns the names of the partitions created on a stand-in connection.
+    """
+    return [
+        str(statement).split()[2]
+        for statement in conn.statements
+        if str(statement).startswith("CREATE TABLE prices_")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_partition_prices_leaves_no_gap():
+    """
+    Test case to ensure partitions run without gaps from the first price to the periods ahead.
+    """
+
+    def answer(statement, params):
+        if statement is IS_PARTITIONED:
+            return False
+        if params is None and "MIN(day)" in str(statement):
+            return (date(2015, 10, 3), date(2015, 11, 20))
+        return []
+
+    conn = StandInConnection(answer=answer)
+    await partition_prices(StandInDatabase(conn), "month", 1, date(2016, 1, 15))
+    assert created_partitions(conn) == [
+        "prices_2015_10",
+        "prices_2015_11",
+        "prices_2015_12",
+        "prices_2016_01",
+        "prices_2016_02",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_fills_missed_periods():
+    """
+    Test case to ensure periods missed since the newest partition are created along with those ahead.
+    """
+
+    def answer(statement, params):
+        if statement is IS_PARTITIONED:
+            return True
+        if statement is PARTITIONS_QUERY:
+            return [
+                ("prices_2015_10", "FOR VALUES FROM ('2015-10-01') TO ('2015-11-01')"),
+                ("prices_default", "DEFAULT"),
+            ]
+        return None
+
+    conn = StandInConnection(answer=answer)
+    await ensure_partitions(StandInDatabase(conn), "month", 1, date(2016, 1, 15))
+    assert created_partitions(conn) == [
+        "prices_2015_11",
+        "prices_2015_12",
+        "prices_2016_01",
+        "prices_2016_02",
+    ]
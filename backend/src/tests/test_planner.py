@@ -0,0 +1,229 @@
+"""Unit testcases for the parallel chunked execution of rates queries"""
+
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from core.crud import averages_from_sums
+from core.planner import (
+    Chunk,
+    ChunkSlots,
+    chunk_cost,
+    estimate_rows,
+    fetch_chunks,
+    merge_sums,
+    plan_chunks,
+    split_dates,
+    split_ports,
+)
+
+ORIGIN = tuple(f"CN{i:03d}" for i in range(10))
+DESTINATION = tuple(f"NO{i:03d}" for i in range(10))
+DATE_FROM = date(2016, 1, 1)
+DATE_TO = date(2016, 3, 31)
+
+
+def price(orig: str, dest: str, day: date) -> Decimal:
+    """
+    Deterministic price of a lane on a day, absent on some lanes and days.
+    """
+    seed = int(orig[2:]) * 31 + int(dest[2:]) * 7 + day.toordinal()
+    return None if seed % 5 == 0 else Decimal(seed % 997) + Decimal("0.25")
+
+
+class Fetcher:
+    """
+    Stand-in for the sums query over the prices of `price`, recording the
+    chunks it was asked for and how many ran at once.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, chunk: Chunk):
+        self.chunks.append(chunk)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0)
+            return sums(chunk)
+        finally:
+            self.running -= 1
+
+
+def sums(chunk: Chunk):
+    """
+    Returns the (day, price sum, price count) rows of a chunk, in day order.
+    """
+    rows = []
+    day = chunk.date_from
+    while day <= chunk.date_to:
+        prices = [
+            p
+            for orig in chunk.origin
+            for dest in chunk.destination
+            if (p := price(orig, dest, day)) is not None
+        ]
+        if prices:
+            rows.append((day, sum(prices), len(prices)))
+        day += timedelta(days=1)
+    return rows
+
+
+def test_estimate_rows():
+    """
+    Test case to ensure the estimate is the number of lane days.
+    """
+    assert estimate_rows(ORIGIN, DESTINATION, DATE_FROM, DATE_TO) == 10 * 10 * 91
+    assert estimate_rows(ORIGIN, DESTINATION, DATE_TO, DATE_FROM) == 0
+
+
+def test_split_dates_covers_range():
+    """
+    Test case to ensure date ranges are split contiguously without overlap.
+    """
+    ranges = split_dates(DATE_FROM, DATE_TO, 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == DATE_FROM and ranges[-1][1] == DATE_TO
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert start == end + timedelta(days=1)
+    assert split_dates(DATE_FROM, DATE_FROM, 4) == [(DATE_FROM, DATE_FROM)]
+
+
+def test_split_ports_partitions():
+    """
+    Test case to ensure ports are split into disjoint subsets of near equal size.
+    """
+    subsets = split_ports(ORIGIN, 3)
+    assert [len(subset) for subset in subsets] == [4, 3, 3]
+    assert sum(subsets, ()) == ORIGIN
+    assert split_ports(ORIGIN[:2], 5) == [ORIGIN[:1], ORIGIN[1:2]]
+
+
+def test_plan_below_threshold_is_single_chunk():
+    """
+    Test case to ensure narrow queries and disabled splitting run as one chunk.
+    """
+    whole = [Chunk(ORIGIN, DESTINATION, DATE_FROM, DATE_TO)]
+    assert plan_chunks(ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 10000, 8) == whole
+    assert plan_chunks(ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 0, 8) == whole
+    assert plan_chunks(ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 100, 1) == whole
+
+
+def test_plan_accounts_for_round_trips():
+    """
+    Test case to ensure chunks are not split beyond the fan-out or when round trips outweigh them.
+    """
+    assert chunk_cost(9000, 3, 3, 100) == 3100
+    assert chunk_cost(9000, 6, 3, 100) == 2 * 1600
+    chunks = plan_chunks(ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 1000, 8, fan_out=3)
+    assert len(chunks) == 3
+    # Chunks run one after another only add round trips
+    single = plan_chunks(
+        ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 1000, 8, fan_out=1, round_trip_rows=1
+    )
+    assert len(single) == 1
+
+
+def test_plan_splits_long_ranges_by_date():
+    """
+    Test case to ensure long ranges are split by date, bounded by max_chunks.
+    """
+    chunks = plan_chunks(ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 2000, 4)
+    assert len(chunks) == 4
+    assert all(chunk.origin == ORIGIN for chunk in chunks)
+    assert chunks[0].date_from == DATE_FROM and chunks[-1].date_to == DATE_TO
+
+
+def test_plan_splits_short_ranges_by_origin():
+    """
+    Test case to ensure ranges too short for date chunks are split by origin ports.
+    """
+    date_to = DATE_FROM + timedelta(days=9)
+    chunks = plan_chunks(ORIGIN, DESTINATION, DATE_FROM, date_to, 200, 8, 7)
+    assert len(chunks) == 5
+    assert all((c.date_from, c.date_to) == (DATE_FROM, date_to) for c in chunks)
+    assert sum((chunk.origin for chunk in chunks), ()) == ORIGIN
+
+
+def test_merge_sums_adds_per_day():
+    """
+    Test case to ensure partial sums of the same day are added up, in day order.
+    """
+    day1, day2 = date(2016, 1, 1), date(2016, 1, 2)
+    merged = merge_sums(
+        [[(day2, Decimal("1.5"), 1)], [(day1, Decimal(2), 2), (day2, Decimal(3), 2)]]
+    )
+    assert merged == [(day1, Decimal(2), 2), (day2, Decimal("4.5"), 3)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("days", [90, 9])
+async def test_chunked_result_matches_single_query(days):
+    """
+    Test case to ensure date and origin chunking give exactly the unsplit averages.
+    """
+    date_to = DATE_FROM + timedelta(days=days)
+    whole = Chunk(ORIGIN, DESTINATION, DATE_FROM, date_to)
+    chunks = plan_chunks(ORIGIN, DESTINATION, DATE_FROM, date_to, 200, 8)
+    assert len(chunks) > 1
+    fetcher = Fetcher()
+    slots = ChunkSlots()
+    slots.configure(8)
+    merged = await fetch_chunks(chunks, fetcher, 3, slots)
+    assert merged == sums(whole)
+    assert averages_from_sums(merged, 3) == averages_from_sums(sums(whole), 3)
+    assert sorted(fetcher.chunks) == sorted(chunks)
+    assert fetcher.peak == 3
+    assert slots.in_use == 0 and slots.taken == 2
+
+
+@pytest.mark.asyncio
+async def test_shared_slots_bound_connections():
+    """
+    Test case to ensure concurrent queries only run chunks at once for the free shared slots.
+    """
+    chunks = plan_chunks(ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 2000, 4)
+    slots = ChunkSlots()
+    slots.configure(3)
+    fetcher = Fetcher()
+    results = await asyncio.gather(
+        *(fetch_chunks(chunks, fetcher, 4, slots) for _ in range(3))
+    )
+    assert all(result == results[0] for result in results)
+    # One connection per query plus the 3 shared ones
+    assert fetcher.peak <= 3 + 3
+    assert slots.stats()["denied"] >= 1 and slots.in_use == 0
+    slots.configure(0)
+    fetcher = Fetcher()
+    await fetch_chunks(chunks, fetcher, 4, slots)
+    assert fetcher.peak == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_chunk_cancels_the_others():
+    """
+    Test case to ensure a failing chunk cancels the chunks still running.
+    """
+    cancelled = []
+
+    async def fetch(chunk: Chunk):
+        if chunk.date_from == DATE_FROM:
+            raise RuntimeError("query failed")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(chunk)
+            raise
+        return []
+
+    chunks = plan_chunks(ORIGIN, DESTINATION, DATE_FROM, DATE_TO, 2000, 4)
+    slots = ChunkSlots()
+    slots.configure(3)
+    with pytest.raises(RuntimeError):
+        await fetch_chunks(chunks, fetch, 4, slots)
+    assert len(cancelled) == 3
+    assert slots.in_use == 0
@@ -0,0 +1,86 @@
+"""Unit testcases for the statement profiler"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from lib.sqla.profiler import EXPLAIN_PREFIX, QueryProfiler, explainable, fingerprint
+from .test_base import StandInEngine
+
+# Plan returned by the stand-in EXPLAIN
+PLAN = [("Index Only Scan using prices_lane_day_idx",), ("Buffers: shared hit=4",)]
+
+
+def test_explainable():
+    """
+    Test case to ensure only statements without side effects are run again.
+    """
+    assert explainable(" SELECT day FROM prices")
+    assert explainable("WITH lanes AS (SELECT 1) SELECT * FROM lanes")
+    assert not explainable("WITH fresh AS (SELECT 1) DELETE FROM prices")
+    assert not explainable("INSERT INTO prices SELECT * FROM prices_staging")
+    assert fingerprint("SELECT 1") == fingerprint("SELECT 1") != fingerprint("SELECT 2")
+
+
+def test_attach_times_statements():
+    """
+    Test case to ensure every statement of an attached engine is timed and slow ones kept.
+    """
+    profiler = QueryProfiler()
+    profiler.configure(threshold=1e-9, explain_sample_rate=1.0)
+    timings = []
+    profiler.add_listener(lambda key, elapsed: timings.append(key))
+    engine = create_engine("sqlite://")
+    profiler.attach(SimpleNamespace(sync_engine=engine), "sqlite")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT :value"), {"value": "x" * 1000})
+    assert timings == [fingerprint("SELECT ?")]
+    slow = profiler.stats()["slow"][0]
+    assert slow["engine"] == "sqlite"
+    assert slow["parameters"].endswith("...") and len(slow["parameters"]) == 503
+    # No event loop, no plan
+    assert not profiler.plans
+
+
+def test_failing_statement_is_unwound():
+    """
+    Test case to ensure a failing statement leaves no start time behind on its connection.
+    """
+    profiler = QueryProfiler()
+    profiler.configure(threshold=0.0)
+    engine = create_engine("sqlite://")
+    profiler.attach(SimpleNamespace(sync_engine=engine), "sqlite")
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing"))
+        assert conn.info["query_start"] == []
+        conn.execute(text("SELECT 1"))
+        assert conn.info["query_start"] == []
+    assert profiler.statements == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_statement_is_explained(tmp_path):
+    """
+    Test case to ensure sampled slow reads are explained off the request path and written out.
+    """
+    profiler = QueryProfiler()
+    path = tmp_path / "plans.log"
+    profiler.configure(threshold=0.1, explain_sample_rate=1.0, explain_path=str(path))
+    engine = StandInEngine(rows=PLAN)
+    statement = "SELECT day FROM prices WHERE orig_code = $1"
+    profiler.record(engine, "primary", statement, ("CNSGH",), 0.05)
+    profiler.record(engine, "primary", "DELETE FROM prices", (), 0.5)
+    assert profiler.slow_statements == 1
+    profiler.record(engine, "primary", statement, ("CNSGH",), 0.2)
+    profiler.record(engine, "primary", statement, ("CNSGH",), 0.3)
+    await asyncio.gather(*profiler._tasks)
+    # One EXPLAIN per statement text at a time
+    assert engine.executed[1:] == [(EXPLAIN_PREFIX + statement, ("CNSGH",))]
+    assert profiler.plans[0]["plan"].startswith("Index Only Scan")
+    profiler.close()
+    plans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert plans[0]["fingerprint"] == fingerprint(statement)
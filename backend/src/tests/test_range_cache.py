@@ -0,0 +1,111 @@
+"""Unit testcases for the per-day range cache"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from core.range_cache import DayRangeCache, LaneDays
+
+LANE = (("CNSGH",), ("NOTAE",))
+
+
+class Fetcher:
+    """
+    Stand-in for the sums query with 3 prices of 100 on every even day of January.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, date_from: date, date_to: date):
+        self.calls.append((date_from, date_to))
+        day = date_from
+        rows = []
+        while day <= date_to:
+            if day.day % 2 == 0:
+                rows.append((day, Decimal(300), 3))
+            day += timedelta(days=1)
+        return rows
+
+
+def make_cache() -> DayRangeCache:
+    """
+    Create an enabled DayRangeCache.
+    """
+    cache = DayRangeCache()
+    cache.configure(max_days=1000, ttl=60)
+    return cache
+
+
+def test_gaps():
+    """
+    Test case to ensure only the days outside loaded ranges are reported missing.
+    """
+    lane = LaneDays(0)
+    lane.add(date(2016, 1, 10), date(2016, 1, 20), [])
+    lane.add(date(2016, 1, 25), date(2016, 1, 26), [])
+    assert lane.gaps(date(2016, 1, 1), date(2016, 1, 31)) == [
+        (date(2016, 1, 1), date(2016, 1, 9)),
+        (date(2016, 1, 21), date(2016, 1, 24)),
+        (date(2016, 1, 27), date(2016, 1, 31)),
+    ]
+    assert lane.gaps(date(2016, 1, 12), date(2016, 1, 18)) == []
+
+
+def test_add_merges_adjacent_ranges():
+    """
+    Test case to ensure adjacent and overlapping ranges are merged.
+    """
+    lane = LaneDays(0)
+    lane.add(date(2016, 1, 10), date(2016, 1, 20), [])
+    lane.add(date(2016, 1, 21), date(2016, 1, 22), [])
+    lane.add(date(2016, 1, 1), date(2016, 1, 12), [])
+    assert lane.ranges == [(date(2016, 1, 1), date(2016, 1, 22))]
+    assert lane.size == 22
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_fetches_only_new_days():
+    """
+    Test case to ensure an overlapping window only queries the days not cached yet.
+    """
+    cache = make_cache()
+    fetch = Fetcher()
+    first = await cache.get_averages(LANE, date(2016, 1, 1), date(2016, 1, 15), fetch)
+    second = await cache.get_averages(LANE, date(2016, 1, 10), date(2016, 1, 20), fetch)
+    assert fetch.calls == [
+        (date(2016, 1, 1), date(2016, 1, 15)),
+        (date(2016, 1, 16), date(2016, 1, 20)),
+    ]
+    assert [row.day for row in first] == [date(2016, 1, d) for d in range(2, 16, 2)]
+    assert [row.day for row in second] == [date(2016, 1, d) for d in range(10, 21, 2)]
+    assert all(row.average_price == 100 for row in second)
+    assert cache.stats()["hits"] == 6
+    assert cache.stats()["misses"] == 20
+
+
+@pytest.mark.asyncio
+async def test_minimum_price_count():
+    """
+    Test case to ensure days with fewer than 3 prices have no average.
+    """
+    cache = make_cache()
+
+    async def fetch(_date_from, _date_to):
+        return [(date(2016, 1, 1), Decimal(200), 2)]
+
+    result = await cache.get_averages(LANE, date(2016, 1, 1), date(2016, 1, 1), fetch)
+    assert result[0].average_price is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate():
+    """
+    Test case to ensure a dataset version change forces a reload.
+    """
+    cache = make_cache()
+    fetch = Fetcher()
+    await cache.get_averages(LANE, date(2016, 1, 1), date(2016, 1, 5), fetch)
+    cache.invalidate(2)
+    await cache.get_averages(LANE, date(2016, 1, 1), date(2016, 1, 5), fetch)
+    assert len(fetch.calls) == 2
@@ -1,7 +1,73 @@
 """Unit testcases for rate calculator API"""
 
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
+from types import SimpleNamespace
+
 import pytest
-from .test_base import client, app, db_session
+from fastapi.testclient import TestClient
+from core.db import database
+from core.hierarchy import port_hierarchy
+from core.metrics import ROWS_RETURNED, STAGE_LATENCY
+from core.response_model import CSV_MEDIA_TYPE
+from core.routes import load_rates_body, stream_rates
+from lib.metrics import Histogram
+from .test_base import (
+    StandInConnection,
+    StandInDatabase,
+    app,
+    client,
+    db_session,
+    start_application,
+)
+
+
+class StandInHierarchy:
+    """
+    Stand-in for PortHierarchy resolving from a fixed index.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def resolve(self, port: str):
+        return self.index.get(port, ())
+
+
+class SlowCheckoutDatabase(StandInDatabase):
+    """
+    Database whose reads wait `checkout` seconds for a connection.
+    """
+
+    def __init__(self, conn: StandInConnection, checkout: float):
+        super().__init__(conn)
+        self.checkout = checkout
+
+    @asynccontextmanager
+    async def read(self):
+        await asyncio.sleep(self.checkout)
+        yield self.conn
+
+
+def observed(histogram: Histogram, *labels: str):
+    """
+    Returns the number and sum of the observations of a histogram label set.
+    """
+    counts, total = histogram._values.get(labels, ([0], [0.0]))
+    return sum(counts), total[0]
+
+
+def stand_in_client(conn: StandInConnection, index) -> TestClient:
+    """
+    Create a TestClient whose database and port hierarchy dependencies are
+    stand-ins, without running the startup handlers that need a live database.
+    """
+    hierarchy = StandInHierarchy(index)
+    test_app = start_application()
+    test_app.dependency_overrides[database] = lambda: StandInDatabase(conn)
+    test_app.dependency_overrides[port_hierarchy] = lambda: hierarchy
+    return TestClient(test_app)
 
 
 @pytest.mark.asyncio
@@ -75,3 +141,78 @@ async def test_rate(client):
         {"day": "2016-01-10", "average_price": None},
         {"day": "2016-01-11", "average_price": None},
     ]
+
+
+def test_batch_duplicate_lanes():
+    """
+    Test case to ensure the batch API returns a 400 status code when lanes share a key.
+    """
+    conn = StandInConnection()
+    test_client = stand_in_client(conn, {"CNSGH": ("CNSGH",), "NOTAE": ("NOTAE",)})
+    lane = {"destination": "NOTAE", "date_from": "2016-01-10", "date_to": "2016-01-11"}
+    response = test_client.post(
+        "/rates/batch",
+        json={
+            "lanes": [
+                {**lane, "origin": "CNX9AM", "id": "a"},
+                {**lane, "origin": "CNSGH", "id": "a"},
+            ]
+        },
+    )
+    assert response.status_code == 400
+    assert response.json() == {
+        "status_code": 400,
+        "message": "Duplicate lanes in batch request",
+        "details": ["Lane a is requested more than once"],
+    }
+    assert not conn.statements
+
+
+@pytest.mark.asyncio
+async def test_query_stage_excludes_pool_wait():
+    """
+    Test case to ensure the query stage is timed from the connection checkout on.
+    """
+    db = SlowCheckoutDatabase(StandInConnection(), checkout=0.2)
+    count, total = observed(STAGE_LATENCY, "query")
+    await load_rates_body(
+        db,
+        None,
+        ("CNSGH",),
+        ("NOTAE",),
+        date(2016, 1, 1),
+        date(2016, 1, 2),
+        ("min",),
+        3,
+        "day",
+        1,
+    )
+    after_count, after_total = observed(STAGE_LATENCY, "query")
+    assert after_count == count + 1
+    assert after_total - total < 0.2
+
+
+@pytest.mark.asyncio
+async def test_stream_counts_rows_returned():
+    """
+    Test case to ensure streamed rows are counted in the rows returned, without the CSV header.
+    """
+    rows = [
+        SimpleNamespace(day=date(2016, 1, 1), average_price=1000),
+        SimpleNamespace(day=date(2016, 1, 2), average_price=None),
+    ]
+    db = StandInDatabase(StandInConnection(rows=rows))
+    count, total = observed(ROWS_RETURNED)
+    lines = [
+        line
+        async for line in stream_rates(
+            db,
+            ("CNSGH",),
+            ("NOTAE",),
+            date(2016, 1, 1),
+            date(2016, 1, 2),
+            CSV_MEDIA_TYPE,
+        )
+    ]
+    assert len(lines) == 3
+    assert observed(ROWS_RETURNED) == (count + 1, total + 2)
@@ -0,0 +1,131 @@
+"""Unit testcases for the response encoders"""
+
+from datetime import date
+from decimal import Decimal
+
+from typing import List
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from core.crud import DailyAverage
+from core.model import BatchRatesRequest, PriceResponse, PriceStatsResponse
+from core.response_model import (
+    CSV_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+    encode_price_stats,
+    encode_price_stream,
+    encode_prices,
+    streaming_media_type,
+)
+
+ROWS = [
+    DailyAverage(date(2016, 1, 10), None),
+    DailyAverage(date(2016, 1, 11), Decimal("1234.5666666666666667")),
+]
+
+
+async def collect(media_type: str) -> bytes:
+    """
+    Encode ROWS with the streaming encoder and join the lines.
+    """
+
+    async def rows():
+        for row in ROWS:
+            yield row
+
+    return b"".join([line async for line in encode_price_stream(rows(), media_type)])
+
+
+def test_encode_prices_matches_fastapi():
+    """
+    Test case to ensure the fast encoder produces the same bytes as FastAPI
+    validating and serializing the rows through PriceResponse.
+    """
+    rows = ROWS + [
+        DailyAverage(date(2016, 1, 12), 100.0),
+        DailyAverage(date(2016, 1, 13), 0.1 + 0.2),
+        DailyAverage(date(2016, 1, 14), Decimal("1E+16")),
+        DailyAverage(date(2016, 1, 15), 1e-7),
+    ]
+    app = FastAPI()
+
+    @app.get("/rates", response_model=List[PriceResponse])
+    async def rates():
+        return [row._asdict() for row in rows]
+
+    expected = TestClient(app).get("/rates").content
+    assert encode_prices(rows) == expected
+    assert encode_prices([]) == b"[]"
+
+
+def test_encode_price_stats_matches_fastapi():
+    """
+    Test case to ensure the statistics encoder produces the same bytes as FastAPI
+    serializing the selected fields of PriceStatsResponse.
+    """
+    rows = [
+        {"day": date(2016, 1, 10), "average_price": None, "count": 2, "median": None},
+        {"day": date(2016, 1, 11), "average_price": 1200.5, "count": 4, "median": 1201.0},
+    ]
+    app = FastAPI()
+
+    @app.get(
+        "/rates",
+        response_model=List[PriceStatsResponse],
+        response_model_exclude_unset=True,
+    )
+    async def rates():
+        return rows
+
+    expected = TestClient(app).get("/rates").content
+    assert encode_price_stats(rows) == expected
+
+
+def test_streaming_media_type():
+    """
+    Test case to ensure only NDJSON and CSV Accept headers select streaming.
+    """
+    assert streaming_media_type("application/x-ndjson") == NDJSON_MEDIA_TYPE
+    assert streaming_media_type("text/csv, */*;q=0.1") == CSV_MEDIA_TYPE
+    assert streaming_media_type("application/json") is None
+    assert streaming_media_type(None) is None
+
+
+@pytest.mark.asyncio
+async def test_ndjson_stream():
+    """
+    Test case to ensure NDJSON output has one JSON object per line.
+    """
+    assert await collect(NDJSON_MEDIA_TYPE) == (
+        b'{"day":"2016-01-10","average_price":null}\n'
+        b'{"day":"2016-01-11","average_price":1234.5666666666666}\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_csv_stream():
+    """
+    Test case to ensure CSV output has a header and an empty field for null averages.
+    """
+    assert await collect(CSV_MEDIA_TYPE) == (
+        b"day,average_price\n2016-01-10,\n2016-01-11,1234.5666666666666\n"
+    )
+
+
+def test_batch_duplicate_keys():
+    """
+    Test case to ensure lanes sharing an id or default key are reported once each.
+    """
+    lane = {"origin": "CNSGH", "destination": "NOTAE"}
+    request = BatchRatesRequest(
+        lanes=[
+            {**lane, "date_from": "2016-01-01", "date_to": "2016-01-02", "id": "a"},
+            {**lane, "date_from": "2016-01-03", "date_to": "2016-01-04", "id": "a"},
+            {**lane, "date_from": "2016-01-01", "date_to": "2016-01-02"},
+            {**lane, "date_from": "2016-01-01", "date_to": "2016-01-02"},
+            {**lane, "date_from": "2016-01-01", "date_to": "2016-01-02", "id": "b"},
+        ]
+    )
+    assert request.duplicate_keys() == ["a", "CNSGH:NOTAE:2016-01-01:2016-01-02"]
+    assert not BatchRatesRequest(lanes=request.lanes[:1]).duplicate_keys()
@@ -0,0 +1,89 @@
+"""Unit testcases for the request coalescing"""
+
+import asyncio
+
+import pytest
+from core.singleflight import SingleFlight
+
+
+class Computation:
+    """
+    Stand-in for a query that blocks until released and counts its executions.
+    """
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """
+    Test case to ensure identical concurrent calls run the computation once.
+    """
+    flight = SingleFlight()
+    compute = Computation(result=b"[]")
+    callers = [asyncio.ensure_future(flight.do("lane", compute)) for _ in range(5)]
+    await asyncio.sleep(0)
+    compute.release.set()
+    assert await asyncio.gather(*callers) == [b"[]"] * 5
+    assert compute.calls == 1
+    assert flight.stats() == {"executions": 1, "shared": 4, "in_flight": 0}
+
+    # Finished calls are not reused
+    assert await flight.do("lane", compute) == b"[]"
+    assert compute.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    """
+    Test case to ensure an error of the shared computation is raised to every caller.
+    """
+    flight = SingleFlight()
+    compute = Computation(error=ValueError("boom"))
+    callers = [asyncio.ensure_future(flight.do("lane", compute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    compute.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    """
+    Test case to ensure the computation survives a cancelled caller and stops without any.
+    """
+    flight = SingleFlight()
+    compute = Computation(result=1)
+    first = asyncio.ensure_future(flight.do("lane", compute))
+    second = asyncio.ensure_future(flight.do("lane", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    compute.release.set()
+    assert await second == 1
+    assert first.cancelled()
+
+    compute = Computation(result=2)
+    only = asyncio.ensure_future(flight.do("other", compute))
+    await asyncio.sleep(0)
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    await asyncio.sleep(0)
+    assert compute.cancelled
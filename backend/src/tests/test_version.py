@@ -0,0 +1,115 @@
+"""Unit testcases for the dataset version tracking"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from core.version import DataVersion
+from lib.sqla.db import Database
+from .test_base import StandInConnection
+
+
+class VersionDatabase(Database):
+    """
+    Database serving a settable dataset version, recording the LISTEN
+    subscriptions and failing its reads on demand.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.version = 1
+        self.down = False
+        self.subscriptions = []
+
+    def answer(self, statement, _params):
+        if "to_regclass" in str(statement):
+            return "data_version"
+        return SimpleNamespace(version=self.version, updated_at=None)
+
+    @asynccontextmanager
+    async def connect(self):
+        if self.down:
+            raise OSError("database is down")
+        yield StandInConnection(answer=self.answer)
+
+    async def listen(self, channel, callback, on_close=None):
+        self.subscriptions.append((channel, callback, on_close))
+
+        async def unlisten():
+            pass
+
+        return unlisten
+
+
+async def settle():
+    """
+    Lets the reload loop run.
+    """
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_notified_bump_is_loaded():
+    """
+    Test case to ensure a notified bump is loaded and announced to the callbacks.
+    """
+    db = VersionDatabase()
+    version = DataVersion()
+    seen = []
+    version.on_change(seen.append)
+    await version.start(db, 3600, "rates_data_changed")
+    try:
+        assert version.version == 1
+        db.version = 2
+        _channel, notify, _closed = db.subscriptions[0]
+        notify("2")
+        await settle()
+        assert version.version == 2 and seen == [1, 2]
+    finally:
+        await version.stop()
+
+
+@pytest.mark.asyncio
+async def test_periodic_reload_catches_missed_bumps():
+    """
+    Test case to ensure bumps are picked up without a notification.
+    """
+    db = VersionDatabase()
+    version = DataVersion()
+    await version.start(db, 0.01, "")
+    try:
+        db.version = 5
+        await asyncio.sleep(0.05)
+        assert version.version == 5 and not db.subscriptions
+    finally:
+        await version.stop()
+
+
+@pytest.mark.asyncio
+async def test_lost_listener_and_failed_load_recover(caplog):
+    """
+    Test case to ensure a lost LISTEN connection is re-established and a failed
+    reload is logged without stopping later reloads.
+    """
+    db = VersionDatabase()
+    version = DataVersion()
+    await version.start(db, 3600, "rates_data_changed")
+    try:
+        db.down = True
+        _channel, notify, closed = db.subscriptions[0]
+        notify("2")
+        await settle()
+        assert "Dataset version reload failed" in caplog.text
+        closed()
+        await settle()
+        assert len(db.subscriptions) == 2
+        db.down = False
+        db.version = 3
+        _channel, notify, _closed = db.subscriptions[1]
+        notify("3")
+        await settle()
+        assert version.version == 3
+    finally:
+        await version.stop()